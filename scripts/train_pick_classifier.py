@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Retrains the tweet-level pick classifier from tweet_log and bets.
+
+The oldest examples train the model; the newest --holdout share picks the score threshold
+that keeps --min-recall of their pick tweets, and reports what the gate would have skipped.
+A running bot or scheduler picks up the new model file on its next tweet.
+
+Usage: python scripts/train_pick_classifier.py [--min-recall 0.98] [--holdout 0.2] [--output PATH] [--dry-run]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from capper_ranks.core import config
+from capper_ranks.database import models
+from capper_ranks.services.pick_classifier import PickClassifier
+
+def gate_report(classifier, examples):
+    """Returns (pick recall, share of non-pick tweets skipped, share of non-pick media tweets skipped)."""
+    passed = [(has_media, is_pick, classifier.score(text, has_media) >= classifier.threshold) for text, has_media, is_pick in examples]
+    picks = [kept for _, is_pick, kept in passed if is_pick]
+    chatter = [kept for _, is_pick, kept in passed if not is_pick]
+    media_chatter = [kept for has_media, is_pick, kept in passed if has_media and not is_pick]
+    share = lambda flags, value: sum(1 for flag in flags if flag == value) / len(flags) if flags else 0.0
+    return share(picks, True), share(chatter, False), share(media_chatter, False)
+
+def train(min_recall, holdout, output, dry_run):
+    models.init_db()
+    examples = models.get_classifier_training_examples()
+    num_picks = sum(1 for _, _, is_pick in examples if is_pick)
+    print(f"--- {len(examples)} labelled tweets: {num_picks} with picks, {len(examples) - num_picks} without ---")
+    if num_picks == 0 or num_picks == len(examples):
+        print("Need both pick and non-pick tweets to train. Let the bot scan for a while first.")
+        return False
+
+    # Chronological split, so the threshold is checked on tweets the model hasn't seen
+    split = max(1, min(len(examples) - 1, int(len(examples) * (1.0 - holdout))))
+    training, validation = examples[:split], examples[split:]
+    classifier = PickClassifier().fit(training)
+    if not classifier.is_trained:
+        print("The training split has only one class; try a smaller --holdout.")
+        return False
+    threshold = classifier.choose_threshold(validation, min_recall)
+
+    recall, chatter_skipped, media_chatter_skipped = gate_report(classifier, validation)
+    print(f"Threshold (log-odds):      {threshold:.2f}")
+    print(f"Holdout pick recall:       {recall:.1%} (target {min_recall:.1%})")
+    print(f"Holdout chatter skipped:   {chatter_skipped:.1%}")
+    print(f"Media chatter skipped:     {media_chatter_skipped:.1%} (downloads and OCR saved)")
+
+    if dry_run:
+        print("Dry run: model not saved.")
+    else:
+        classifier.save(output)
+        print(f"Saved pick classifier to {output}")
+    return True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Retrain the pick classifier that gates detection and OCR.")
+    parser.add_argument('--min-recall', type=float, default=config.PICK_CLASSIFIER_MIN_RECALL,
+                        help='Share of holdout pick tweets the threshold must let through.')
+    parser.add_argument('--holdout', type=float, default=0.2, help='Share of the newest tweets used to pick the threshold.')
+    parser.add_argument('--output', default=config.PICK_CLASSIFIER_PATH, help='Where to write the model.')
+    parser.add_argument('--dry-run', action='store_true', help='Report holdout metrics without saving the model.')
+    args = parser.parse_args()
+    sys.exit(0 if train(args.min_recall, args.holdout, args.output, args.dry_run) else 1)
@@ -1,111 +1,346 @@
-import time
-from datetime import datetime 
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 from capper_ranks.core import config
 from capper_ranks.database import models
 from capper_ranks.services import x_client
 from capper_ranks.services import pick_detector
 from capper_ranks.services import sports_api
-from capper_ranks.services.image_processor import image_processor
+from capper_ranks.services.image_processor import image_processor, compute_content_hash
+from capper_ranks.services.pick_classifier import pick_classifier
+from capper_ranks.utils.log import configure_logging, get_logger, sampled_debug
 
-def process_pending_results():
-    """Gets all pending picks and tries to update their status."""
-    print("\n--- Checking for pending results ---")
-    pending_legs = models.get_pending_legs()
+logger = get_logger(__name__)
+
+# Scan workers only fetch and detect; every database write goes through this lock.
+_db_write_lock = models.write_lock
+
+def next_check_time(result, check_attempts, now):
+    """
+    Decides when an ungraded leg is next worth checking: once its game should be over,
+    then with exponential backoff for games that run long, are postponed or can't be found.
+    """
+    backoff = timedelta(minutes=config.GRADE_BACKOFF_BASE_MINUTES) * (2 ** min(check_attempts, 16))
+    backoff = min(backoff, timedelta(hours=config.GRADE_BACKOFF_MAX_HOURS))
+    game_start = (result or {}).get('game_start')
+    if game_start is not None:
+        expected_end = game_start + timedelta(hours=config.GAME_DURATION_HOURS)
+        if expected_end > now:
+            return expected_end
+    return now + backoff
+
+def process_pending_results(now=None):
+    """
+    Grades the pending legs that are due and reschedules the rest. Legs whose game can't be
+    final yet are skipped entirely, so they cost no statsapi calls.
+    """
+    logger.info("Checking for pending results")
+    now = now or datetime.now(timezone.utc)
+    pending_legs = models.get_due_legs(now)
     
     if not pending_legs:
-        print("No pending picks to check.")
+        logger.info("No pending picks are due for a check.")
         return
 
-    for leg in pending_legs:
-        leg_dict = dict(leg) # Convert the database row to a dictionary
-        result = sports_api.fetch_pick_result(leg_dict)
+    # Grade everything in one batch so legs on the same game share API calls
+    leg_dicts = [dict(leg) for leg in pending_legs] # Convert the database rows to dictionaries
+    results = sports_api.fetch_pick_results(leg_dicts)
 
-        # If we get a definitive result, update the database
+    final_statuses = {}
+    checks = {}
+    for leg_dict in leg_dicts:
+        result = results.get(leg_dict['leg_id'])
+
+        # If we get a definitive result, queue it for the database
         if result and result.get('status') in ['WIN', 'LOSS', 'PUSH']:
-            models.update_leg_status(leg_dict['leg_id'], result['status'])
+            final_statuses[leg_dict['leg_id']] = result['status']
         else:
             status = result.get('status') if result else 'ERROR'
-            print(f"  - Result for leg {leg_dict['leg_id']} is still {status}.")
+            next_check_at = next_check_time(result, leg_dict.get('check_attempts') or 0, now)
+            checks[leg_dict['leg_id']] = {
+                'next_check_at': next_check_at,
+                'game_pk': (result or {}).get('game_pk'),
+                'game_start': (result or {}).get('game_start'),
+            }
+            logger.info("Result for leg %s is still %s; next check at %s UTC.", leg_dict['leg_id'], status,
+                        format(next_check_at, '%Y-%m-%d %H:%M'), extra={'leg_id': leg_dict['leg_id']})
+
+    # The whole grading pass (legs plus one rollup of the affected parlays) is written with a single commit
+    with _db_write_lock, models.transaction():
+        models.update_leg_statuses(final_statuses)
+        models.schedule_leg_checks(checks)
+
+def _get_media_from_includes(tweet):
+    """Falls back to media expanded onto the tweet object itself, for callers that don't pass media."""
+    media = []
+    if hasattr(tweet, 'attachments') and tweet.attachments and 'media_keys' in tweet.attachments:
+        if hasattr(tweet, '_includes') and tweet._includes and 'media' in tweet._includes:
+            for media_obj in tweet._includes['media']:
+                media_key = getattr(media_obj, 'media_key', None)
+                if hasattr(media_obj, 'url') and media_obj.url:
+                    media.append({'media_key': media_key, 'url': media_obj.url})
+                elif hasattr(media_obj, 'preview_image_url') and media_obj.preview_image_url:
+                    media.append({'media_key': media_key, 'url': media_obj.preview_image_url})
+    return media
+
+def gate_tweet(capper_id, tweet, media):
+    """
+    Runs the pick classifier on a tweet before any detection or image download.
+    
+    Returns:
+        (process, tweet_log entry). Callers that process the tweet set the entry's 'has_pick'.
+    """
+    text = getattr(tweet, 'text', None)
+    process, score = pick_classifier.gate(text, bool(media))
+    if not process:
+        logger.debug("Skipping tweet %s: pick classifier score %.3f is below its threshold.", tweet.id, score,
+                     extra={'tweet_id': tweet.id, 'capper_id': capper_id})
+    return process, {'tweet_id': str(tweet.id), 'capper_id': capper_id, 'tweet_text': text,
+                     'has_media': bool(media), 'has_pick': None, 'pick_score': score}
+
+def report_text_picks(detection_result):
+    """Logs a text detection result and passes it through."""
+    if detection_result:
+        logger.info("Text pick detected (%s): %s", 'Parlay' if detection_result['is_parlay'] else 'Single(s)',
+                    detection_result['legs'])
+        return detection_result
+    return None
+
+def detect_text_picks(tweet):
+    """
+    Detects picks in a tweet's text only. Returns the detection result or None.
+    Goes through pick_detector's line cache, so template lines seen in earlier tweets aren't re-parsed.
+    """
+    if hasattr(tweet, 'text') and tweet.text:
+        logger.debug("Analyzing tweet text...")
+        return report_text_picks(pick_detector.detect_picks([tweet.text])[0])
+    return None
+
+def prepare_tweet_images(media):
+    """
+    Skips media we've processed before; downloads the rest and checks the OCR cache,
+    so only genuinely new images need OCR.
+    
+    Returns:
+        One dict per usable image, in tweet order. Images with 'cached' set need no OCR;
+        the rest carry the downloaded 'buffer' and need 'extracted_text' filled in.
+    """
+    images = []
+    for i, media_item in enumerate(media):
+        processed = models.get_processed_media(media_item['media_key'], media_item['url'])
+        if processed:
+            images.append({'media': media_item, 'content_hash': None, 'already_processed': True, 'cached': {
+                'extracted_text': processed['extracted_text'],
+                'detection_result': json.loads(processed['detection_json']) if processed['detection_json'] else None,
+            }})
+            continue
+        
+        logger.debug("Downloading image %d/%d: %s", i + 1, len(media), media_item['url'])
+        image_buffer = image_processor.download_image(media_item['url'])
+        if not image_buffer:
+            logger.warning("Failed to download image: %s", media_item['url'])
+            continue
+        content_hash = compute_content_hash(image_buffer.getvalue())
+        cached = image_processor.ocr_cache.get(content_hash)
+        images.append({'media': media_item, 'buffer': image_buffer, 'content_hash': content_hash,
+                       'already_processed': False, 'cached': cached})
+    return images
+
+def resolve_tweet_images(tweet, images):
+    """
+    Detects picks in prepared images once their OCR text is in, recording every newly
+    processed image. Returns the first image's detection result, or None.
+    """
+    for image in images:
+        if image['cached']:
+            logger.debug("Seen this image before, skipping download and OCR." if image['already_processed']
+                         else "Seen this slip before, skipping OCR.")
+            extracted_text = image['cached']['extracted_text']
+            detection_result = image['cached']['detection_result']
+        else:
+            extracted_text = image.get('extracted_text')
+            if not extracted_text:
+                logger.warning("Failed to extract text from image: %s", image['media']['url'])
+                continue
+            sampled_debug(logger, "OCR extracted text: %.100r", extracted_text)
+            
+            # Try to detect picks from the extracted text
+            detection_result = pick_detector.detect_picks([extracted_text])[0]
+            image_processor.ocr_cache.put(image['content_hash'], extracted_text, detection_result)
         
-        time.sleep(1) # Be polite to the sports API between checks
+        if not image['already_processed']:
+            with _db_write_lock:
+                models.record_processed_media(image['media']['media_key'], image['media']['url'], str(tweet.id),
+                                              extracted_text, json.dumps(detection_result) if detection_result else None)
+        
+        if detection_result:
+            logger.info("Image pick detected (%s): %s", 'Parlay' if detection_result['is_parlay'] else 'Single(s)',
+                        detection_result['legs'], extra={'tweet_id': tweet.id})
+            return detection_result
+        else:
+            logger.debug("No valid picks found in image text.")
+    return None
 
-def process_tweet_for_picks(tweet, capper_id):
+def detect_tweet_picks(tweet, media=None):
     """
-    Processes a single tweet for picks, checking both text and images.
+    Detects picks in a single tweet, checking both text and images. Images already recorded
+    in processed_media are never downloaded again. Bets are not written to the database.
     
     Args:
         tweet: Tweet object from X API
-        capper_id: ID of the capper who posted the tweet
+        media: List of {'media_key', 'url'} dicts from x_client.get_tweets_with_media
         
     Returns:
-        True if picks were found and stored, False otherwise
+        The detection result from pick_detector, or None if no picks were found
     """
-    print(f"\n  - Processing Tweet ID: {tweet.id} from {tweet.created_at}")
+    logger.debug("Processing tweet ID: %s from %s", tweet.id, tweet.created_at, extra={'tweet_id': tweet.id})
     
     # First, try to detect picks from the tweet text
-    if hasattr(tweet, 'text') and tweet.text:
-        print(f"    📝 Analyzing tweet text...")
-        detection_result = pick_detector.detect_pick(tweet.text)
+    detection_result = detect_text_picks(tweet)
+    if detection_result:
+        return detection_result
+    return detect_image_picks(tweet, media)
+
+def detect_image_picks(tweet, media=None):
+    """Detects picks in a tweet's images, for tweets whose text had none. Returns the detection result or None."""
+    if media is None:
+        media = _get_media_from_includes(tweet)
+    if media:
+        logger.debug("Tweet contains media attachments, checking for images...")
+        images = prepare_tweet_images(media)
+        
+        # Extract text from the uncached images using OCR, in parallel
+        uncached = [image for image in images if not image['cached']]
+        extracted_texts = image_processor.extract_text_from_images([image['buffer'] for image in uncached]) if uncached else []
+        for image, extracted_text in zip(uncached, extracted_texts):
+            image['extracted_text'] = extracted_text
         
+        detection_result = resolve_tweet_images(tweet, images)
         if detection_result:
-            print(f"    ✅ TEXT PICK DETECTED: {detection_result['legs']}")
-            print(f"    📊 Bet Type: {'Parlay' if detection_result['is_parlay'] else 'Single(s)'}")
-            models.store_bet_and_legs(capper_id, str(tweet.id), None, tweet.created_at, detection_result)
-            return True
+            return detection_result
     
-    # If no picks found in text, check for images
-    if hasattr(tweet, 'attachments') and tweet.attachments and 'media_keys' in tweet.attachments:
-        print(f"    🖼️  Tweet contains media attachments, checking for images...")
-        
-        # Get media URLs from the tweet
-        media_urls = []
-        if hasattr(tweet, '_includes') and tweet._includes and 'media' in tweet._includes:
-            for media in tweet._includes['media']:
-                if hasattr(media, 'url') and media.url:
-                    media_urls.append(media.url)
-                elif hasattr(media, 'preview_image_url') and media.preview_image_url:
-                    media_urls.append(media.preview_image_url)
+    logger.debug("No valid picks found in tweet text or images.")
+    return None
+
+def process_tweet_for_picks(tweet, capper_id, media=None):
+    """
+    Processes a single tweet for picks and stores any that are found.
+    
+    Args:
+        tweet: Tweet object from X API
+        capper_id: ID of the capper who posted the tweet
+        media: List of {'media_key', 'url'} dicts from x_client.get_tweets_with_media
         
-        # Process each image
-        for i, image_url in enumerate(media_urls):
-            print(f"    🖼️  Processing image {i+1}/{len(media_urls)}: {image_url}")
-            
-            # Extract text from image using OCR
-            extracted_text = image_processor.process_image_url(image_url)
-            
-            if extracted_text:
-                print(f"    📝 OCR extracted text: {extracted_text[:100]}...")
-                
-                # Try to detect picks from the extracted text
-                detection_result = pick_detector.detect_pick(extracted_text)
-                
-                if detection_result:
-                    print(f"    ✅ IMAGE PICK DETECTED: {detection_result['legs']}")
-                    print(f"    📊 Bet Type: {'Parlay' if detection_result['is_parlay'] else 'Single(s)'}")
-                    models.store_bet_and_legs(capper_id, str(tweet.id), None, tweet.created_at, detection_result)
-                    return True
-                else:
-                    print(f"    -- No valid picks found in image text.")
-            else:
-                print(f"    -- Failed to extract text from image.")
+    Returns:
+        True if picks were found and stored, False otherwise
+    """
+    if media is None:
+        media = _get_media_from_includes(tweet)
+    process, tweet_log_entry = gate_tweet(capper_id, tweet, media)
+    detection_result = detect_tweet_picks(tweet, media) if process else None
+    if process:
+        tweet_log_entry['has_pick'] = detection_result is not None
+    with _db_write_lock, models.transaction():
+        if detection_result:
+            models.store_bet_and_legs(capper_id, str(tweet.id), None, tweet.created_at, detection_result)
+        models.log_tweets([tweet_log_entry])
+    return detection_result is not None
+
+def fetch_capper_picks(client, capper_id):
+    """
+    Scan worker: fetches a capper's new tweets and detects picks in them.
     
-    print(f"    -- No valid picks found in tweet text or images.")
-    return False
+    Returns:
+        (latest_tweet_id, [(tweet, detection_result), ...], new_tweet_count, tweet_log entries),
+        or (None, [], 0, []) if there is nothing new
+    """
+    last_seen_id = models.get_last_seen_tweet_id(capper_id)
+    logger.info("Fetching new tweets for capper ID: %s (since_id: %s)", capper_id, last_seen_id, extra={'capper_id': capper_id})
 
-def main_loop():
-    """The main function to run the bot's core loop."""
-    print("--- Capper-Ranks Bot Starting Up ---")
+    # Fetch tweets with media attachments
+    tweets_with_media = x_client.get_tweets_with_media(client, capper_id, since_id=last_seen_id)
+    
+    if not tweets_with_media:
+        logger.info("No new tweets found for capper ID: %s.", capper_id, extra={'capper_id': capper_id})
+        return None, [], 0, []
 
-    models.init_db()
-    client = x_client.get_x_client()
+    latest_tweet_id = tweets_with_media[0]['tweet'].id
+    detected_picks = []
+    tweet_log = []
 
-    if not client:
-        print("Could not start bot: X client authentication failed.")
-        return
+    # Oldest first. Tweets the pick classifier rules out never reach detection or OCR.
+    to_process = []
+    for tweet_data in reversed(tweets_with_media):
+        media = tweet_data.get('media')
+        if media is None:
+            media = _get_media_from_includes(tweet_data['tweet'])
+        process, tweet_log_entry = gate_tweet(capper_id, tweet_data['tweet'], media)
+        tweet_log.append(tweet_log_entry)
+        if process:
+            to_process.append((tweet_data['tweet'], media, tweet_log_entry))
 
-    # --- Capper ID Resolution ---
+    # Detect text picks for the whole timeline at once, so repeated template lines are parsed once
+    text_results = pick_detector.detect_picks([getattr(tweet, 'text', None) for tweet, _, _ in to_process])
+
+    for (tweet, media, tweet_log_entry), text_result in zip(to_process, text_results):
+        logger.debug("Processing tweet ID: %s from %s", tweet.id, tweet.created_at, extra={'tweet_id': tweet.id})
+        detection_result = report_text_picks(text_result) or detect_image_picks(tweet, media)
+        tweet_log_entry['has_pick'] = detection_result is not None
+        if detection_result:
+            detected_picks.append((tweet, detection_result))
+
+    return latest_tweet_id, detected_picks, len(tweets_with_media), tweet_log
+
+def store_capper_picks(capper_id, latest_tweet_id, detected_picks, tweet_log=None):
+    """
+    Stores a capper's detected picks as one batch and advances their since_id in the same transaction,
+    along with the tweet_log entries for every tweet scanned.
+    """
+    records = [{
+        'capper_id': capper_id,
+        'tweet_id': str(tweet.id),
+        'retweet_id': None,
+        'tweet_timestamp': tweet.created_at,
+        'detection_result': detection_result,
+    } for tweet, detection_result in detected_picks]
+    with _db_write_lock, models.transaction():
+        if records:
+            outcomes = models.store_bets_bulk(records)
+            for outcome in outcomes:
+                if outcome['status'] != 'STORED':
+                    logger.info("Skipped tweet %s: %s", outcome['tweet_id'], outcome['status'], extra={'tweet_id': outcome['tweet_id']})
+        models.log_tweets(tweet_log)
+        models.update_last_seen_tweet_id(capper_id, latest_tweet_id)
+    logger.info("Updated last_seen_id for %s to %s", capper_id, latest_tweet_id, extra={'capper_id': capper_id})
+
+def scan_cappers(client, capper_ids):
+    """
+    Scans cappers concurrently with up to SCAN_WORKERS threads. Fetching and detection run
+    in the workers; storing picks and advancing since_id happen one capper at a time.
+    The X API rate limits are enforced inside x_client and shared by every worker.
+    
+    Returns:
+        Dict of capper_id -> number of new tweets found, or None where the scan failed
+    """
+    new_tweet_counts = {}
+    with ThreadPoolExecutor(max_workers=max(1, config.SCAN_WORKERS)) as pool:
+        futures = {pool.submit(fetch_capper_picks, client, capper_id): capper_id for capper_id in capper_ids}
+        for future in as_completed(futures):
+            capper_id = futures[future]
+            new_tweet_counts[capper_id] = None
+            try:
+                latest_tweet_id, detected_picks, new_tweet_count, tweet_log = future.result()
+                if latest_tweet_id is not None:
+                    store_capper_picks(capper_id, latest_tweet_id, detected_picks, tweet_log)
+                new_tweet_counts[capper_id] = new_tweet_count
+            except Exception as e:
+                logger.error("An error occurred during tweet scan for capper ID %s: %s", capper_id, e, extra={'capper_id': capper_id})
+    return new_tweet_counts
+
+def resolve_capper_ids(client):
+    """Resolves TARGET_CAPPER_USERNAMES to X user IDs, looking up and storing any new cappers."""
     capper_ids_to_scan = []
-    print("\nResolving capper usernames to IDs...")
+    logger.info("Resolving capper usernames to IDs...")
     for username in config.TARGET_CAPPER_USERNAMES:
         capper_data = models.get_capper_by_username(username)
         if capper_data:
@@ -116,40 +351,35 @@ def main_loop():
                 models.add_capper(user_obj.id, user_obj.username)
                 capper_ids_to_scan.append(user_obj.id)
             else:
-                print(f"Could not resolve username @{username}. It will be skipped.")
-    print(f"\nFinished resolving IDs. Ready to scan {len(capper_ids_to_scan)} cappers.")
+                logger.warning("Could not resolve username @%s. It will be skipped.", username)
+    logger.info("Finished resolving IDs. Ready to scan %d cappers.", len(capper_ids_to_scan))
+    return capper_ids_to_scan
 
-    # --- Main Tweet Scanning Loop ---
-    print("\n--- Performing a scan for new tweets... ---")
-    for capper_id in capper_ids_to_scan:
-        last_seen_id = models.get_last_seen_tweet_id(capper_id)
-        print(f"--> Fetching new tweets for capper ID: {capper_id} (since_id: {last_seen_id})")
-        
-        try:
-            # Fetch tweets with media attachments
-            tweets_with_media = x_client.get_tweets_with_media(client, capper_id, since_id=last_seen_id)
-            
-            if not tweets_with_media:
-                print(f"  - No new tweets found.")
-                continue
+def main_loop():
+    """The main function to run the bot's core loop."""
+    configure_logging()
+    logger.info("Capper-Ranks bot starting up")
+
+    models.init_db()
+    client = x_client.get_x_client()
 
-            latest_tweet_id = tweets_with_media[0]['tweet'].id
+    if not client:
+        logger.error("Could not start bot: X client authentication failed.")
+        return
 
-            # Process tweets in reverse chronological order
-            for tweet_data in reversed(tweets_with_media):
-                tweet = tweet_data['tweet']
-                process_tweet_for_picks(tweet, capper_id)
+    # --- Capper ID Resolution ---
+    capper_ids_to_scan = resolve_capper_ids(client)
 
-            models.update_last_seen_tweet_id(capper_id, latest_tweet_id)
-            print(f"\n  - Updated last_seen_id for {capper_id} to {latest_tweet_id}")
-        except Exception as e:
-            print(f"  - An error occurred during tweet scan: {e}")
-            
-        time.sleep(1)
+    # --- Main Tweet Scanning Loop ---
+    logger.info("Performing a scan for new tweets...")
+    scan_cappers(client, capper_ids_to_scan)
+    prefilter_stats = pick_detector.get_prefilter_stats()
+    logger.info("Prefilter rejected %d/%d lines (%.0f%%) without any lookups.", prefilter_stats['rejected'],
+                prefilter_stats['checked'], prefilter_stats['rejection_rate'] * 100, extra=prefilter_stats)
 
     # --- Result Checking ---
     process_pending_results()
-    print("\n--- Bot has finished its run. ---")
+    logger.info("Bot has finished its run.")
 
 def test_live_tweet_processing():
     """
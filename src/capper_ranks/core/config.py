@@ -11,6 +11,98 @@ X_ACCESS_TOKEN_SECRET = os.getenv("X_ACCESS_TOKEN_SECRET")
 X_BEARER_TOKEN = os.getenv("X_BEARER_TOKEN")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "capper_ranks.db")
 
+# --- Sports API Caching ---
+# How long a resolved player lookup stays valid, and how long a "no such player" result is remembered.
+PLAYER_CACHE_TTL_HOURS = float(os.getenv("PLAYER_CACHE_TTL_HOURS", "168"))
+PLAYER_CACHE_NEGATIVE_TTL_HOURS = float(os.getenv("PLAYER_CACHE_NEGATIVE_TTL_HOURS", "24"))
+# How often the local MLB roster index is re-pulled from statsapi.
+ROSTER_REFRESH_HOURS = float(os.getenv("ROSTER_REFRESH_HOURS", "24"))
+# Schedules and game feeds for games that are not final yet are only reused for this long.
+LIVE_GAME_CACHE_TTL_SECONDS = float(os.getenv("LIVE_GAME_CACHE_TTL_SECONDS", "120"))
+# Maximum number of schedules and game feeds kept in memory.
+SPORTS_CACHE_MAX_ENTRIES = int(os.getenv("SPORTS_CACHE_MAX_ENTRIES", "256"))
+
+# --- Pick Detection ---
+# detect_picks() memoizes line -> leg across tweets. Entries expire so a player who joins
+# the roster (or a failed lookup) is re-validated instead of being remembered forever.
+DETECT_LINE_CACHE_MAX_ENTRIES = int(os.getenv("DETECT_LINE_CACHE_MAX_ENTRIES", "4096"))
+DETECT_LINE_CACHE_TTL_SECONDS = float(os.getenv("DETECT_LINE_CACHE_TTL_SECONDS", "3600"))
+
+# --- Pick Classifier ---
+# Model trained by scripts/train_pick_classifier.py. Its threshold keeps PICK_CLASSIFIER_MIN_RECALL
+# of pick tweets; tweets scoring below it skip detection and OCR, except for a random
+# PICK_CLASSIFIER_AUDIT_RATE of them that keep the training data honest.
+PICK_CLASSIFIER_PATH = os.getenv("PICK_CLASSIFIER_PATH", "pick_classifier.json")
+PICK_CLASSIFIER_MIN_RECALL = float(os.getenv("PICK_CLASSIFIER_MIN_RECALL", "0.98"))
+PICK_CLASSIFIER_AUDIT_RATE = float(os.getenv("PICK_CLASSIFIER_AUDIT_RATE", "0.02"))
+PICK_CLASSIFIER_BUCKETS = int(os.getenv("PICK_CLASSIFIER_BUCKETS", str(2 ** 18)))
+
+# --- X API Scanning ---
+# Number of cappers scanned in parallel. Requests per 15-minute window for each X endpoint we call;
+# all scan workers share these budgets.
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "4"))
+X_USER_TWEETS_RATE_LIMIT = int(os.getenv("X_USER_TWEETS_RATE_LIMIT", "900"))
+X_USER_LOOKUP_RATE_LIMIT = int(os.getenv("X_USER_LOOKUP_RATE_LIMIT", "900"))
+
+# --- Grading Queue ---
+# A pending leg is not re-checked until its game has had GAME_DURATION_HOURS to finish.
+# After that (or when its game can't be found yet, or is postponed), checks back off
+# exponentially from GRADE_BACKOFF_BASE_MINUTES up to GRADE_BACKOFF_MAX_HOURS.
+GAME_DURATION_HOURS = float(os.getenv("GAME_DURATION_HOURS", "3.5"))
+GRADE_BACKOFF_BASE_MINUTES = float(os.getenv("GRADE_BACKOFF_BASE_MINUTES", "15"))
+GRADE_BACKOFF_MAX_HOURS = float(os.getenv("GRADE_BACKOFF_MAX_HOURS", "24"))
+
+# --- Scheduler ---
+# Each capper is rescanned every SCHEDULER_MIN_SCAN_MINUTES to SCHEDULER_MAX_SCAN_MINUTES,
+# depending on how often they post. The scheduler wakes for grading when the next leg is due,
+# and at least every SCHEDULER_MAX_GRADE_MINUTES.
+SCHEDULER_MIN_SCAN_MINUTES = float(os.getenv("SCHEDULER_MIN_SCAN_MINUTES", "5"))
+SCHEDULER_MAX_SCAN_MINUTES = float(os.getenv("SCHEDULER_MAX_SCAN_MINUTES", "120"))
+SCHEDULER_MAX_GRADE_MINUTES = float(os.getenv("SCHEDULER_MAX_GRADE_MINUTES", "60"))
+SCHEDULER_CAPPER_REFRESH_HOURS = float(os.getenv("SCHEDULER_CAPPER_REFRESH_HOURS", "24"))
+# A capper refresh or grading pass that fails (network, database) is retried this much later.
+SCHEDULER_RETRY_MINUTES = float(os.getenv("SCHEDULER_RETRY_MINUTES", "5"))
+
+# --- Async Pipeline ---
+# Concurrency limits for each stage of capper_ranks.pipeline, and the size of the queues
+# between stages. A full queue makes the stage before it wait instead of piling up work.
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "64"))
+PIPELINE_DETECT_WORKERS = int(os.getenv("PIPELINE_DETECT_WORKERS", "4"))
+PIPELINE_DOWNLOAD_WORKERS = int(os.getenv("PIPELINE_DOWNLOAD_WORKERS", "8"))
+PIPELINE_OCR_WORKERS = int(os.getenv("PIPELINE_OCR_WORKERS", "4"))
+
+# --- OCR ---
+# OCR_WORKERS=0 sizes the OCR process pool to the number of CPU cores.
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0"))
+OCR_QUEUE_SIZE = int(os.getenv("OCR_QUEUE_SIZE", "32"))
+OCR_TIMEOUT_SECONDS = float(os.getenv("OCR_TIMEOUT_SECONDS", "30"))
+# OCR results are cached by the exact image bytes. The cache is trimmed back to
+# OCR_CACHE_MAX_BYTES every OCR_CACHE_EVICT_EVERY new entries rather than on every one.
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+OCR_CACHE_EVICT_EVERY = int(os.getenv("OCR_CACHE_EVICT_EVERY", "64"))
+
+# --- SQLite Storage ---
+# WAL lets reporting readers run alongside the scan and grading writers. With WAL,
+# synchronous=NORMAL only risks the last commits on power loss, never corruption.
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+# Page cache per connection in KiB, memory-mapped I/O size in bytes, and how long a
+# writer waits on a lock before failing with "database is locked".
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", str(64 * 1024)))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+# Also settle parlays with a SQLite trigger, for tools that update legs directly.
+DB_PARLAY_ROLLUP_TRIGGER = os.getenv("DB_PARLAY_ROLLUP_TRIGGER", "false").lower() in ("1", "true", "yes")
+
+# --- Logging ---
+# LOG_LEVEL applies to every capper_ranks module; LOG_LEVELS overrides it per module, e.g.
+# "services.pick_detector=DEBUG,database=WARNING". Per-line debug output (pick detection,
+# OCR cleanup) is only emitted for a random LOG_SAMPLE_RATE share of lines.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_JSON = os.getenv("LOG_JSON", "false").lower() in ("1", "true", "yes")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
 capper_usernames_str = os.getenv("TARGET_CAPPER_USERNAMES", "")
 TARGET_CAPPER_USERNAMES = [uname.strip() for uname in capper_usernames_str.split(',') if uname.strip()]
 
@@ -1,21 +1,129 @@
 # src/capper_ranks/database/models.py
 
-import sqlite3
+import threading
+from contextlib import contextmanager
 from ..core import config
-from datetime import datetime, timedelta
+from . import storage
+from ..utils.log import configure_logging, get_logger
+from datetime import datetime, timedelta, timezone
+
+logger = get_logger(__name__)
 
 def connect_db():
-    """Establishes a connection to the database."""
-    # This is your existing function, which is perfect.
-    conn = sqlite3.connect(config.DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
+    """Establishes a new connection to the database. Prefer get_connection() inside this module."""
+    return storage.open_connection()
+
+# Each thread keeps one long-lived connection instead of opening one per query.
+_local = threading.local()
+
+# Writers on different threads take turns through this lock instead of contending for
+# SQLite's. Reentrant, so a locked block can call helpers that take it too.
+write_lock = threading.RLock()
+
+def get_connection():
+    """Returns this thread's connection, reopening it if DATABASE_NAME has changed."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.database_name != config.DATABASE_NAME:
+        if conn is not None:
+            conn.close()
+        conn = connect_db()
+        _local.conn = conn
+        _local.database_name = config.DATABASE_NAME
+        _local.depth = 0
+    return conn
+
+def get_read_connection():
+    """
+    Returns this thread's read-only connection, for reporting queries that must never
+    hold up the writers. Reads see the last committed state, not this thread's open transaction.
+    """
+    conn = getattr(_local, 'read_conn', None)
+    if conn is None or _local.read_database_name != config.DATABASE_NAME:
+        if conn is not None:
+            conn.close()
+        conn = storage.open_read_only_connection()
+        _local.read_conn = conn
+        _local.read_database_name = config.DATABASE_NAME
     return conn
 
+def close_connection():
+    """Closes this thread's connections, if it has any."""
+    for attr in ('conn', 'read_conn'):
+        conn = getattr(_local, attr, None)
+        if conn is not None:
+            conn.close()
+            setattr(_local, attr, None)
+
+@contextmanager
+def transaction():
+    """
+    Runs a block of writes as one unit of work with a single commit.
+    Nested blocks become savepoints, so an inner failure only rolls back the inner block:
+
+        with models.transaction():
+            models.update_leg_status(leg_id, 'WIN')  # leg update and parlay rollup, one commit
+    """
+    conn = get_connection()
+    if _local.depth == 0:
+        # Begin explicitly: a savepoint opened outside a transaction would commit on release.
+        # IMMEDIATE takes the write lock up front (waiting up to busy_timeout for it). A deferred
+        # BEGIN that reads first fails outright under WAL if another connection commits before
+        # its first write, since SQLite can't upgrade a stale read snapshot.
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        _local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            _local.depth -= 1
+    else:
+        savepoint = f"sp_{_local.depth}"
+        conn.execute(f"SAVEPOINT {savepoint}")
+        _local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            conn.execute(f"ROLLBACK TO {savepoint}")
+            conn.execute(f"RELEASE {savepoint}")
+            raise
+        else:
+            conn.execute(f"RELEASE {savepoint}")
+        finally:
+            _local.depth -= 1
+
 def init_db():
-    """Initializes the database with all necessary tables."""
-    print("Initializing database...")
-    conn = connect_db()
-    cursor = conn.cursor()
+    """Initializes the database, applying any schema migrations it hasn't had yet."""
+    logger.info("Initializing database...")
+    applied = migrate()
+    set_parlay_rollup_trigger(config.DB_PARLAY_ROLLUP_TRIGGER)
+    logger.info("Database '%s' initialized successfully (%d migration(s) applied).", config.DATABASE_NAME, applied)
+
+# --- Schema Migrations ---
+# The schema version lives in SQLite's user_version header. Each migration runs once, in its
+# own transaction, in order. Never edit a released migration; append a new one instead.
+
+def get_schema_version():
+    return get_connection().execute("PRAGMA user_version").fetchone()[0]
+
+def migrate():
+    """Applies every pending migration and returns how many were applied."""
+    applied = 0
+    for version, description, apply in MIGRATIONS:
+        if version <= get_schema_version():
+            continue
+        logger.info("Applying migration %d: %s", version, description)
+        with transaction() as conn:
+            apply(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version}")
+        applied += 1
+    return applied
+
+def _migration_1_initial_schema(cursor):
 
     # The `bets` table holds the overall bet
     cursor.execute('''
@@ -68,45 +176,298 @@ def init_db():
     ''')
     # --- END OF NEW ADDITION ---
 
-    conn.commit()
-    conn.close()
-    print(f"Database '{config.DATABASE_NAME}' initialized successfully with all tables.")
+    # Caches statsapi player lookups. A NULL player_id is a cached "not found" result.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS player_lookup_cache (
+            lookup_key TEXT PRIMARY KEY,
+            player_id INTEGER,
+            team_id INTEGER,
+            league TEXT,
+            full_name TEXT,
+            cached_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Local copy of every MLB player on a roster this season, refreshed daily.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS player_roster (
+            player_id INTEGER PRIMARY KEY,
+            full_name TEXT NOT NULL,
+            use_name TEXT,
+            last_name TEXT,
+            team_id INTEGER,
+            league TEXT NOT NULL,
+            loaded_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Stores statsapi responses that can never change again (schedules and feeds of final games).
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sports_api_cache (
+            cache_key TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            cached_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # OCR results keyed by the SHA-256 of the image bytes, so reposted slips skip tesseract
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ocr_cache (
+            content_hash TEXT PRIMARY KEY,
+            extracted_text TEXT,
+            detection_json TEXT,
+            size_bytes INTEGER NOT NULL,
+            last_used_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Every tweet image we have already downloaded and processed, so it is never fetched twice.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS processed_media (
+            media_key TEXT PRIMARY KEY,
+            media_url TEXT NOT NULL,
+            tweet_id TEXT,
+            extracted_text TEXT,
+            detection_json TEXT,
+            processed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_processed_media_url ON processed_media (media_url)")
+
+def _migration_2_hot_query_indexes(cursor):
+    # Store the tweet's date so the duplicate check can use an index instead of DATE(tweet_timestamp)
+    cursor.execute("ALTER TABLE bets ADD COLUMN tweet_date TEXT")
+    cursor.execute("UPDATE bets SET tweet_date = DATE(tweet_timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_bets_capper_date ON bets (capper_id, tweet_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_legs_status ON legs (status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_legs_bet_id ON legs (bet_id)")
+
+def _migration_3_bet_dedup_key(cursor):
+    # Single-leg bets carry a dedup key, so duplicate picks are rejected by a unique index
+    cursor.execute("ALTER TABLE bets ADD COLUMN dedup_key TEXT")
+    rows = cursor.execute('''
+        SELECT b.bet_id, b.capper_id, b.tweet_date, l.subject, l.bet_type, l.line, l.bet_qualifier
+        FROM bets b JOIN legs l ON l.bet_id = b.bet_id
+        WHERE (SELECT COUNT(*) FROM legs WHERE bet_id = b.bet_id) = 1
+        ORDER BY b.bet_id
+    ''').fetchall()
+    seen_keys = set()
+    for row in rows:
+        key = _bet_dedup_key(row['capper_id'], row['tweet_date'], dict(row))
+        if key not in seen_keys:  # Keep only the oldest copy of any existing duplicates
+            seen_keys.add(key)
+            cursor.execute("UPDATE bets SET dedup_key = ? WHERE bet_id = ?", (key, row['bet_id']))
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_bets_dedup_key ON bets (dedup_key) WHERE dedup_key IS NOT NULL")
+
+def _migration_4_capper_stats(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS capper_stats (
+            capper_id TEXT NOT NULL,
+            league TEXT NOT NULL,
+            bet_type TEXT NOT NULL,
+            period_type TEXT NOT NULL,
+            period_key TEXT NOT NULL,
+            bets INTEGER NOT NULL DEFAULT 0,
+            wins INTEGER NOT NULL DEFAULT 0,
+            losses INTEGER NOT NULL DEFAULT 0,
+            pushes INTEGER NOT NULL DEFAULT 0,
+            units REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (capper_id, league, bet_type, period_type, period_key)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_capper_stats_board ON capper_stats (period_type, period_key, league, bet_type)")
+    _rebuild_capper_stats(cursor.connection)
+
+def _migration_5_leg_check_queue(cursor):
+    # The game a leg resolved to, and when it is next worth asking statsapi about it
+    cursor.execute("ALTER TABLE legs ADD COLUMN game_pk INTEGER")
+    cursor.execute("ALTER TABLE legs ADD COLUMN game_start DATETIME")
+    cursor.execute("ALTER TABLE legs ADD COLUMN next_check_at DATETIME")
+    cursor.execute("ALTER TABLE legs ADD COLUMN check_attempts INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_legs_status_next_check ON legs (status, next_check_at)")
+
+def _migration_6_tweet_log(cursor):
+    # Every scanned tweet and what came of it: the pick classifier's training data.
+    # has_pick is NULL for tweets the classifier skipped, since we never found out.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tweet_log (
+            tweet_id TEXT PRIMARY KEY,
+            capper_id TEXT NOT NULL,
+            tweet_text TEXT,
+            has_media INTEGER NOT NULL DEFAULT 0,
+            has_pick INTEGER,
+            pick_score REAL,
+            logged_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def _migration_7_ocr_cache_without_dhash(cursor):
+    # Early databases stored a dHash per OCR result that nothing ever read. SQLite before 3.35
+    # has no DROP COLUMN, so the table is rebuilt without it.
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(ocr_cache)").fetchall()]
+    if 'dhash' not in columns:
+        return
+    cursor.execute('''
+        CREATE TABLE ocr_cache_new (
+            content_hash TEXT PRIMARY KEY,
+            extracted_text TEXT,
+            detection_json TEXT,
+            size_bytes INTEGER NOT NULL,
+            last_used_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO ocr_cache_new (content_hash, extracted_text, detection_json, size_bytes, last_used_at)
+        SELECT content_hash, extracted_text, detection_json, size_bytes, last_used_at FROM ocr_cache
+    ''')
+    cursor.execute("DROP TABLE ocr_cache")
+    cursor.execute("ALTER TABLE ocr_cache_new RENAME TO ocr_cache")
+
+MIGRATIONS = [
+    (1, "initial schema", _migration_1_initial_schema),
+    (2, "bets.tweet_date and indexes for pending and duplicate lookups", _migration_2_hot_query_indexes),
+    (3, "bets.dedup_key unique index for single-leg duplicate picks", _migration_3_bet_dedup_key),
+    (4, "capper_stats leaderboard table", _migration_4_capper_stats),
+    (5, "legs game_pk, game_start and next_check_at grading queue", _migration_5_leg_check_queue),
+    (6, "tweet_log of scanned tweets for the pick classifier", _migration_6_tweet_log),
+    (7, "ocr_cache without the unused dhash column", _migration_7_ocr_cache_without_dhash),
+]
 
 # --- Capper Management Functions (Your existing code) ---
 def get_capper_by_username(username):
-    conn = connect_db()
-    capper = conn.execute("SELECT * FROM cappers WHERE username = ?", (username,)).fetchone()
-    conn.close()
-    return capper
+    return get_connection().execute("SELECT * FROM cappers WHERE username = ?", (username,)).fetchone()
 
 def add_capper(capper_id, username):
-    conn = connect_db()
-    conn.execute("INSERT OR REPLACE INTO cappers (capper_id, username) VALUES (?, ?)", (capper_id, username))
-    conn.commit()
-    conn.close()
-    print(f"Stored/Updated capper: @{username} with ID: {capper_id}")
+    with transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO cappers (capper_id, username) VALUES (?, ?)", (capper_id, username))
+    logger.info("Stored/Updated capper: @%s with ID: %s", username, capper_id)
 
 
 def get_last_seen_tweet_id(capper_id):
     """Retrieves the most recent tweet ID processed for a given capper."""
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT last_tweet_id FROM last_seen_tweets WHERE capper_id = ?", (capper_id,))
-    result = cursor.fetchone()
-    conn.close()
+    result = get_connection().execute("SELECT last_tweet_id FROM last_seen_tweets WHERE capper_id = ?", (capper_id,)).fetchone()
     return result['last_tweet_id'] if result else None
 
 def update_last_seen_tweet_id(capper_id, last_tweet_id):
     """Saves or updates the last seen tweet ID for a capper."""
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR REPLACE INTO last_seen_tweets (capper_id, last_tweet_id) VALUES (?, ?)",
-                   (capper_id, str(last_tweet_id)))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO last_seen_tweets (capper_id, last_tweet_id) VALUES (?, ?)",
+                      (capper_id, str(last_tweet_id)))
+
+# --- Bet Storage Functions ---
+
+# SQLite's default limit on host parameters is 999; stay well under it for IN (...) lookups
+_MAX_QUERY_PARAMS = 500
+
+def _bet_dedup_key(capper_id, pick_date, leg):
+    """
+    Identifies a single-leg pick: the same capper making the same pick on the same day is a duplicate.
+    Returns a string so a unique index on bets.dedup_key can enforce it.
+    """
+    line = '' if leg['line'] is None else repr(float(leg['line']))
+    return "|".join(str(part) for part in (capper_id, pick_date, leg['subject'], leg['bet_type'], line, leg['bet_qualifier']))
 
-# Replace your existing store_bet_and_legs function with this one.
-# It uses the NULL-safe 'IS' operator and checks the date of the original tweet.
+def _select_in_chunks(conn, sql, values):
+    """Runs a query with an IN ({placeholders}) clause over values in parameter-limit-sized chunks."""
+    values = list(values)
+    rows = []
+    for start in range(0, len(values), _MAX_QUERY_PARAMS):
+        chunk = values[start:start + _MAX_QUERY_PARAMS]
+        rows.extend(conn.execute(sql.format(placeholders=",".join("?" * len(chunk))), chunk).fetchall())
+    return rows
+
+def _existing_values(conn, column, values):
+    """Returns the subset of values already present in bets.<column>."""
+    return {row[0] for row in _select_in_chunks(conn, f"SELECT {column} FROM bets WHERE {column} IN ({{placeholders}})", values)}
+
+def _existing_leg_keys(conn, capper_dates):
+    """
+    Returns the _bet_dedup_key of every stored leg, single or parlay, for each (capper_id, tweet_date).
+    Each lookup is served by idx_bets_capper_date.
+    """
+    keys = set()
+    for capper_id, pick_date in capper_dates:
+        rows = conn.execute('''
+            SELECT l.subject, l.bet_type, l.line, l.bet_qualifier
+            FROM legs l JOIN bets b ON l.bet_id = b.bet_id
+            WHERE b.capper_id = ? AND b.tweet_date = ?
+        ''', (capper_id, pick_date)).fetchall()
+        keys.update(_bet_dedup_key(capper_id, pick_date, row) for row in rows)
+    return keys
+
+def store_bets_bulk(records):
+    """
+    Stores many detected bets with executemany and a single commit.
+    
+    Args:
+        records: List of dicts with 'capper_id', 'tweet_id', 'retweet_id', 'tweet_timestamp'
+                 and 'detection_result' (the output of detect_pick)
+    
+    Returns:
+        One outcome per record, in order: {'tweet_id', 'bet_id', 'status'} where status is
+        'STORED', 'DUPLICATE_TWEET' (tweet already stored) or 'DUPLICATE_PICK' (a single pick that
+        repeats any leg, of a single or a parlay, the capper already made that day).
+    """
+    prepared = []
+    for record in records:
+        legs_data = record['detection_result']['legs']
+        pick_date = datetime.fromisoformat(str(record['tweet_timestamp'])).strftime('%Y-%m-%d')
+        # We only dedupe single-leg bets, against every leg; parlays are unique by tweet
+        dedup_key = _bet_dedup_key(record['capper_id'], pick_date, legs_data[0]) if len(legs_data) == 1 else None
+        bet_format = 'Parlay' if record['detection_result']['is_parlay'] and len(legs_data) > 1 else 'Single'
+        prepared.append({
+            'tweet_id': str(record['tweet_id']),
+            'record': record,
+            'legs': legs_data,
+            'pick_date': pick_date,
+            'dedup_key': dedup_key,
+            'bet_format': bet_format,
+        })
+
+    outcomes = [{'tweet_id': item['tweet_id'], 'bet_id': None, 'status': None} for item in prepared]
+
+    with transaction() as conn:
+        # Reject duplicates against the database and within the batch itself (first one wins)
+        seen_tweets = _existing_values(conn, 'original_tweet_id', {item['tweet_id'] for item in prepared})
+        seen_keys = _existing_leg_keys(conn, {(str(item['record']['capper_id']), item['pick_date'])
+                                              for item in prepared if item['dedup_key']})
+        to_insert = []
+        for item, outcome in zip(prepared, outcomes):
+            if item['tweet_id'] in seen_tweets:
+                outcome['status'] = 'DUPLICATE_TWEET'
+            elif item['dedup_key'] and item['dedup_key'] in seen_keys:
+                outcome['status'] = 'DUPLICATE_PICK'
+            else:
+                seen_tweets.add(item['tweet_id'])
+                seen_keys.update(_bet_dedup_key(item['record']['capper_id'], item['pick_date'], leg) for leg in item['legs'])
+                to_insert.append((item, outcome))
+
+        if not to_insert:
+            return outcomes
+
+        conn.executemany('''
+            INSERT INTO bets (capper_id, original_tweet_id, our_retweet_id, bet_format, tweet_timestamp, tweet_date, dedup_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(item['record']['capper_id'], item['tweet_id'], item['record'].get('retweet_id'), item['bet_format'],
+               item['record']['tweet_timestamp'], item['pick_date'], item['dedup_key']) for item, _ in to_insert])
+
+        bet_ids = {row['original_tweet_id']: row['bet_id'] for row in _select_in_chunks(
+            conn, "SELECT bet_id, original_tweet_id FROM bets WHERE original_tweet_id IN ({placeholders})",
+            [item['tweet_id'] for item, _ in to_insert])}
+
+        leg_rows = []
+        for item, outcome in to_insert:
+            outcome['bet_id'] = bet_ids[item['tweet_id']]
+            outcome['status'] = 'STORED'
+            leg_rows.extend((outcome['bet_id'], leg['sport_league'], leg['subject'], leg['bet_type'], leg['line'],
+                             leg['odds'], leg['bet_qualifier']) for leg in item['legs'])
+        conn.executemany('''
+            INSERT INTO legs (bet_id, sport_league, subject, bet_type, line, odds, bet_qualifier)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', leg_rows)
+
+    logger.info("Stored %d of %d bet(s) in one batch.", len(to_insert), len(records))
+    return outcomes
 
 def store_bet_and_legs(capper_id, tweet_id, retweet_id, tweet_timestamp, detection_result):
     """
@@ -116,95 +477,166 @@ def store_bet_and_legs(capper_id, tweet_id, retweet_id, tweet_timestamp, detecti
     Args:
         detection_result: Dictionary with 'legs' and 'is_parlay' keys from detect_pick
     """
-    conn = connect_db()
-    cursor = conn.cursor()
-    
-    legs_data = detection_result['legs']
-    is_parlay = detection_result['is_parlay']
-    
     try:
-        # We only run the duplicate check for single-leg bets for now.
-        if len(legs_data) == 1:
-            first_leg = legs_data[0]
-            
-            # Use the tweet's date for the duplicate check to handle past games correctly.
-            pick_date = datetime.fromisoformat(str(tweet_timestamp)).strftime('%Y-%m-%d')
-            
-            cursor.execute('''
-                SELECT 1 FROM legs l
-                JOIN bets b ON l.bet_id = b.bet_id
-                WHERE b.capper_id = ?
-                  AND l.subject IS ?
-                  AND l.bet_type IS ?
-                  AND l.line IS ?
-                  AND l.bet_qualifier IS ?
-                  AND DATE(b.tweet_timestamp) = ?
-                LIMIT 1
-            ''', (capper_id, first_leg['subject'], first_leg['bet_type'], first_leg['line'], first_leg['bet_qualifier'], pick_date))
-            
-            existing_pick = cursor.fetchone()
-            
-            if existing_pick:
-                print(f"  --> Duplicate pick detected for {first_leg['subject']} on {pick_date}. Skipping storage.")
-                conn.close()
-                return None
-
-        # Determine bet format based on is_parlay flag and number of legs
-        if is_parlay and len(legs_data) > 1:
-            bet_format = 'Parlay'
-        else:
-            bet_format = 'Single'
-
-        cursor.execute('''
-            INSERT INTO bets (capper_id, original_tweet_id, our_retweet_id, bet_format, tweet_timestamp)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (capper_id, tweet_id, retweet_id, bet_format, tweet_timestamp))
-        
-        bet_id = cursor.lastrowid
-        
-        for leg in legs_data:
-            cursor.execute('''
-                INSERT INTO legs (bet_id, sport_league, subject, bet_type, line, odds, bet_qualifier)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (bet_id, leg['sport_league'], leg['subject'], leg['bet_type'], leg['line'], leg['odds'], leg['bet_qualifier']))
-        
-        conn.commit()
-        print(f"    --> Successfully stored Bet ID {bet_id} with {len(legs_data)} leg(s) as {bet_format}.")
-        return bet_id
-
-    except sqlite3.IntegrityError:
-        print(f"    --> Bet with original_tweet_id {tweet_id} already exists in DB. Skipping.")
-        conn.rollback()
-        return None
+        outcome = store_bets_bulk([{
+            'capper_id': capper_id,
+            'tweet_id': tweet_id,
+            'retweet_id': retweet_id,
+            'tweet_timestamp': tweet_timestamp,
+            'detection_result': detection_result,
+        }])[0]
     except Exception as e:
-        print(f"    --> An error occurred storing the bet: {e}")
-        conn.rollback()
+        logger.error("An error occurred storing the bet: %s", e, extra={'tweet_id': tweet_id})
         return None
-    finally:
-        conn.close()
+
+    if outcome['status'] == 'DUPLICATE_PICK':
+        logger.info("Duplicate pick detected for %s. Skipping storage.", detection_result['legs'][0]['subject'], extra={'tweet_id': tweet_id})
+    elif outcome['status'] == 'DUPLICATE_TWEET':
+        logger.info("Bet with original_tweet_id %s already exists in DB. Skipping.", tweet_id, extra={'tweet_id': tweet_id})
+    return outcome['bet_id']
 
 def get_pending_legs():
     """Fetches all pending legs, now including the bet's original tweet timestamp."""
-    conn = connect_db()
     # Add b.tweet_timestamp to the SELECT statement so we can use it for lookups
-    legs = conn.execute('''
+    legs = get_connection().execute('''
         SELECT l.*, b.tweet_timestamp FROM legs l
         JOIN bets b ON l.bet_id = b.bet_id
         WHERE l.status = 'PENDING_RESULT'
     ''').fetchall()
-    conn.close()
     return legs
 
+def to_db_time(moment):
+    """Formats a datetime like SQLite's CURRENT_TIMESTAMP (UTC), so stored times compare as text."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def get_due_legs(now):
+    """
+    Pending legs whose next check is due at `now`, most overdue first. Legs that have never
+    been checked have no next_check_at and are always due.
+    """
+    return get_connection().execute('''
+        SELECT l.*, b.tweet_timestamp FROM legs l
+        JOIN bets b ON l.bet_id = b.bet_id
+        WHERE l.status = 'PENDING_RESULT'
+          AND (l.next_check_at IS NULL OR l.next_check_at <= ?)
+        ORDER BY l.next_check_at IS NOT NULL, l.next_check_at
+    ''', (to_db_time(now),)).fetchall()
+
+def get_next_leg_check_at():
+    """
+    When the earliest pending leg is next due, as a naive UTC datetime. Returns None when nothing
+    is pending, and datetime.min when a leg has never been checked.
+    """
+    row = get_connection().execute('''
+        SELECT COUNT(*) AS pending, SUM(next_check_at IS NULL) AS unchecked, MIN(next_check_at) AS next_check_at
+        FROM legs WHERE status = 'PENDING_RESULT'
+    ''').fetchone()
+    if not row['pending']:
+        return None
+    if row['unchecked']:
+        return datetime.min
+    return datetime.strptime(row['next_check_at'], '%Y-%m-%d %H:%M:%S')
+
+def schedule_leg_checks(checks):
+    """
+    Records when ungraded legs should be checked again.
+    
+    Args:
+        checks: Dict of leg_id -> {'next_check_at': datetime, 'game_pk': int or None, 'game_start': datetime or None}.
+                A missing game_pk or game_start keeps the stored value.
+    """
+    if not checks:
+        return
+    with transaction() as conn:
+        conn.executemany('''
+            UPDATE legs SET next_check_at = ?,
+                            game_pk = COALESCE(?, game_pk),
+                            game_start = COALESCE(?, game_start),
+                            check_attempts = check_attempts + 1
+            WHERE leg_id = ?
+        ''', [(to_db_time(check['next_check_at']), check.get('game_pk'),
+               to_db_time(check['game_start']) if check.get('game_start') else None, leg_id)
+              for leg_id, check in checks.items()])
+
 def update_leg_status(leg_id, status):
-    """Updates the status of a specific leg (e.g., to WIN or LOSS)."""
-    conn = connect_db()
-    conn.execute("UPDATE legs SET status = ? WHERE leg_id = ?", (status, leg_id))
-    conn.commit()
-    conn.close()
-    print(f"Updated leg {leg_id} to status {status}")
+    """Updates the status of a specific leg (e.g., to WIN or LOSS) and its parent bet, in one transaction."""
+    update_leg_statuses({leg_id: status})
+
+def update_leg_statuses(statuses):
+    """
+    Grades many legs at once: one executemany for the legs, then one set-based rollup
+    for every parlay they belong to, and the matching capper_stats updates, all in a single transaction.
     
-    # After updating a leg, check if we need to update the parent bet status
-    update_bet_status_from_legs(leg_id)
+    Args:
+        statuses: Dict of leg_id -> status ('WIN', 'LOSS' or 'PUSH')
+    """
+    if not statuses:
+        return
+    with transaction() as conn:
+        # Snapshot the legs and their bets first, so stats can be diffed against the old statuses
+        previous_legs = _select_in_chunks(conn, '''
+            SELECT l.leg_id, l.bet_id, l.sport_league, l.bet_type, l.odds, l.status,
+                   b.capper_id, b.tweet_date, b.bet_format, b.status AS bet_status
+            FROM legs l JOIN bets b ON l.bet_id = b.bet_id
+            WHERE l.leg_id IN ({placeholders})
+        ''', statuses)
+
+        conn.executemany("UPDATE legs SET status = ? WHERE leg_id = ?", [(status, leg_id) for leg_id, status in statuses.items()])
+        for leg_id, status in statuses.items():
+            logger.info("Updated leg %s to status %s", leg_id, status, extra={'leg_id': leg_id})
+        
+        # After updating the legs, settle any parent parlays they completed
+        bet_ids = {row['bet_id'] for row in previous_legs}
+        rollup_parlay_statuses(bet_ids)
+        _record_stats_changes(conn, previous_legs, statuses)
+
+# Settles parlays whose legs are all graded: WIN if all legs WIN, PUSH if all legs PUSH, otherwise
+# LOSS (any losing leg, or a mix of wins and pushes). Singles are never touched, each leg stands alone.
+_PARLAY_STATUS_CASE = '''
+    CASE WHEN SUM(status = 'WIN') = COUNT(*) THEN 'WIN'
+         WHEN SUM(status = 'PUSH') = COUNT(*) THEN 'PUSH'
+         ELSE 'LOSS' END
+'''
+
+def rollup_parlay_statuses(bet_ids=None):
+    """
+    Recomputes parlay statuses from their legs with one aggregate query per chunk of bets.
+    Pass bet_ids to limit the rollup to the bets touched by a grading pass; None rolls up every parlay.
+    Returns a dict of bet_id -> new status for the bets that changed.
+    """
+    if bet_ids is not None:
+        bet_ids = list(bet_ids)
+        if not bet_ids:
+            return {}
+        chunks = [bet_ids[start:start + _MAX_QUERY_PARAMS] for start in range(0, len(bet_ids), _MAX_QUERY_PARAMS)]
+    else:
+        chunks = [None]
+
+    changed = {}
+    with transaction() as conn:
+        for chunk in chunks:
+            leg_filter = f"WHERE bet_id IN ({','.join('?' * len(chunk))})" if chunk else ""
+            # A SELECT plus executemany rather than UPDATE ... FROM ... RETURNING, which need
+            # SQLite 3.33/3.35; some Python builds still link an older library.
+            rows = conn.execute(f'''
+                SELECT bets.bet_id, rollup.new_status AS status
+                FROM (
+                    SELECT bet_id, {_PARLAY_STATUS_CASE} AS new_status
+                    FROM legs {leg_filter}
+                    GROUP BY bet_id
+                    HAVING SUM(status = 'PENDING_RESULT') = 0
+                ) AS rollup
+                JOIN bets ON bets.bet_id = rollup.bet_id
+                WHERE bets.bet_format = 'Parlay'
+                  AND bets.status != rollup.new_status
+            ''', chunk or ()).fetchall()
+            conn.executemany("UPDATE bets SET status = ? WHERE bet_id = ?", [(row['status'], row['bet_id']) for row in rows])
+            for row in rows:
+                changed[row['bet_id']] = row['status']
+                logger.info("Updated bet %s status to %s", row['bet_id'], row['status'], extra={'bet_id': row['bet_id']})
+    return changed
 
 def update_bet_status_from_legs(leg_id):
     """
@@ -212,95 +644,341 @@ def update_bet_status_from_legs(leg_id):
     For parlays: WIN if all legs WIN, LOSS if any leg LOSS, PUSH if all legs PUSH.
     For singles: No change to bet status (each leg is independent).
     """
-    conn = connect_db()
-    cursor = conn.cursor()
-    
     try:
-        # Get the bet_id and bet_format for this leg
-        cursor.execute('''
-            SELECT b.bet_id, b.bet_format, b.status as bet_status
-            FROM bets b
-            JOIN legs l ON b.bet_id = l.bet_id
-            WHERE l.leg_id = ?
-        ''', (leg_id,))
-        
-        bet_info = cursor.fetchone()
-        if not bet_info:
-            return
-            
-        bet_id, bet_format, current_bet_status = bet_info['bet_id'], bet_info['bet_format'], bet_info['bet_status']
-        
-        # Only update bet status for parlays
-        if bet_format != 'Parlay':
+        row = get_connection().execute("SELECT bet_id FROM legs WHERE leg_id = ?", (leg_id,)).fetchone()
+        if row:
+            rollup_parlay_statuses([row['bet_id']])
+    except Exception as e:
+        logger.error("Error updating bet status: %s", e, extra={'leg_id': leg_id})
+
+def set_parlay_rollup_trigger(enabled):
+    """
+    Installs or removes a trigger that settles a parlay as soon as its last leg is graded,
+    for writers that update legs directly instead of going through update_leg_statuses.
+    """
+    with transaction() as conn:
+        if not enabled:
+            conn.execute("DROP TRIGGER IF EXISTS trg_legs_parlay_rollup")
             return
-            
-        # Get all legs for this bet
-        cursor.execute('''
-            SELECT status FROM legs WHERE bet_id = ?
-        ''', (bet_id,))
-        
-        leg_statuses = [row['status'] for row in cursor.fetchall()]
-        
-        # Check if all legs have been graded
-        if 'PENDING_RESULT' in leg_statuses:
-            return  # Not all legs are graded yet
-            
-        # Determine bet status based on leg statuses
-        if all(status == 'WIN' for status in leg_statuses):
-            new_bet_status = 'WIN'
-        elif any(status == 'LOSS' for status in leg_statuses):
-            new_bet_status = 'LOSS'
-        elif all(status == 'PUSH' for status in leg_statuses):
-            new_bet_status = 'PUSH'
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_legs_parlay_rollup
+            AFTER UPDATE OF status ON legs
+            WHEN NOT EXISTS (SELECT 1 FROM legs WHERE bet_id = NEW.bet_id AND status = 'PENDING_RESULT')
+            BEGIN
+                UPDATE bets SET status = (SELECT {_PARLAY_STATUS_CASE} FROM legs WHERE bet_id = NEW.bet_id)
+                WHERE bet_id = NEW.bet_id AND bet_format = 'Parlay';
+            END
+        ''')
+
+# --- Capper Stats Functions ---
+# capper_stats holds running win/loss/push counts and units per capper, for every combination of
+# league (or 'ALL'), bet type (or 'ALL') and period ('all', 'season', 'week', 'day'). Singles count
+# once per leg; a parlay counts once, as bet type 'Parlay', when it settles.
+
+# Odds assumed for picks posted without them
+DEFAULT_ODDS = -110
+
+STAT_STATUSES = ('WIN', 'LOSS', 'PUSH')
+
+def _decimal_odds(odds):
+    odds = odds if odds else DEFAULT_ODDS
+    return 1 + (odds / 100 if odds > 0 else 100 / abs(odds))
+
+def _units_for(status, decimal_odds):
+    """Profit in units for a one-unit stake."""
+    if status == 'WIN':
+        return decimal_odds - 1
+    if status == 'LOSS':
+        return -1.0
+    return 0.0
+
+def _stat_periods(tweet_date):
+    day = datetime.strptime(tweet_date, '%Y-%m-%d').date()
+    iso_year, iso_week, _ = day.isocalendar()
+    return [('all', 'all'), ('season', str(day.year)), ('week', f"{iso_year}-W{iso_week:02d}"), ('day', tweet_date)]
+
+def _stat_rows(capper_id, league, bet_type, tweet_date, status, decimal_odds, sign):
+    """Expands one graded outcome (sign=+1) or its reversal (sign=-1) into capper_stats deltas."""
+    if status not in STAT_STATUSES or not tweet_date:
+        return []
+    units = sign * _units_for(status, decimal_odds)
+    counts = [sign if status == outcome else 0 for outcome in STAT_STATUSES]
+    return [
+        (capper_id, stat_league, stat_bet_type, period_type, period_key, sign, *counts, units)
+        for stat_league in {league or 'UNKNOWN', 'ALL'}
+        for stat_bet_type in {bet_type, 'ALL'}
+        for period_type, period_key in _stat_periods(tweet_date)
+    ]
+
+def _apply_stat_rows(conn, rows):
+    conn.executemany('''
+        INSERT INTO capper_stats (capper_id, league, bet_type, period_type, period_key, bets, wins, losses, pushes, units)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (capper_id, league, bet_type, period_type, period_key) DO UPDATE SET
+            bets = bets + excluded.bets,
+            wins = wins + excluded.wins,
+            losses = losses + excluded.losses,
+            pushes = pushes + excluded.pushes,
+            units = units + excluded.units
+    ''', rows)
+
+def _parlay_stat_rows(conn, bet_ids, sign, statuses=None):
+    """Stat rows for settled parlays. statuses overrides the stored bet status (used for reversals)."""
+    rows = []
+    legs_by_bet = {}
+    for leg in _select_in_chunks(conn, "SELECT bet_id, sport_league, odds FROM legs WHERE bet_id IN ({placeholders})", bet_ids):
+        legs_by_bet.setdefault(leg['bet_id'], []).append(leg)
+    for bet in _select_in_chunks(conn, "SELECT bet_id, capper_id, tweet_date, overall_odds, status FROM bets WHERE bet_id IN ({placeholders})", bet_ids):
+        legs = legs_by_bet.get(bet['bet_id'], [])
+        leagues = {leg['sport_league'] for leg in legs}
+        league = leagues.pop() if len(leagues) == 1 else 'MULTI'
+        if bet['overall_odds']:
+            decimal_odds = _decimal_odds(bet['overall_odds'])
         else:
-            # Mixed results (some WIN, some PUSH) - this shouldn't happen in practice
-            new_bet_status = 'LOSS'
-            
-        # Update bet status if it changed
-        if new_bet_status != current_bet_status:
-            cursor.execute('UPDATE bets SET status = ? WHERE bet_id = ?', (new_bet_status, bet_id))
-            conn.commit()
-            print(f"Updated bet {bet_id} status from {current_bet_status} to {new_bet_status}")
-            
-    except Exception as e:
-        print(f"Error updating bet status: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+            decimal_odds = 1.0
+            for leg in legs:
+                decimal_odds *= _decimal_odds(leg['odds'])
+        status = statuses[bet['bet_id']] if statuses else bet['status']
+        rows.extend(_stat_rows(bet['capper_id'], league, 'Parlay', bet['tweet_date'], status, decimal_odds, sign))
+    return rows
+
+def _record_stats_changes(conn, previous_legs, statuses):
+    """Applies the stat deltas for one grading pass, reversing any outcome that was re-graded."""
+    rows = []
+    for leg in previous_legs:
+        if leg['bet_format'] != 'Single':
+            continue
+        new_status = statuses[leg['leg_id']]
+        if new_status == leg['status']:
+            continue
+        decimal_odds = _decimal_odds(leg['odds'])
+        rows.extend(_stat_rows(leg['capper_id'], leg['sport_league'], leg['bet_type'], leg['tweet_date'], leg['status'], decimal_odds, -1))
+        rows.extend(_stat_rows(leg['capper_id'], leg['sport_league'], leg['bet_type'], leg['tweet_date'], new_status, decimal_odds, 1))
+
+    # Parlays: compare each affected bet's status before and after the rollup
+    previous_bet_status = {leg['bet_id']: leg['bet_status'] for leg in previous_legs if leg['bet_format'] == 'Parlay'}
+    if previous_bet_status:
+        current = {row['bet_id']: row['status'] for row in _select_in_chunks(
+            conn, "SELECT bet_id, status FROM bets WHERE bet_id IN ({placeholders})", previous_bet_status)}
+        changed = [bet_id for bet_id, status in previous_bet_status.items() if current.get(bet_id) != status]
+        if changed:
+            rows.extend(_parlay_stat_rows(conn, changed, -1, {bet_id: previous_bet_status[bet_id] for bet_id in changed}))
+            rows.extend(_parlay_stat_rows(conn, changed, 1))
+
+    if rows:
+        _apply_stat_rows(conn, rows)
+
+def rebuild_capper_stats():
+    """Recomputes capper_stats from the full bet history. Only needed after manual edits to bets or legs."""
+    with transaction() as conn:
+        _rebuild_capper_stats(conn)
+
+def _rebuild_capper_stats(conn):
+    conn.execute("DELETE FROM capper_stats")
+    rows = []
+    for leg in conn.execute('''
+        SELECT l.sport_league, l.bet_type, l.odds, l.status, b.capper_id, b.tweet_date
+        FROM legs l JOIN bets b ON l.bet_id = b.bet_id
+        WHERE b.bet_format = 'Single' AND l.status IN ('WIN', 'LOSS', 'PUSH')
+    '''):
+        rows.extend(_stat_rows(leg['capper_id'], leg['sport_league'], leg['bet_type'], leg['tweet_date'], leg['status'], _decimal_odds(leg['odds']), 1))
+    parlay_ids = [row[0] for row in conn.execute("SELECT bet_id FROM bets WHERE bet_format = 'Parlay' AND status IN ('WIN', 'LOSS', 'PUSH')")]
+    rows.extend(_parlay_stat_rows(conn, parlay_ids, 1))
+    _apply_stat_rows(conn, rows)
+
+LEADERBOARD_ORDERS = {
+    'units': 'units DESC',
+    'roi': 'roi DESC',
+    'win_rate': 'win_rate DESC',
+    'wins': 'wins DESC',
+}
+
+def get_leaderboard(period_type='all', period_key='all', league='ALL', bet_type='ALL', order_by='units', min_bets=1, limit=None):
+    """
+    Ranks cappers from the capper_stats table; the cost depends on the number of cappers, not bets.
+    Runs on the read-only connection so it never waits on the scan or grading writers.
+    
+    Returns:
+        Rows with capper_id, username, bets, wins, losses, pushes, units, win_rate (pushes excluded) and roi.
+    """
+    if order_by not in LEADERBOARD_ORDERS:
+        raise ValueError(f"order_by must be one of {sorted(LEADERBOARD_ORDERS)}")
+    sql = f'''
+        SELECT s.capper_id, c.username, s.bets, s.wins, s.losses, s.pushes, s.units,
+               CAST(s.wins AS REAL) / NULLIF(s.wins + s.losses, 0) AS win_rate,
+               s.units / NULLIF(s.bets, 0) AS roi
+        FROM capper_stats s LEFT JOIN cappers c ON c.capper_id = s.capper_id
+        WHERE s.period_type = ? AND s.period_key = ? AND s.league = ? AND s.bet_type = ? AND s.bets >= ?
+        ORDER BY {LEADERBOARD_ORDERS[order_by]}, s.bets DESC
+    '''
+    params = [period_type, period_key, league, bet_type, min_bets]
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return get_read_connection().execute(sql, params).fetchall()
+
+def get_capper_stats(capper_id, period_type='all', period_key='all'):
+    """Returns a capper's stats rows (every league and bet type breakdown) for one period."""
+    return get_read_connection().execute('''
+        SELECT * FROM capper_stats WHERE capper_id = ? AND period_type = ? AND period_key = ?
+        ORDER BY league, bet_type
+    ''', (capper_id, period_type, period_key)).fetchall()
+
+# --- Player Lookup Cache Functions ---
+def get_cached_player_lookup(lookup_key):
+    """Retrieves a cached player lookup, or None if the name has never been looked up."""
+    return get_connection().execute("SELECT * FROM player_lookup_cache WHERE lookup_key = ?", (lookup_key,)).fetchone()
+
+def cache_player_lookup(lookup_key, player_id, team_id, league, full_name):
+    """Saves the result of a player lookup. Pass player_id=None to cache a miss."""
+    with transaction() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO player_lookup_cache (lookup_key, player_id, team_id, league, full_name, cached_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (lookup_key, player_id, team_id, league, full_name))
+
+# --- Player Roster Functions ---
+def replace_player_roster(players):
+    """
+    Replaces the stored roster with a fresh pull.
+    
+    Args:
+        players: List of dicts with 'player_id', 'full_name', 'use_name', 'last_name', 'team_id' and 'league'
+    """
+    with transaction() as conn:
+        conn.execute("DELETE FROM player_roster")
+        conn.executemany('''
+            INSERT OR REPLACE INTO player_roster (player_id, full_name, use_name, last_name, team_id, league)
+            VALUES (:player_id, :full_name, :use_name, :last_name, :team_id, :league)
+        ''', players)
+
+def get_player_roster():
+    """Retrieves every stored roster entry."""
+    return get_connection().execute("SELECT * FROM player_roster").fetchall()
+
+def get_player_roster_loaded_at():
+    """Returns when the stored roster was last refreshed, or None if it is empty."""
+    row = get_connection().execute("SELECT MIN(loaded_at) AS loaded_at FROM player_roster").fetchone()
+    return row['loaded_at'] if row else None
+
+# --- Sports API Cache Functions ---
+def get_cached_api_response(cache_key):
+    """Retrieves a stored statsapi response as a JSON string, or None."""
+    row = get_connection().execute("SELECT payload FROM sports_api_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+    return row['payload'] if row else None
+
+def cache_api_response(cache_key, payload):
+    """Stores a statsapi response (a JSON string) permanently."""
+    with transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO sports_api_cache (cache_key, payload) VALUES (?, ?)", (cache_key, payload))
+
+# --- OCR Cache Functions ---
+def get_ocr_cache_entry(content_hash):
+    """Retrieves a cached OCR result and marks it as recently used."""
+    with transaction() as conn:
+        row = conn.execute("SELECT * FROM ocr_cache WHERE content_hash = ?", (content_hash,)).fetchone()
+        if row:
+            conn.execute("UPDATE ocr_cache SET last_used_at = CURRENT_TIMESTAMP WHERE content_hash = ?", (content_hash,))
+    return row
+
+def store_ocr_cache_entry(content_hash, extracted_text, detection_json):
+    """Saves an OCR result (and the picks detected in it, as JSON) for an image."""
+    size_bytes = len(extracted_text or '') + len(detection_json or '')
+    with transaction() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO ocr_cache (content_hash, extracted_text, detection_json, size_bytes, last_used_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (content_hash, extracted_text, detection_json, size_bytes))
+
+def evict_ocr_cache(max_bytes):
+    """Deletes the least recently used OCR results until the cache fits in max_bytes. Returns rows deleted."""
+    with transaction() as conn:
+        cursor = conn.execute('''
+            DELETE FROM ocr_cache WHERE content_hash IN (
+                SELECT content_hash FROM (
+                    SELECT content_hash,
+                           SUM(size_bytes) OVER (ORDER BY last_used_at DESC, rowid DESC) AS running_bytes
+                    FROM ocr_cache
+                ) WHERE running_bytes > ?
+            )
+        ''', (max_bytes,))
+    return cursor.rowcount
+
+# --- Processed Media Functions ---
+def get_processed_media(media_key, media_url):
+    """Finds a previously processed image by its X media_key or, failing that, its URL."""
+    return get_connection().execute(
+        "SELECT * FROM processed_media WHERE media_key = ? OR media_url = ? LIMIT 1",
+        (media_key or media_url, media_url)
+    ).fetchone()
+
+def record_processed_media(media_key, media_url, tweet_id, extracted_text, detection_json):
+    """Remembers the outcome of processing an image. Media without a media_key are keyed by URL."""
+    with transaction() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO processed_media (media_key, media_url, tweet_id, extracted_text, detection_json)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (media_key or media_url, media_url, tweet_id, extracted_text, detection_json))
+
+# --- Tweet Log Functions ---
+def log_tweets(entries):
+    """
+    Records scanned tweets in one statement. Each entry has 'tweet_id', 'capper_id', 'tweet_text',
+    'has_media', 'has_pick' (None if skipped) and 'pick_score' (None without a classifier).
+    A tweet scanned again keeps its latest outcome.
+    """
+    if not entries:
+        return
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO tweet_log (tweet_id, capper_id, tweet_text, has_media, has_pick, pick_score)
+            VALUES (:tweet_id, :capper_id, :tweet_text, :has_media, :has_pick, :pick_score)
+            ON CONFLICT (tweet_id) DO UPDATE SET
+                tweet_text = excluded.tweet_text, has_media = excluded.has_media,
+                has_pick = excluded.has_pick, pick_score = excluded.pick_score, logged_at = CURRENT_TIMESTAMP
+        ''', [{**entry, 'has_media': int(bool(entry['has_media'])),
+                 'has_pick': None if entry['has_pick'] is None else int(bool(entry['has_pick']))} for entry in entries])
+
+def get_classifier_training_examples():
+    """
+    Returns (tweet_text, has_media, is_pick) for every logged tweet whose outcome is known, oldest first.
+    A tweet counts as a pick if detection found one or a bet was stored for it.
+    """
+    rows = get_connection().execute('''
+        SELECT t.tweet_text, t.has_media, (t.has_pick = 1 OR b.bet_id IS NOT NULL) AS is_pick
+        FROM tweet_log t
+        LEFT JOIN bets b ON b.original_tweet_id = t.tweet_id
+        WHERE t.has_pick IS NOT NULL OR b.bet_id IS NOT NULL
+        ORDER BY t.logged_at, t.tweet_id
+    ''').fetchall()
+    return [(row['tweet_text'], bool(row['has_media']), bool(row['is_pick'])) for row in rows]
 
 def get_all_cappers():
     """Retrieves all cappers from the database."""
-    conn = connect_db()
-    cappers = conn.execute("SELECT * FROM cappers ORDER BY username").fetchall()
-    conn.close()
-    return cappers
+    return get_connection().execute("SELECT * FROM cappers ORDER BY username").fetchall()
 
 def remove_capper_by_username(username: str) -> bool:
     """Removes a capper and their 'last_seen' record by username."""
-    conn = connect_db()
-    cursor = conn.cursor()
     try:
-        # First, get the ID for the username
-        capper = get_capper_by_username(username)
-        if not capper:
-            return False
+        with transaction() as conn:
+            # First, get the ID for the username
+            capper = get_capper_by_username(username)
+            if not capper:
+                return False
 
-        capper_id = capper['capper_id']
-        
-        # Delete from all related tables
-        cursor.execute("DELETE FROM last_seen_tweets WHERE capper_id = ?", (capper_id,))
-        cursor.execute("DELETE FROM cappers WHERE capper_id = ?", (capper_id,))
-        # Note: We are NOT deleting their old bets, so their history is preserved.
-        
-        conn.commit()
+            capper_id = capper['capper_id']
+            
+            # Delete from all related tables
+            conn.execute("DELETE FROM last_seen_tweets WHERE capper_id = ?", (capper_id,))
+            cursor = conn.execute("DELETE FROM cappers WHERE capper_id = ?", (capper_id,))
+            # Note: We are NOT deleting their old bets, so their history is preserved.
+            
         # rowcount will be > 0 if a row was deleted
         return cursor.rowcount > 0
     except Exception as e:
-        print(f"Error removing capper @{username}: {e}")
-        conn.rollback()
+        logger.error("Error removing capper @%s: %s", username, e)
         return False
-    finally:
-        conn.close()
 
 if __name__ == '__main__':
+    configure_logging()
     init_db()
\ No newline at end of file
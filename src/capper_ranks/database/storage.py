@@ -0,0 +1,37 @@
+# src/capper_ranks/database/storage.py
+
+import sqlite3
+from pathlib import Path
+from ..core import config
+
+def _apply_pragmas(conn):
+    """Applies the per-connection pragmas from config."""
+    conn.execute(f"PRAGMA busy_timeout = {int(config.DB_BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA synchronous = {config.DB_SYNCHRONOUS}")
+    # A negative cache_size is in KiB rather than pages
+    conn.execute(f"PRAGMA cache_size = -{int(config.DB_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size = {int(config.DB_MMAP_SIZE)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+def open_connection(database_name=None):
+    """
+    Opens a read-write connection with the journal mode and pragmas from config.
+    The journal mode is stored in the database file, so setting it on every open is cheap.
+    """
+    conn = sqlite3.connect(database_name or config.DATABASE_NAME, timeout=config.DB_BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA journal_mode = {config.DB_JOURNAL_MODE}")
+    _apply_pragmas(conn)
+    return conn
+
+def open_read_only_connection(database_name=None):
+    """
+    Opens a read-only connection for reporting and stats queries. In WAL mode it reads
+    a consistent snapshot and never blocks, or is blocked by, the scan and grading writers.
+    """
+    uri = Path(database_name or config.DATABASE_NAME).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, timeout=config.DB_BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    _apply_pragmas(conn)
+    conn.execute("PRAGMA query_only = ON")
+    return conn
@@ -0,0 +1,187 @@
+"""
+Asyncio runner for the bot: the same fetch -> detect -> download -> OCR -> store -> grade
+work as bot.main_loop, but as stages connected by bounded queues. Each stage has its own
+concurrency limit, so a slow OCR job or statsapi call only holds up its own stage.
+
+Run with: python -m capper_ranks.pipeline
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from capper_ranks import bot
+from capper_ranks.core import config
+from capper_ranks.database import models
+from capper_ranks.services import x_client
+from capper_ranks.services.image_processor import image_processor
+from capper_ranks.utils.log import configure_logging, get_logger
+
+logger = get_logger(__name__)
+
+@dataclass
+class TweetJob:
+    """One tweet moving through the pipeline."""
+    capper_id: str
+    tweet: object
+    media: List[Dict]
+    images: List[Dict] = field(default_factory=list)
+    detection_result: Optional[Dict] = None
+    tweet_log_entry: Optional[Dict] = None
+    skipped: bool = False
+    failed: bool = False
+
+@dataclass
+class CapperBatch:
+    """Tracks a capper's tweets so picks and since_id are stored together once all of them are done."""
+    latest_tweet_id: object
+    remaining: int
+    picks: List = field(default_factory=list)
+    tweet_log: List[Dict] = field(default_factory=list)
+    failed: bool = False
+
+class Pipeline:
+    """
+    Stages, each a pool of worker tasks reading from its own bounded queue:
+      fetch    -- one task per capper, at most SCAN_WORKERS fetching at a time
+      detect   -- pick classifier gate and text detection (PIPELINE_DETECT_WORKERS)
+      download -- media dedup, download and OCR cache lookups (PIPELINE_DOWNLOAD_WORKERS)
+      ocr      -- OCR on the process pool plus image detection (PIPELINE_OCR_WORKERS)
+      persist  -- a single writer that stores each capper's batch and advances its since_id
+    Grading runs alongside as its own task.
+    """
+
+    def __init__(self, client, queue_size: Optional[int] = None):
+        self.client = client
+        queue_size = queue_size or config.PIPELINE_QUEUE_SIZE
+        self.detect_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.download_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.ocr_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.persist_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.fetch_slots = asyncio.Semaphore(max(1, config.SCAN_WORKERS))
+        self.batches: Dict[str, CapperBatch] = {}
+
+    async def run(self, capper_ids: List[str], grade: bool = True):
+        """Scans every capper through the pipeline and, if grade is set, grades pending legs meanwhile."""
+        workers = (
+            [asyncio.create_task(self._worker(self.detect_queue, self._detect)) for _ in range(max(1, config.PIPELINE_DETECT_WORKERS))]
+            + [asyncio.create_task(self._worker(self.download_queue, self._download)) for _ in range(max(1, config.PIPELINE_DOWNLOAD_WORKERS))]
+            + [asyncio.create_task(self._worker(self.ocr_queue, self._ocr)) for _ in range(max(1, config.PIPELINE_OCR_WORKERS))]
+            + [asyncio.create_task(self._worker(self.persist_queue, self._persist))]
+        )
+        grading = asyncio.create_task(asyncio.to_thread(bot.process_pending_results)) if grade else None
+        try:
+            await asyncio.gather(*(self._fetch(capper_id) for capper_id in capper_ids))
+            # Work only flows forward, so draining the queues in stage order drains the pipeline
+            for queue in (self.detect_queue, self.download_queue, self.ocr_queue, self.persist_queue):
+                await queue.join()
+            if grading:
+                await grading
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _worker(self, queue: asyncio.Queue, handle):
+        while True:
+            job = await queue.get()
+            try:
+                next_queue = await handle(job)
+            except Exception as e:
+                logger.error("Pipeline error on tweet %s for capper ID %s: %s", job.tweet.id, job.capper_id, e,
+                             extra={'tweet_id': job.tweet.id, 'capper_id': job.capper_id})
+                job.failed = True
+                next_queue = self.persist_queue if queue is not self.persist_queue else None
+            try:
+                if next_queue is not None:
+                    await next_queue.put(job)
+            finally:
+                queue.task_done()
+
+    async def _fetch(self, capper_id: str):
+        async with self.fetch_slots:
+            try:
+                last_seen_id = await asyncio.to_thread(models.get_last_seen_tweet_id, capper_id)
+                logger.info("Fetching new tweets for capper ID: %s (since_id: %s)", capper_id, last_seen_id, extra={'capper_id': capper_id})
+                tweets_with_media = await asyncio.to_thread(x_client.get_tweets_with_media, self.client, capper_id, since_id=last_seen_id)
+            except Exception as e:
+                logger.error("An error occurred during tweet scan for capper ID %s: %s", capper_id, e, extra={'capper_id': capper_id})
+                return
+        if not tweets_with_media:
+            logger.info("No new tweets found for capper ID: %s.", capper_id, extra={'capper_id': capper_id})
+            return
+
+        self.batches[capper_id] = CapperBatch(latest_tweet_id=tweets_with_media[0]['tweet'].id, remaining=len(tweets_with_media))
+        # Oldest first, like the synchronous scan; put() waits while the detect stage is backed up
+        for tweet_data in reversed(tweets_with_media):
+            await self.detect_queue.put(TweetJob(capper_id, tweet_data['tweet'], tweet_data.get('media') or []))
+
+    async def _detect(self, job: TweetJob) -> asyncio.Queue:
+        process, job.tweet_log_entry = await asyncio.to_thread(bot.gate_tweet, job.capper_id, job.tweet, job.media)
+        if not process:
+            job.skipped = True
+            return self.persist_queue
+        job.detection_result = await asyncio.to_thread(bot.detect_text_picks, job.tweet)
+        if job.detection_result or not job.media:
+            return self.persist_queue
+        return self.download_queue
+
+    async def _download(self, job: TweetJob) -> asyncio.Queue:
+        job.images = await asyncio.to_thread(bot.prepare_tweet_images, job.media)
+        if any(not image['cached'] for image in job.images):
+            return self.ocr_queue
+        job.detection_result = await asyncio.to_thread(bot.resolve_tweet_images, job.tweet, job.images)
+        return self.persist_queue
+
+    async def _ocr(self, job: TweetJob) -> asyncio.Queue:
+        uncached = [image for image in job.images if not image['cached']]
+        raw_texts = await asyncio.gather(*(image_processor.ocr_executor.submit_async(image.pop('buffer').getvalue()) for image in uncached))
+        for image, raw_text in zip(uncached, raw_texts):
+            image['extracted_text'] = image_processor._clean_ocr_text(raw_text) if raw_text is not None else None
+        job.detection_result = await asyncio.to_thread(bot.resolve_tweet_images, job.tweet, job.images)
+        return self.persist_queue
+
+    async def _persist(self, job: TweetJob) -> None:
+        batch = self.batches[job.capper_id]
+        batch.remaining -= 1
+        batch.failed = batch.failed or job.failed
+        if job.detection_result:
+            batch.picks.append((job.tweet, job.detection_result))
+        if job.tweet_log_entry:
+            if not job.skipped:
+                job.tweet_log_entry['has_pick'] = job.detection_result is not None
+            batch.tweet_log.append(job.tweet_log_entry)
+        if batch.remaining:
+            return None
+
+        del self.batches[job.capper_id]
+        if batch.failed:
+            # Leave since_id alone so the failed tweets are picked up again next run
+            logger.warning("Not advancing since_id for capper ID %s: some tweets failed.", job.capper_id, extra={'capper_id': job.capper_id})
+            return None
+        # Workers finish out of order; store picks oldest first
+        batch.picks.sort(key=lambda pick: int(pick[0].id))
+        await asyncio.to_thread(bot.store_capper_picks, job.capper_id, batch.latest_tweet_id, batch.picks, batch.tweet_log)
+        return None
+
+async def run_pipeline(client, capper_ids: List[str], grade: bool = True):
+    """Runs one pipeline pass on a thread pool big enough for every stage's blocking calls."""
+    loop = asyncio.get_running_loop()
+    max_threads = (max(1, config.SCAN_WORKERS) + max(1, config.PIPELINE_DETECT_WORKERS)
+                   + max(1, config.PIPELINE_DOWNLOAD_WORKERS) + max(1, config.PIPELINE_OCR_WORKERS) * 2 + 2)
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="pipeline"))
+    await Pipeline(client).run(capper_ids, grade=grade)
+
+def main():
+    configure_logging()
+    logger.info("Capper-Ranks bot starting up (async pipeline)")
+    models.init_db()
+    client = x_client.get_x_client()
+    if not client:
+        logger.error("Could not start bot: X client authentication failed.")
+        return
+    capper_ids = bot.resolve_capper_ids(client)
+    asyncio.run(run_pipeline(client, capper_ids))
+    logger.info("Bot has finished its run.")
+
+if __name__ == "__main__":
+    main()
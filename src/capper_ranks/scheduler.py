@@ -0,0 +1,161 @@
+"""
+Long-running daemon mode for the bot. Instead of one scan-and-grade pass per cron run,
+the scheduler keeps the process (and its roster index, API and OCR caches) warm, rescans
+each capper on an interval adapted to how often they post, and grades when games
+can actually have finished (see the legs' next_check_at queue). SIGTERM and SIGINT stop it after the current tick.
+
+Run with: python -m capper_ranks.scheduler
+"""
+import signal
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from capper_ranks import bot
+from capper_ranks.core import config
+from capper_ranks.database import models
+from capper_ranks.services import x_client
+from capper_ranks.services.image_processor import image_processor
+from capper_ranks.utils.log import configure_logging, get_logger
+
+logger = get_logger(__name__)
+
+# Weight of the latest scan in each capper's posting-rate estimate
+POSTING_RATE_SMOOTHING = 0.3
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+@dataclass
+class CapperScanState:
+    """When a capper was last scanned and how often they post, in tweets per hour."""
+    capper_id: str
+    next_scan_at: datetime
+    last_scan_at: Optional[datetime] = None
+    tweets_per_hour: Optional[float] = None
+
+    def record_scan(self, now: datetime, new_tweets: Optional[int]):
+        """Updates the posting rate after a scan and schedules the next one."""
+        min_interval = timedelta(minutes=config.SCHEDULER_MIN_SCAN_MINUTES)
+        max_interval = timedelta(minutes=config.SCHEDULER_MAX_SCAN_MINUTES)
+        if new_tweets is None:
+            # The scan failed; try again soon without touching the rate estimate
+            self.next_scan_at = now + min_interval
+            return
+        if self.last_scan_at is not None:
+            hours = max((now - self.last_scan_at).total_seconds() / 3600, 1e-6)
+            rate = new_tweets / hours
+            if self.tweets_per_hour is None:
+                self.tweets_per_hour = rate
+            else:
+                self.tweets_per_hour = POSTING_RATE_SMOOTHING * rate + (1 - POSTING_RATE_SMOOTHING) * self.tweets_per_hour
+        self.last_scan_at = now
+        # Aim for about one new tweet per scan: busy cappers are checked often, quiet ones rarely
+        if self.tweets_per_hour:
+            interval = timedelta(hours=1 / self.tweets_per_hour)
+        else:
+            interval = max_interval if self.tweets_per_hour == 0 else min_interval
+        self.next_scan_at = now + min(max(interval, min_interval), max_interval)
+
+class Scheduler:
+    """Runs scans and grading on their own cadences until stop() is called or a signal arrives."""
+
+    def __init__(self, client):
+        self.client = client
+        self.cappers: Dict[str, CapperScanState] = {}
+        # Both are due on the first tick
+        self.next_grade_at = datetime.min.replace(tzinfo=timezone.utc)
+        self.next_capper_refresh_at = datetime.min.replace(tzinfo=timezone.utc)
+        self._stop = threading.Event()
+
+    def stop(self, *_):
+        """Asks the loop to exit once the current tick is finished."""
+        logger.info("Shutdown requested, finishing the current tick...")
+        self._stop.set()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def run(self):
+        while not self._stop.is_set():
+            self.tick(_utcnow())
+            wait_seconds = (self.next_wake_at() - _utcnow()).total_seconds()
+            if wait_seconds > 0:
+                self._stop.wait(wait_seconds)
+        logger.info("Scheduler stopped.")
+
+    def tick(self, now: datetime):
+        """
+        Does whatever is due at `now`: refreshing the capper list, scanning due cappers, grading.
+        A step that fails is logged and retried later, so one bad call never ends the daemon.
+        """
+        retry_at = now + timedelta(minutes=config.SCHEDULER_RETRY_MINUTES)
+        if now >= self.next_capper_refresh_at:
+            try:
+                self.refresh_cappers(now)
+            except Exception:
+                logger.exception("Refreshing cappers failed; retrying at %s UTC", format(retry_at, '%Y-%m-%d %H:%M'))
+                self.next_capper_refresh_at = retry_at
+
+        due = [state.capper_id for state in self.cappers.values() if state.next_scan_at <= now]
+        if due:
+            logger.info("Scanning %d capper(s) that are due", len(due))
+            try:
+                new_tweet_counts = bot.scan_cappers(self.client, due)
+            except Exception:
+                logger.exception("Scanning %d capper(s) failed", len(due))
+                new_tweet_counts = {}
+            for capper_id in due:
+                self.cappers[capper_id].record_scan(now, new_tweet_counts.get(capper_id))
+
+        if now >= self.next_grade_at and not self._stop.is_set():
+            try:
+                bot.process_pending_results(now)
+                self.next_grade_at = self.next_grading_time(now)
+            except Exception:
+                logger.exception("Grading pass failed")
+                self.next_grade_at = retry_at
+            logger.info("Next grading pass at %s UTC", format(self.next_grade_at, '%Y-%m-%d %H:%M'))
+
+    def refresh_cappers(self, now: datetime):
+        """Re-resolves the configured usernames, keeping the scan state of cappers we already track."""
+        capper_ids = [str(capper_id) for capper_id in bot.resolve_capper_ids(self.client)]
+        self.cappers = {capper_id: self.cappers.get(capper_id) or CapperScanState(capper_id, next_scan_at=now)
+                        for capper_id in capper_ids}
+        self.next_capper_refresh_at = now + timedelta(hours=config.SCHEDULER_CAPPER_REFRESH_HOURS)
+
+    def next_grading_time(self, now: datetime) -> datetime:
+        """Wakes for grading when the earliest pending leg is due, and at least every SCHEDULER_MAX_GRADE_MINUTES."""
+        latest = now + timedelta(minutes=config.SCHEDULER_MAX_GRADE_MINUTES)
+        next_check_at = models.get_next_leg_check_at()
+        if next_check_at is None:
+            return latest
+        if next_check_at == datetime.min:
+            # Picks stored since the last pass have never been checked
+            return now
+        return min(max(next_check_at.replace(tzinfo=timezone.utc), now), latest)
+
+    def next_wake_at(self) -> datetime:
+        times = [self.next_grade_at, self.next_capper_refresh_at]
+        times.extend(state.next_scan_at for state in self.cappers.values())
+        return min(times)
+
+def main():
+    configure_logging()
+    logger.info("Capper-Ranks scheduler starting up")
+    models.init_db()
+    client = x_client.get_x_client()
+    if not client:
+        logger.error("Could not start scheduler: X client authentication failed.")
+        return
+    scheduler = Scheduler(client)
+    scheduler.install_signal_handlers()
+    try:
+        scheduler.run()
+    finally:
+        image_processor.ocr_executor.shutdown()
+        models.close_connection()
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,264 @@
+import asyncio
+import hashlib
+import io
+import json
 import os
+import re
+import sqlite3
+import threading
+import time
 import requests
-import tempfile
-from typing import List, Optional, Tuple
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import BinaryIO, List, Optional, Union
 from PIL import Image
 import pytesseract
+from capper_ranks.core import config
+from capper_ranks.database import models
+from capper_ranks.utils.log import get_logger, sampled_debug
+
+logger = get_logger(__name__)
+
+# Limits for slip images, enforced while the bytes stream in and before any pixels are decoded
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+MAX_IMAGE_PIXELS = 40_000_000
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# How often a caller checks whether its queued OCR job has started, so job_timeout counts run time only
+OCR_START_POLL_SECONDS = 0.05
+
+# Every regex used to clean OCR text, compiled once at import.
+# Line-level patterns use [^\S\n] so they never reach across a line break.
+OCR_PATTERNS = {
+    # "+" after a digit: group 1 is set when a capital letter follows directly
+    'plus_spacing': re.compile(r'(?<=\d)\+(?=([A-Z])?)(?=[A-Z\s])'),
+    'text_trailing_fe': re.compile(r'\s+fe\s*$'),
+    'text_trailing_letters': re.compile(r'\s+[A-Z]{1,2}\s*$'),
+    'text_trailing_symbols': re.compile(r'\s+[^A-Za-z0-9\s\.]+$'),
+    'decimal_trailing_digits': re.compile(r'(\d+\.\d+)\s+(\d+)'),
+    'decimal_trailing_i': re.compile(r'(\d+\.\d+)I'),
+    'line_trailing_fe': re.compile(r'[^\S\n]+fe[^\S\n]*$', re.MULTILINE),
+    'line_trailing_letters': re.compile(r'[^\S\n]+[A-Z]{1,2}[^\S\n]*$', re.MULTILINE),
+    'line_trailing_symbols': re.compile(r'[^\S\n]+[^A-Za-z0-9\s\.]+$', re.MULTILINE),
+    'alt_prop_odds': re.compile(r"[A-Za-z .'-]+\s+1\+\s*\+?\d+"),
+    'trailing_odds': re.compile(r"\s*\+\d+$"),
+    'over_under_stat': re.compile(r'(over|under|o|u)\s+\d+\.?\d*\s+[a-zA-Z\s]+', re.IGNORECASE),
+    'to_hit_home_run': re.compile(r'[A-Z]\s+TO\s+HIT\s+A?\s*(HOME RUN|Home Run)', re.IGNORECASE),
+    'plus_total_bases': re.compile(r'\d+\+\s*(TOTAL BASES|Total Bases)', re.IGNORECASE),
+    'plus_total_bases_loose': re.compile(r'\d+\+\s*(TOTAL\s*BASES?|Total\s*Bases?)', re.IGNORECASE),
+    'trailing_lowercase_letters': re.compile(r'\s+[a-z]{1,2}\s*$'),
+}
+
+class ImageTooLargeError(Exception):
+    """Raised when an image exceeds MAX_IMAGE_BYTES or MAX_IMAGE_PIXELS."""
+
+def _load_rgb_image(image_source: Union[BinaryIO, str]) -> Image.Image:
+    """Opens an image, checks MAX_IMAGE_PIXELS from the header alone, then decodes it as RGB."""
+    with Image.open(image_source) as image:
+        if image.width * image.height > MAX_IMAGE_PIXELS:
+            raise ImageTooLargeError(f"Image is {image.width}x{image.height}, over {MAX_IMAGE_PIXELS} pixels")
+        # Convert to RGB if necessary (some images might be RGBA)
+        return image.convert('RGB')
+
+def _run_ocr(image_bytes: bytes, timeout: float) -> str:
+    """OCR pool job: decodes an image and returns tesseract's raw text. Must stay picklable."""
+    return pytesseract.image_to_string(_load_rgb_image(io.BytesIO(image_bytes)), timeout=timeout)
+
+class OCRExecutor:
+    """
+    Runs tesseract jobs on a pool of worker processes sized to the machine's cores.
+    At most max_queue_size jobs are in flight; submit() blocks once the queue is full.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue_size: Optional[int] = None,
+                 job_timeout: Optional[float] = None, use_processes: bool = True):
+        self.max_workers = max_workers or config.OCR_WORKERS or os.cpu_count() or 1
+        self.job_timeout = job_timeout or config.OCR_TIMEOUT_SECONDS
+        self.use_processes = use_processes
+        self._slots = threading.BoundedSemaphore(max_queue_size or config.OCR_QUEUE_SIZE)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        # The pool is created on first use so importing this module never forks
+        with self._pool_lock:
+            if self._pool is None:
+                pool_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+                self._pool = pool_class(max_workers=self.max_workers)
+            return self._pool
+
+    def submit(self, image_bytes: bytes) -> Future:
+        """Queues an OCR job and returns a Future for tesseract's raw text."""
+        self._slots.acquire()
+        try:
+            future = self._get_pool().submit(_run_ocr, image_bytes, self.job_timeout)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    async def submit_async(self, image_bytes: bytes) -> Optional[str]:
+        """Awaitable version of submit() + result() for asyncio callers."""
+        loop = asyncio.get_running_loop()
+        # submit() may block on a full queue, so it runs off the event loop
+        future = await loop.run_in_executor(None, self.submit, image_bytes)
+        while not (future.running() or future.done()):
+            await asyncio.sleep(OCR_START_POLL_SECONDS)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.job_timeout)
+        except asyncio.TimeoutError:
+            logger.error("OCR job timed out after %ss", self.job_timeout)
+            return None
+        except Exception as e:
+            logger.error("OCR job failed: %s", e)
+            return None
+
+    def result(self, future: Future) -> Optional[str]:
+        """
+        Waits up to job_timeout, counted from when the job starts running, for its raw text.
+        Returns None on timeout or failure.
+        """
+        # Jobs queued behind a busy pool haven't started yet; they shouldn't time out for it
+        while not (future.running() or future.done()):
+            time.sleep(OCR_START_POLL_SECONDS)
+        try:
+            return future.result(timeout=self.job_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            logger.error("OCR job timed out after %ss", self.job_timeout)
+            return None
+        except Exception as e:
+            logger.error("OCR job failed: %s", e)
+            return None
+
+    def map(self, images: List[bytes]) -> List[Optional[str]]:
+        """Runs OCR on several images in parallel and returns their raw texts in order."""
+        futures = [self.submit(image_bytes) for image_bytes in images]
+        return [self.result(future) for future in futures]
+
+    def shutdown(self, wait: bool = True):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
+
+def compute_content_hash(image_bytes: bytes) -> str:
+    """Returns the SHA-256 of the exact image bytes, the key OCR results are cached under."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+class OCRResultCache:
+    """
+    Persistent cache of OCR text and detected picks, keyed by the SHA-256 of the image bytes.
+    Only exact byte matches are reused: slips rendered from the same sportsbook template look
+    nearly identical even when their picks differ, so a re-encoded copy is OCR'd again.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, evict_every: Optional[int] = None):
+        self.max_bytes = max_bytes if max_bytes is not None else config.OCR_CACHE_MAX_BYTES
+        self.evict_every = evict_every or config.OCR_CACHE_EVICT_EVERY
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+
+    def get(self, content_hash: str) -> Optional[dict]:
+        """Returns {'extracted_text', 'detection_result'} for this exact image, or None."""
+        try:
+            # Reading marks the entry as recently used, which is a write
+            with models.write_lock:
+                row = models.get_ocr_cache_entry(content_hash)
+        except sqlite3.Error:
+            return None
+        if not row:
+            return None
+        return {
+            'extracted_text': row['extracted_text'],
+            'detection_result': json.loads(row['detection_json']) if row['detection_json'] else None,
+        }
+
+    def put(self, content_hash: str, extracted_text: Optional[str], detection_result: Optional[dict]):
+        """
+        Stores the OCR text and detection result for an image. Every evict_every puts, old
+        entries are evicted until the cache is back within max_bytes.
+        """
+        detection_json = json.dumps(detection_result) if detection_result else None
+        with self._lock:
+            self._puts_since_evict += 1
+            evict = self._puts_since_evict >= self.evict_every
+            if evict:
+                self._puts_since_evict = 0
+        try:
+            with models.write_lock:
+                models.store_ocr_cache_entry(content_hash, extracted_text, detection_json)
+                if evict:
+                    models.evict_ocr_cache(self.max_bytes)
+        except sqlite3.Error as e:
+            logger.debug("Could not cache OCR result: %s", e)
+
+    def reset_eviction_counter(self):
+        """Restarts the count of puts since the last eviction. Cached results stay in the database."""
+        with self._lock:
+            self._puts_since_evict = 0
 
 class ImageProcessor:
     """Service for processing images in tweets and extracting text using OCR."""
     
-    def __init__(self):
+    def __init__(self, ocr_executor: Optional[OCRExecutor] = None, ocr_cache: Optional[OCRResultCache] = None):
         # Configure tesseract path if needed (common on macOS)
         if os.path.exists('/usr/local/bin/tesseract'):
             pytesseract.pytesseract.tesseract_cmd = '/usr/local/bin/tesseract'
         elif os.path.exists('/opt/homebrew/bin/tesseract'):
             pytesseract.pytesseract.tesseract_cmd = '/opt/homebrew/bin/tesseract'
+        self.ocr_executor = ocr_executor or OCRExecutor()
+        self.ocr_cache = ocr_cache or OCRResultCache()
     
-    def download_image(self, image_url: str) -> Optional[str]:
+    def download_image(self, image_url: str) -> Optional[io.BytesIO]:
         """
-        Downloads an image from a URL and saves it to a temporary file.
+        Streams an image from a URL into memory, rejecting it as soon as it exceeds MAX_IMAGE_BYTES.
         
         Args:
             image_url: URL of the image to download
             
         Returns:
-            Path to the downloaded image file, or None if download failed
+            In-memory buffer positioned at the start of the image, or None if download failed
         """
         try:
-            response = requests.get(image_url, timeout=10)
-            response.raise_for_status()
-            
-            # Create a temporary file with .jpg extension
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-            temp_file.write(response.content)
-            temp_file.close()
+            response = requests.get(image_url, timeout=10, stream=True)
+            try:
+                response.raise_for_status()
+                
+                # Reject early when the server tells us the size up front
+                content_length = response.headers.get('Content-Length')
+                if content_length and int(content_length) > MAX_IMAGE_BYTES:
+                    raise ImageTooLargeError(f"Content-Length {content_length} exceeds {MAX_IMAGE_BYTES} bytes")
+                
+                buffer = io.BytesIO()
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    buffer.write(chunk)
+                    if buffer.tell() > MAX_IMAGE_BYTES:
+                        raise ImageTooLargeError(f"Image exceeds {MAX_IMAGE_BYTES} bytes")
+            finally:
+                response.close()
             
-            print(f"  DEBUG: Downloaded image to {temp_file.name}")
-            return temp_file.name
+            buffer.seek(0)
+            sampled_debug(logger, "Downloaded image (%d bytes)", buffer.getbuffer().nbytes)
+            return buffer
             
         except Exception as e:
-            print(f"  ERROR: Failed to download image from {image_url}: {e}")
+            logger.error("Failed to download image from %s: %s", image_url, e)
             return None
     
-    def extract_text_from_image(self, image_path: str) -> Optional[str]:
+    def extract_text_from_image(self, image_source: Union[BinaryIO, str]) -> Optional[str]:
         """
         Extracts text from an image using OCR.
         
         Args:
-            image_path: Path to the image file
+            image_source: In-memory image buffer, or a path to an image file (which is deleted afterwards)
             
         Returns:
             Extracted text, or None if OCR failed
         """
         try:
-            # Open and preprocess the image
-            image = Image.open(image_path)
-            
-            # Convert to RGB if necessary (some images might be RGBA)
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+            # Image.open only reads the header, so the pixel limit is checked before decoding
+            image = _load_rgb_image(image_source)
             
             # Extract text using OCR
             text = pytesseract.image_to_string(image)
@@ -65,18 +266,19 @@ class ImageProcessor:
             # Clean up the extracted text
             cleaned_text = self._clean_ocr_text(text)
             
-            print(f"  DEBUG: OCR extracted text: {cleaned_text[:100]}...")
+            sampled_debug(logger, "OCR extracted text: %.100r", cleaned_text)
             return cleaned_text
             
         except Exception as e:
-            print(f"  ERROR: OCR failed for image {image_path}: {e}")
+            logger.error("OCR failed for image: %s", e)
             return None
         finally:
-            # Clean up the temporary file
-            try:
-                os.unlink(image_path)
-            except:
-                pass
+            # Clean up image files passed in by path
+            if isinstance(image_source, str):
+                try:
+                    os.unlink(image_source)
+                except OSError:
+                    pass
     
     def _clean_ocr_text(self, text: str) -> str:
         """
@@ -94,7 +296,7 @@ class ImageProcessor:
         # Remove extra whitespace and normalize line breaks
         lines = [line.strip() for line in text.split('\n') if line.strip()]
         
-        # Remove common OCR artifacts
+        # Remove common OCR artifacts. These replacements feed into each other, so order matters.
         cleaned = '\n'.join(lines)
         cleaned = cleaned.replace('|', 'I')  # Common OCR mistake
         cleaned = cleaned.replace('0ver', 'Over')  # Common OCR mistake: 0ver -> Over
@@ -104,41 +306,28 @@ class ImageProcessor:
         cleaned = cleaned.replace('5I', '5')
         cleaned = cleaned.replace('9I', '5')
         cleaned = cleaned.replace('1.9', '1.5')
-        cleaned = cleaned.replace('1.9 5', '1.5')
-        cleaned = cleaned.replace('1.9 5I', '1.5')
-        
-        import re
         
         # Fix ParlayScience-specific OCR artifacts
         cleaned = cleaned.replace('AHOME RUN', 'A HOME RUN')  # Missing space
-        cleaned = cleaned.replace('AHOME RUNS', 'A HOME RUNS')  # Missing space
-        cleaned = re.sub(r'(\d+)\+([A-Z]+)', r'\1+ \2', cleaned)  # "2+TOTALBASES" -> "2+ TOTALBASES"
-        cleaned = re.sub(r'(\d+)\+([A-Z\s]+)', r'\1+ \2', cleaned)  # "2+ TOTALBASES" -> "2+ TOTAL BASES"
+        # "2+TOTALBASES" -> "2+  TOTALBASES", "2+ TOTAL" -> "2+  TOTAL" (the detector allows any spacing)
+        cleaned = OCR_PATTERNS['plus_spacing'].sub(lambda m: '+  ' if m.group(1) else '+ ', cleaned)
         
         # Remove common OCR artifacts that interfere with detection
         cleaned = cleaned.replace('~', '')  # Remove tilde characters
-        cleaned = cleaned.replace('~~', '')  # Remove double tildes
-        cleaned = re.sub(r'\s+fe\s*$', '', cleaned)  # Remove "fe" at end of lines
-        cleaned = re.sub(r'\s+[A-Z]{1,2}\s*$', '', cleaned)  # Remove single/double letters at end
-        cleaned = re.sub(r'\s+[^A-Za-z0-9\s\.]+$', '', cleaned)  # Remove symbols at end of lines
+        # At the very end of the text these may also swallow the line break before them
+        cleaned = OCR_PATTERNS['text_trailing_fe'].sub('', cleaned)  # Remove "fe" at the end
+        cleaned = OCR_PATTERNS['text_trailing_letters'].sub('', cleaned)  # Remove single/double letters at the end
+        cleaned = OCR_PATTERNS['text_trailing_symbols'].sub('', cleaned)  # Remove symbols at the end
         
         # Additional OCR cleaning
-        cleaned = re.sub(r'(\d+\.\d+)\s+(\d+)', r'\1', cleaned)
-        cleaned = re.sub(r'(\d+\.\d+)I', r'\1', cleaned)
-        
-        # Split into lines for processing
-        lines = cleaned.split('\n')
+        cleaned = OCR_PATTERNS['decimal_trailing_digits'].sub(r'\1', cleaned)
+        cleaned = OCR_PATTERNS['decimal_trailing_i'].sub(r'\1', cleaned)
         
-        # Clean each line individually
-        cleaned_lines = []
-        for line in lines:
-            # Remove common OCR artifacts that interfere with detection
-            line = line.replace('~', '')  # Remove tilde characters
-            line = line.replace('~~', '')  # Remove double tildes
-            line = re.sub(r'\s+fe\s*$', '', line)  # Remove "fe" at end of lines
-            line = re.sub(r'\s+[A-Z]{1,2}\s*$', '', line)  # Remove single/double letters at end
-            line = re.sub(r'\s+[^A-Za-z0-9\s\.]+$', '', line)  # Remove symbols at end of lines
-            cleaned_lines.append(line)
+        # Clean each line: one multiline pass per artifact instead of a loop over lines
+        cleaned = OCR_PATTERNS['line_trailing_fe'].sub('', cleaned)  # Remove "fe" at end of lines
+        cleaned = OCR_PATTERNS['line_trailing_letters'].sub('', cleaned)  # Remove single/double letters at end
+        cleaned = OCR_PATTERNS['line_trailing_symbols'].sub('', cleaned)  # Remove symbols at end of lines
+        cleaned_lines = cleaned.split('\n')
         
         # Combine split player prop lines (e.g., "CARLOS NARVAEZ\nOVER 1.5 TOTAL BASES")
         combined_lines = []
@@ -146,11 +335,11 @@ class ImageProcessor:
         while i < len(cleaned_lines):
             current_line = cleaned_lines[i]
             # Merge 'Player 1+ +odds' with next 'ALT Home Runs' or 'ALT Home Run' line
-            if re.match(r"[A-Za-z .'-]+\s+1\+\s*\+?\d+", current_line) and i + 1 < len(cleaned_lines):
+            if OCR_PATTERNS['alt_prop_odds'].match(current_line) and i + 1 < len(cleaned_lines):
                 next_line = cleaned_lines[i + 1]
                 if next_line.strip().upper() in ["ALT HOME RUNS", "ALT HOME RUN"]:
                     # Remove odds from current_line
-                    player_part = re.sub(r"\s*\+\d+$", "", current_line)
+                    player_part = OCR_PATTERNS['trailing_odds'].sub("", current_line)
                     merged = f"{player_part} Home Runs"
                     combined_lines.append(merged)
                     i += 2
@@ -158,7 +347,7 @@ class ImageProcessor:
             # Merge player name + 1+ with next line if it's a stat type
             if (current_line.isupper() and not any(char.isdigit() for char in current_line) and len(current_line.split()) <= 3 and i + 1 < len(cleaned_lines)):
                 next_line = cleaned_lines[i + 1]
-                if re.search(r'(over|under|o|u)\s+\d+\.?\d*\s+[a-zA-Z\s]+', next_line, re.IGNORECASE):
+                if OCR_PATTERNS['over_under_stat'].search(next_line):
                     combined_line = f"{current_line} {next_line}"
                     combined_lines.append(combined_line)
                     i += 2
@@ -169,7 +358,7 @@ class ImageProcessor:
                 not any(char in current_line for char in ['+', '-', '$', '%']) and
                 i + 1 < len(cleaned_lines)):
                 next_line = cleaned_lines[i + 1]
-                if re.search(r'[A-Z]\s+TO\s+HIT\s+A?\s*(HOME RUN|Home Run)', next_line, re.IGNORECASE):
+                if OCR_PATTERNS['to_hit_home_run'].search(next_line):
                     # Combine player name with the bet
                     combined_line = f"{current_line} {next_line}"
                     combined_lines.append(combined_line)
@@ -181,7 +370,7 @@ class ImageProcessor:
                 not any(char in current_line for char in ['+', '-', '$', '%', '\\', '/']) and
                 i + 1 < len(cleaned_lines)):
                 next_line = cleaned_lines[i + 1]
-                if re.search(r'\d+\+\s*(TOTAL BASES|Total Bases)', next_line, re.IGNORECASE):
+                if OCR_PATTERNS['plus_total_bases'].search(next_line):
                     # Combine player name with the bet
                     combined_line = f"{current_line} {next_line}"
                     combined_lines.append(combined_line)
@@ -194,9 +383,9 @@ class ImageProcessor:
                 i + 1 < len(cleaned_lines)):
                 next_line = cleaned_lines[i + 1]
                 # More flexible pattern to match "2+ TOTALBASES" or "2+ TOTAL BASES"
-                if re.search(r'\d+\+\s*(TOTAL\s*BASES?|Total\s*Bases?)', next_line, re.IGNORECASE):
+                if OCR_PATTERNS['plus_total_bases_loose'].search(next_line):
                     # Clean up the player name by removing extra characters
-                    clean_player_name = re.sub(r'\s+[a-z]{1,2}\s*$', '', current_line).strip()
+                    clean_player_name = OCR_PATTERNS['trailing_lowercase_letters'].sub('', current_line).strip()
                     combined_line = f"{clean_player_name} {next_line}"
                     combined_lines.append(combined_line)
                     i += 2
@@ -205,6 +394,19 @@ class ImageProcessor:
             i += 1
         return '\n'.join(combined_lines)
     
+    def extract_text_from_images(self, image_buffers: List[io.BytesIO]) -> List[Optional[str]]:
+        """
+        Extracts text from several in-memory images in parallel on the OCR executor.
+        
+        Args:
+            image_buffers: Downloaded images, as returned by download_image
+            
+        Returns:
+            Cleaned text for each image in order, or None where OCR failed or timed out
+        """
+        raw_texts = self.ocr_executor.map([buffer.getvalue() for buffer in image_buffers])
+        return [self._clean_ocr_text(text) if text is not None else None for text in raw_texts]
+    
     def process_image_url(self, image_url: str) -> Optional[str]:
         """
         Downloads an image and extracts text from it.
@@ -215,11 +417,11 @@ class ImageProcessor:
         Returns:
             Extracted text, or None if processing failed
         """
-        image_path = self.download_image(image_url)
-        if not image_path:
+        image_buffer = self.download_image(image_url)
+        if not image_buffer:
             return None
         
-        return self.extract_text_from_image(image_path)
+        return self.extract_text_from_image(image_buffer)
 
 # Global instance for reuse
 image_processor = ImageProcessor() 
\ No newline at end of file
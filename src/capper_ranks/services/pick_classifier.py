@@ -0,0 +1,212 @@
+import json
+import math
+import os
+import random
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+from capper_ranks.core import config
+from capper_ranks.services.pick_lexer import tokenize, WORD, SYMBOL, STAT, QUALIFIER
+from capper_ranks.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Token kinds that become features by kind alone; words and symbols keep their text
+_TEXT_KINDS = {WORD, SYMBOL}
+# Kinds that also keep their value, since which stat or qualifier it is matters
+_VALUE_KINDS = {STAT, QUALIFIER}
+
+MODEL_VERSION = 1
+
+def tweet_features(text: Optional[str], has_media: bool) -> List[str]:
+    """
+    Turns a tweet into its feature strings: pick_lexer token unigrams and bigrams, with
+    teams, numbers, odds and spreads generalized to their kind, plus whether it has media.
+    """
+    features = ['__media__' if has_media else '__no_media__']
+    lines = [line.strip() for line in (text or '').split('\n') if line.strip()]
+    if not lines:
+        features.append('__no_text__')
+    for line in lines:
+        terms = ['^']
+        for token in tokenize(line):
+            if token.kind in _TEXT_KINDS:
+                terms.append(token.text.lower())
+            elif token.kind in _VALUE_KINDS:
+                terms.append(f"{token.kind}:{token.value}")
+            else:
+                terms.append(token.kind)
+        terms.append('$')
+        features.extend(terms[1:-1])
+        features.extend(f"{first} {second}" for first, second in zip(terms, terms[1:]))
+    return features
+
+class PickClassifier:
+    """
+    Hashed-feature naive Bayes that estimates whether a tweet contains a pick, so chatter can
+    skip detection and image download/OCR. Trained offline from tweet_log and bets by
+    scripts/train_pick_classifier.py; the score threshold is chosen at training time to keep
+    PICK_CLASSIFIER_MIN_RECALL of the pick tweets. Without a trained model every tweet passes.
+    """
+
+    def __init__(self, buckets: Optional[int] = None, alpha: float = 1.0):
+        self.buckets = buckets or config.PICK_CLASSIFIER_BUCKETS
+        self.alpha = alpha
+        self.class_docs = [0, 0]
+        self.feature_counts: List[Dict[int, int]] = [{}, {}]
+        self.threshold: Optional[float] = None
+        self._log_probs: Optional[Tuple] = None
+        self._loaded_from: Optional[Tuple[str, float]] = None
+        self._lock = threading.Lock()
+
+    # --- Training ---
+
+    def _bucket(self, feature: str) -> int:
+        # crc32 rather than hash(), which changes between processes
+        return zlib.crc32(feature.encode('utf-8')) % self.buckets
+
+    def _feature_buckets(self, features: List[str]) -> set:
+        # Presence, not counts: a slip listing five props shouldn't outweigh everything else
+        return {self._bucket(feature) for feature in features}
+
+    def fit(self, examples: Iterable[Tuple[Optional[str], bool, bool]]) -> 'PickClassifier':
+        """Trains on (text, has_media, is_pick) examples, replacing any previous training."""
+        self.reset()
+        for text, has_media, is_pick in examples:
+            label = 1 if is_pick else 0
+            self.class_docs[label] += 1
+            counts = self.feature_counts[label]
+            for bucket in self._feature_buckets(tweet_features(text, has_media)):
+                counts[bucket] = counts.get(bucket, 0) + 1
+        return self
+
+    def choose_threshold(self, examples: Iterable[Tuple[Optional[str], bool, bool]], min_recall: Optional[float] = None) -> float:
+        """
+        Sets the threshold to the highest score that still lets min_recall of the pick
+        examples through, and returns it. With no pick examples every tweet passes.
+        """
+        min_recall = config.PICK_CLASSIFIER_MIN_RECALL if min_recall is None else min_recall
+        pick_scores = sorted(self.score(text, has_media) for text, has_media, is_pick in examples if is_pick)
+        if not pick_scores:
+            self.threshold = -math.inf
+            return self.threshold
+        allowed_misses = int(math.floor((1.0 - min_recall) * len(pick_scores) + 1e-9))
+        self.threshold = pick_scores[min(allowed_misses, len(pick_scores) - 1)]
+        return self.threshold
+
+    # --- Scoring ---
+
+    @property
+    def is_trained(self) -> bool:
+        return self.class_docs[0] > 0 and self.class_docs[1] > 0
+
+    def _get_log_probs(self) -> Tuple:
+        """Returns (log-odds prior, log-odds of a bucket never seen in training, {bucket: log-odds})."""
+        if self._log_probs is None:
+            # Binarized multinomial naive Bayes with add-alpha smoothing over every bucket
+            denominators = [sum(counts.values()) + self.alpha * self.buckets for counts in self.feature_counts]
+            prior = math.log(self.class_docs[1] / self.class_docs[0])
+            unseen = math.log(denominators[0] / denominators[1])
+            bucket_log_odds = {
+                bucket: math.log((self.feature_counts[1].get(bucket, 0) + self.alpha) / denominators[1])
+                        - math.log((self.feature_counts[0].get(bucket, 0) + self.alpha) / denominators[0])
+                for bucket in set(self.feature_counts[0]) | set(self.feature_counts[1])
+            }
+            self._log_probs = (prior, unseen, bucket_log_odds)
+        return self._log_probs
+
+    def _score_features(self, features: List[str]) -> float:
+        # Callers hold _lock, so a reload can't reset the model halfway through
+        if not self.is_trained:
+            return math.inf
+        prior, unseen, bucket_log_odds = self._get_log_probs()
+        return prior + sum(bucket_log_odds.get(bucket, unseen) for bucket in self._feature_buckets(features))
+
+    def score(self, text: Optional[str], has_media: bool) -> float:
+        """
+        Returns the log-odds that the tweet contains a pick (infinite when untrained).
+        Log-odds rather than a probability, which rounds to exactly 1.0 for most slips.
+        """
+        features = tweet_features(text, has_media)
+        with self._lock:
+            return self._score_features(features)
+
+    # --- Persistence ---
+
+    def to_dict(self) -> Dict:
+        return {
+            'version': MODEL_VERSION,
+            'buckets': self.buckets,
+            'alpha': self.alpha,
+            'class_docs': self.class_docs,
+            'feature_counts': [{str(bucket): count for bucket, count in counts.items()} for counts in self.feature_counts],
+            'threshold': self.threshold,
+        }
+
+    def reset(self):
+        """Forgets all training, so every tweet passes."""
+        self.class_docs = [0, 0]
+        self.feature_counts = [{}, {}]
+        self.threshold = None
+        self._log_probs = None
+
+    def load_dict(self, data: Dict):
+        if data.get('version') != MODEL_VERSION:
+            raise ValueError(f"Unsupported pick classifier version: {data.get('version')}")
+        self.buckets = data['buckets']
+        self.alpha = data['alpha']
+        self.class_docs = list(data['class_docs'])
+        self.feature_counts = [{int(bucket): count for bucket, count in counts.items()} for counts in data['feature_counts']]
+        self.threshold = data['threshold']
+        self._log_probs = None
+
+    def save(self, path: Optional[str] = None):
+        path = path or config.PICK_CLASSIFIER_PATH
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as model_file:
+            json.dump(self.to_dict(), model_file)
+        # Replace atomically so a running bot never reads half a model
+        os.replace(temp_path, path)
+
+    def reload_if_changed(self):
+        """Loads the model at PICK_CLASSIFIER_PATH if it is new or was retrained since the last load."""
+        path = config.PICK_CLASSIFIER_PATH
+        try:
+            modified_at = os.path.getmtime(path)
+        except OSError:
+            modified_at = None
+        with self._lock:
+            if self._loaded_from == (path, modified_at):
+                return
+            self._loaded_from = (path, modified_at)
+            if modified_at is None:
+                self.reset()
+                return
+            try:
+                with open(path) as model_file:
+                    self.load_dict(json.load(model_file))
+                logger.info("Loaded pick classifier from %s (threshold %.3f).", path, self.threshold)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Could not load pick classifier from %s, passing every tweet: %s", path, e)
+                self.reset()
+
+    def gate(self, text: Optional[str], has_media: bool) -> Tuple[bool, Optional[float]]:
+        """
+        Decides whether a tweet is worth detection and OCR.
+        Returns (process, score); score is None when no model is trained. A small
+        PICK_CLASSIFIER_AUDIT_RATE of rejected tweets is processed anyway, so their
+        outcomes keep recall measurable and can be trained on.
+        """
+        self.reload_if_changed()
+        features = tweet_features(text, has_media)
+        with self._lock:
+            if not self.is_trained:
+                return True, None
+            score = self._score_features(features)
+            threshold = self.threshold
+        if threshold is None or score >= threshold:
+            return True, score
+        return random.random() < config.PICK_CLASSIFIER_AUDIT_RATE, score
+
+# Global pick classifier instance
+pick_classifier = PickClassifier()
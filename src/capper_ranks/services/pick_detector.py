@@ -1,239 +1,297 @@
+import logging
 import re
-from typing import List, Optional, Tuple, Dict
+import string
+import threading
+from typing import Iterable, List, Optional, Tuple, Dict
+from capper_ranks.core import config
 from capper_ranks.core.mappings import TEAM_LEAGUE_MAP
 from capper_ranks.services import sports_api
+from capper_ranks.services.pick_lexer import (
+    Token, tokenize, first_token,
+    TEAM, QUALIFIER, PARLAY, STAT, PERIOD, MONEYLINE, HOME_RUN_PROP, NUMBER, SPREAD,
+)
+from capper_ranks.utils.helpers import LRUCache
+from capper_ranks.utils.log import get_logger, sampled_debug
 
-# --- Main Helper Functions ---
+logger = get_logger(__name__)
+
+# Stat types an alt "1+" prop can be written with
+ALT_PROP_STAT_TYPES = {'Home Runs', 'Hits', 'Total Bases', 'RBIs', 'Runs', 'Stolen Bases'}
+
+# Characters a player name can be made of in the "1+", "2+ TOTAL BASES" and "TO HIT A HOME RUN" shapes,
+# and the characters allowed after the number in an over/under prop
+_NAME_CHARS = frozenset(string.ascii_letters + " .'-")
+_STAT_TAIL_CHARS = frozenset(string.ascii_letters + string.whitespace + "+/'")
+
+# Every bet shape needs a digit (line, odds, N+), a standalone "ML", or "to hit ... home run".
+# Lines with none of these are rejected before any bet rule or player lookup runs.
+_PICK_SIGNAL_PATTERN = re.compile(r'\d|(?<![A-Za-z])ml(?![A-Za-z])|(?<![A-Za-z])to\s+hit(?![A-Za-z])', re.IGNORECASE)
+
+_TEAM_ABBREVIATION_SUFFIX = re.compile(r"\s*\([A-Za-z0-9 .]+\)$")
+_TRAILING_INITIALS = re.compile(r'\s+[A-Z]{1,2}\s*$')
+
+# --- Team Mentions ---
+
+def find_team_mentions(text: str) -> List[Tuple[str, str, int]]:
+    """
+    Returns every team mentioned in the text as (alias, league, offset) tuples,
+    in order of appearance, using a single pass over the text.
+    """
+    return [(token.value, TEAM_LEAGUE_MAP[token.value], token.start) for token in tokenize(text) if token.kind == TEAM]
 
 def _find_sport_context(tweet_text: str) -> Tuple[Optional[str], Optional[str]]:
     """Finds the earliest mentioned team in a tweet to set the context."""
-    found_matches = []
-    for team_alias in TEAM_LEAGUE_MAP.keys():
-        for match in re.finditer(r'\b' + re.escape(team_alias) + r'\b', tweet_text, re.IGNORECASE):
-            found_matches.append({'alias': team_alias, 'start': match.start(), 'league': TEAM_LEAGUE_MAP[team_alias]})
-    if not found_matches:
+    team = first_token(tokenize(tweet_text), TEAM)
+    if not team:
         return None, None
-    earliest_match = min(found_matches, key=lambda x: x['start'])
-    return earliest_match['alias'], earliest_match['league']
+    return team.value, TEAM_LEAGUE_MAP[team.value]
+
+# --- Prefilter ---
+
+_prefilter_lock = threading.Lock()
+_prefilter_counts = {'checked': 0, 'rejected': 0}
+
+def _could_be_pick(line: str) -> bool:
+    """Cheap check run before any entity resolution: False means no bet shape can match the line."""
+    could_be_pick = _PICK_SIGNAL_PATTERN.search(line) is not None
+    with _prefilter_lock:
+        _prefilter_counts['checked'] += 1
+        if not could_be_pick:
+            _prefilter_counts['rejected'] += 1
+    return could_be_pick
+
+def get_prefilter_stats() -> Dict:
+    """Returns how many lines the prefilter has checked and rejected, and the rejection rate."""
+    with _prefilter_lock:
+        checked, rejected = _prefilter_counts['checked'], _prefilter_counts['rejected']
+    return {'checked': checked, 'rejected': rejected, 'rejection_rate': rejected / checked if checked else 0.0}
+
+def reset_prefilter_stats():
+    with _prefilter_lock:
+        _prefilter_counts['checked'] = _prefilter_counts['rejected'] = 0
 
 # --- Sport-Specific Detection Logic ---
+# Each bet shape is a rule over the token stream from pick_lexer.tokenize, so a line is
+# scanned once no matter how many shapes are tried.
 
-# List of valid MLB player prop stat types (expand as needed)
-MLB_STAT_TYPES = [
-    "H+R+RBI", "Total Bases", "Hits", "Home Runs", "RBIs", "Runs", "Strikeouts", "Walks", "Stolen Bases", "Hits Allowed",
-    "Earned Runs", "Outs Recorded", "Runs Allowed", "Saves", "Wins", "Losses", "Innings Pitched", "Doubles", "Triples"
-]
-
-# Sort by length descending for greedy matching
-MLB_STAT_TYPES = sorted(MLB_STAT_TYPES, key=lambda x: -len(x))
-
-# Keywords that indicate a parlay bet
-PARLAY_KEYWORDS = [
-    'parlay', 'parlays', 'parlayed', 'parlaying',
-    'all must hit', 'all must win', 'all legs',
-    'combined', 'combo', 'combination',
-    'multi-leg', 'multileg', 'multi leg',
-    'bundle', 'package', 'set',
-    'sgp', 'same game parlay', 'leg'  # Added for SGP and leg-based slips
-]
-
-def _is_parlay_tweet(tweet_text: str) -> bool:
-    """
-    Determines if a tweet contains parlay keywords indicating it's a true parlay bet.
-    Returns True if parlay keywords are found, False otherwise (defaults to singles).
-    """
-    tweet_lower = tweet_text.lower()
-    return any(keyword in tweet_lower for keyword in PARLAY_KEYWORDS)
+def _name_before(line: str, offset: int) -> str:
+    """Returns the run of name characters that ends in whitespace right before offset."""
+    end = offset
+    while end > 0 and line[end - 1].isspace():
+        end -= 1
+    if end == offset:
+        return ""
+    start = end
+    while start > 0 and line[start - 1] in _NAME_CHARS:
+        start -= 1
+    return line[start:end].strip()
+
+def _is_stat_tail(tokens: List[Token]) -> bool:
+    """True if the tokens are only letters and "+", "/", "'" -- what may follow the number in an over/under prop."""
+    return bool(tokens) and all(char in _STAT_TAIL_CHARS for token in tokens for char in token.text)
 
-def _detect_player_prop(line: str) -> Optional[Dict]:
+def _player_prop(league: str, subject: str, line: float, bet_qualifier: str) -> Dict:
+    return {'sport_league': league, 'subject': subject, 'bet_type': 'Player Prop', 'line': line, 'odds': None, 'bet_qualifier': bet_qualifier}
+
+def _detect_over_under_prop(line: str, tokens: List[Token]) -> Tuple[Optional[Dict], bool]:
     """
-    Improved: Finds the bet pattern, then matches the longest valid stat type after the number.
-    Now also strips team abbreviations in parentheses from player names.
-    Handles formats like "Player Name (Team) O/U <number> <stat_type>"
-    Also handles alt prop formats like "Player Name 1+ Home Run(s)"
+    Handles formats like "Player Name (Team) O/U <number> <stat_type>".
+    Returns (leg, stop); stop is set when the bet has no name in front of it at all.
     """
-    # First, try to match the standard Over/Under format
-    bet_match = re.search(
-        r"(over|under|o/u|o|u)\s*(\d+\.?\d*)\s+([A-Za-z\s''+/]+?)(?:\s*$)",
-        line,
-        re.IGNORECASE
-    )
-    if bet_match:
-        text_before_bet = line[:bet_match.start()].strip()
-        words = text_before_bet.split()
+    for i in range(len(tokens) - 2):
+        qualifier, number = tokens[i], tokens[i + 1]
+        if qualifier.kind != QUALIFIER or number.kind != NUMBER:
+            continue
+        tail = tokens[i + 2:]
+        if tail[0].start == number.end or not _is_stat_tail(tail):
+            continue
+        words = line[:qualifier.start].split()
         if not words:
-            return None
+            return None, True
+        stat_type = tail[0].value if tail[0].kind == STAT else line[tail[0].start:].split()[0]
         # Try to find the player name (up to 4 words before the bet)
-        for i in range(min(4, len(words)), 0, -1):
-            name_candidate = " ".join(words[-i:])
+        for j in range(min(4, len(words)), 0, -1):
             # Remove team abbreviation in parentheses, e.g., 'Hunter Brown (HOU)' -> 'Hunter Brown'
-            name_candidate_clean = re.sub(r"\s*\([A-Za-z0-9 .]+\)$", "", name_candidate).strip()
-            if not name_candidate_clean or not name_candidate_clean[0].isupper():
+            name_candidate = _TEAM_ABBREVIATION_SUFFIX.sub("", " ".join(words[-j:])).strip()
+            if not name_candidate or not name_candidate[0].isupper():
                 continue
-            league = sports_api.get_player_league(name_candidate_clean)
+            league = sports_api.get_player_league(name_candidate)
             if league:
-                qualifier_text, line_str, stat_type_candidate = bet_match.groups()
-                qualifier = "Over" if qualifier_text.lower().startswith('o') else "Under"
-                stat_type_candidate = stat_type_candidate.strip()
-                # Special handling for H+R+RBI
-                if stat_type_candidate.upper() == "H+R+RBI":
-                    stat_type = "H+R+RBI"
-                else:
-                    # Greedily match the longest valid stat type
-                    stat_type = None
-                    for stype in MLB_STAT_TYPES:
-                        if stype == "H+R+RBI":
-                            continue
-                        if stat_type_candidate.lower().startswith(stype.lower()):
-                            stat_type = stype
-                            break
-                    if not stat_type:
-                        stat_type = stat_type_candidate.split()[0]
-                return {
-                    'sport_league': league,
-                    'subject': name_candidate_clean,
-                    'bet_type': 'Player Prop',
-                    'line': float(line_str),
-                    'odds': None,
-                    'bet_qualifier': f"{qualifier} {stat_type}"
-                }
-    # Now, try to match the alt prop format: "Player Name 1+ Home Run(s)"
-    alt_match = re.search(
-        r"([A-Za-z .'-]+)\s+1\+\s+(Home Run|Home Runs|HR|Hits|Total Bases|RBI|RBIs|Runs|Stolen Bases)",
-        line,
-        re.IGNORECASE
-    )
-    if alt_match:
-        player_name = alt_match.group(1).strip()
-        stat_type = alt_match.group(2).strip()
-        league = sports_api.get_player_league(player_name)
-        if league:
-            # 1+ means Over 0.5 for most stat types
-            return {
-                'sport_league': league,
-                'subject': player_name,
-                'bet_type': 'Player Prop',
-                'line': 0.5,
-                'odds': None,
-                'bet_qualifier': f"Over {stat_type}"
-            }
-    
-    # Handle ParlayScience format: "Player Name 2+ TOTAL BASES"
-    bases_match = re.search(
-        r"([A-Za-z .'-]+)\s+(\d+)\+\s*(TOTAL\s*BASES?|Total\s*Bases?)",
-        line,
-        re.IGNORECASE
-    )
-    if bases_match:
-        player_name = bases_match.group(1).strip()
-        line_value = int(bases_match.group(2))
-        stat_type = bases_match.group(3).strip()
-        league = sports_api.get_player_league(player_name)
+                return _player_prop(league, name_candidate, number.value, f"{qualifier.value} {stat_type}"), False
+        return None, False
+    return None, False
+
+def _detect_plus_prop(line: str, tokens: List[Token]) -> Optional[Dict]:
+    """Handles "Player Name 1+ Home Run(s)" alt props and ParlayScience's "Player Name 2+ TOTAL BASES"."""
+    for i in range(len(tokens) - 2):
+        number, plus, stat = tokens[i], tokens[i + 1], tokens[i + 2]
+        if number.kind != NUMBER or not number.text.isdigit() or plus.text != '+' or plus.start != number.end or stat.kind != STAT:
+            continue
+        # 2+ means Over 1.5; 1+ means Over 0.5 for most stat types
+        is_total_bases = stat.value == 'Total Bases'
+        is_alt_prop = number.text == '1' and stat.start > plus.end and stat.value in ALT_PROP_STAT_TYPES
+        if not (is_total_bases or is_alt_prop):
+            continue
+        player_name = _name_before(line, number.start)
+        league = sports_api.get_player_league(player_name) if player_name else None
         if league:
-            return {
-                'sport_league': league,
-                'subject': player_name,
-                'bet_type': 'Player Prop',
-                'line': float(line_value - 0.5),  # 2+ means Over 1.5
-                'odds': None,
-                'bet_qualifier': f"Over {stat_type}"
-            }
-    
-    # Handle ParlayScience format: "Player Name TO HIT A HOME RUN"
-    home_run_match = re.search(
-        r"([A-Za-z .'-]+)\s+TO\s+HIT\s+A?\s*(HOME RUN|Home Run)",
-        line,
-        re.IGNORECASE
-    )
-    if home_run_match:
-        player_name = home_run_match.group(1).strip()
-        stat_type = home_run_match.group(2).strip()
-        
+            return _player_prop(league, player_name, number.value - 0.5, f"Over {stat.value}")
+    return None
+
+def _detect_home_run_prop(line: str, tokens: List[Token]) -> Optional[Dict]:
+    """Handles ParlayScience's "Player Name TO HIT A HOME RUN"."""
+    for token in tokens:
+        if token.kind != HOME_RUN_PROP:
+            continue
         # Clean up player name - remove any single letters or abbreviations at the end
-        player_name = re.sub(r'\s+[A-Z]{1,2}\s*$', '', player_name).strip()
-        
-        league = sports_api.get_player_league(player_name)
+        player_name = _TRAILING_INITIALS.sub('', _name_before(line, token.start)).strip()
+        league = sports_api.get_player_league(player_name) if player_name else None
         if league:
-            return {
-                'sport_league': league,
-                'subject': player_name,
-                'bet_type': 'Player Prop',
-                'line': 0.5,  # "TO HIT A HOME RUN" means Over 0.5 Home Runs
-                'odds': None,
-                'bet_qualifier': f"Over {stat_type}"
-            }
-    
+            # "TO HIT A HOME RUN" means Over 0.5 Home Runs
+            return _player_prop(league, player_name, 0.5, f"Over {token.value}")
     return None
 
-def _detect_team_bet(line: str) -> Optional[Dict]:
-    """Detects a team-based bet on a single line."""
-    team_context, sport_league = _find_sport_context(line)
-    if not sport_league or sport_league != 'MLB':
+def _detect_player_prop(line: str, tokens: Optional[List[Token]] = None) -> Optional[Dict]:
+    """
+    Detects a player prop on a single line. Recognized shapes, in order:
+    "Player Name (Team) O/U <number> <stat_type>", "Player Name 1+ Home Run(s)",
+    "Player Name 2+ TOTAL BASES" and "Player Name TO HIT A HOME RUN".
+    Pass the line's tokens to avoid re-tokenizing it.
+    """
+    tokens = tokens if tokens is not None else tokenize(line)
+    leg, stop = _detect_over_under_prop(line, tokens)
+    if leg or stop:
+        return leg
+    return _detect_plus_prop(line, tokens) or _detect_home_run_prop(line, tokens)
+
+def _detect_team_bet(line: str, tokens: Optional[List[Token]] = None) -> Optional[Dict]:
+    """
+    Detects a team-based bet on a single line: a run line or moneyline right after the
+    earliest mentioned team, or a total anywhere on the line.
+    Pass the line's tokens to avoid re-tokenizing it.
+    """
+    tokens = tokens if tokens is not None else tokenize(line)
+    team = first_token(tokens, TEAM)
+    if not team or TEAM_LEAGUE_MAP[team.value] != 'MLB':
         return None
-    
-    # After finding the team, we check for specific bet patterns related to it.
-    text_lower = line.lower()
-    is_f5 = "f5" in text_lower or "first 5" in text_lower
-    bet_qualifier_suffix = "First 5" if is_f5 else "Full Game"
+    team_context = team.value
+    bet_qualifier_suffix = "First 5" if first_token(tokens, PERIOD) else "Full Game"
+    pairs = list(zip(tokens, tokens[1:]))
     
     # Check for patterns where the team name is right next to the bet
-    run_line_match = re.search(r'\b' + re.escape(team_context) + r'\s*([+-]\d\.\d)\b', text_lower, re.IGNORECASE) # type: ignore
-    if run_line_match:
-        return {'sport_league': 'MLB', 'subject': team_context, 'bet_type': 'Spread', 'line': float(run_line_match.group(1)), 'odds': None, 'bet_qualifier': bet_qualifier_suffix}
+    for current, following in pairs:
+        if current.kind == TEAM and current.value == team_context and following.kind == SPREAD and len(following.text) == 4:
+            return {'sport_league': 'MLB', 'subject': team_context, 'bet_type': 'Spread', 'line': following.value, 'odds': None, 'bet_qualifier': bet_qualifier_suffix}
     
-    ml_match = re.search(r'\b' + re.escape(team_context) + r'\s+ML\b', text_lower, re.IGNORECASE) # type: ignore
-    if ml_match:
-        return {'sport_league': 'MLB', 'subject': team_context, 'bet_type': 'Moneyline', 'line': None, 'odds': None, 'bet_qualifier': bet_qualifier_suffix}
+    for current, following in pairs:
+        if current.kind == TEAM and current.value == team_context and following.kind == MONEYLINE and following.start > current.end:
+            return {'sport_league': 'MLB', 'subject': team_context, 'bet_type': 'Moneyline', 'line': None, 'odds': None, 'bet_qualifier': bet_qualifier_suffix}
         
     # Check for a general total if the team is just mentioned for context
     # This should take priority over player prop detection for team totals
-    total_match = re.search(r"(over|under|o/u)\s*(\d+\.?\d*)", text_lower)
-    if total_match:
-        qualifier = "Over" if total_match.group(1).startswith('o') else "Under"
-        return {'sport_league': 'MLB', 'subject': team_context, 'bet_type': 'Total', 'line': float(total_match.group(2)), 'odds': None, 'bet_qualifier': f"{qualifier} {bet_qualifier_suffix}"}
+    for current, following in pairs:
+        if current.kind == QUALIFIER and current.text.lower() not in ('o', 'u') and following.kind == NUMBER:
+            return {'sport_league': 'MLB', 'subject': team_context, 'bet_type': 'Total', 'line': following.value, 'odds': None, 'bet_qualifier': f"{current.value} {bet_qualifier_suffix}"}
         
     return None
 
-# --- Main Dispatcher Function ---
+# --- Main Dispatcher Functions ---
+
+# Normalized line -> detected MLB leg (or None), shared by every detect_picks() batch
+_line_cache = LRUCache(config.DETECT_LINE_CACHE_MAX_ENTRIES)
+_NOT_CACHED = object()
+
+def clear_line_cache():
+    """Forgets every memoized line, e.g. after the roster changes."""
+    _line_cache.clear()
+
+def _analyze_line(line: str) -> Tuple[Optional[Dict], bool]:
+    """
+    Tokenizes a single stripped, non-empty line once, then runs every bet shape over it
+    unless the prefilter rules the line out.
+    Returns (supported-league leg or None, whether the line has a parlay keyword).
+    """
+    tokens = tokenize(line)
+    # Keywords only count as whole words, so "set" doesn't fire on "settle"
+    has_parlay_keyword = first_token(tokens, PARLAY) is not None
+    if not _could_be_pick(line):
+        return None, has_parlay_keyword
+    
+    # Prioritize team bets when a team is mentioned in the context
+    if first_token(tokens, TEAM):
+        detected_leg = _detect_team_bet(line, tokens) or _detect_player_prop(line, tokens)
+    else:
+        detected_leg = _detect_player_prop(line, tokens)
+    
+    if detected_leg:
+        # Only add picks from supported leagues to our final list
+        if detected_leg.get('sport_league') in ['MLB']:
+            sampled_debug(logger, "MLB leg detected: %s", detected_leg)
+            return detected_leg, has_parlay_keyword
+        sampled_debug(logger, "Ignoring non-MLB pick from league: %s", detected_leg.get('sport_league'))
+    return None, has_parlay_keyword
+
+def _build_result(legs: List[Dict], is_parlay: bool) -> Optional[Dict]:
+    if not legs:
+        sampled_debug(logger, "No valid picks found in any line of the tweet.")
+        return None
+
+    # Parlay keywords anywhere in the tweet make it a parlay
+    sampled_debug(logger, "Tweet %s a parlay (based on keywords)", 'is' if is_parlay else 'is not')
+    
+    return {
+        'legs': legs,
+        'is_parlay': is_parlay
+    }
+
 def detect_pick(tweet_text: str) -> Optional[Dict]:
     """
     Main dispatcher. Splits tweets by lines and filters for supported leagues.
     Returns a dictionary with 'legs' and 'is_parlay' keys.
     """
-    print(f"----- Analyzing Tweet: \"{tweet_text[:100].replace(chr(10), ' ')}...\" -----")
+    sampled_debug(logger, "Analyzing tweet: %.100r", tweet_text)
     all_legs = []
+    is_parlay = False
     lines = tweet_text.split('\n')
     
     for line in lines:
         line = line.strip()
         if not line: continue
 
-        print(f"  -- Analyzing Line: '{line}'")
-        
-        # Prioritize team bets when a team is mentioned in the context
-        team_context, _ = _find_sport_context(line)
-        if team_context:
-            detected_leg = _detect_team_bet(line) or _detect_player_prop(line)
-        else:
-            detected_leg = _detect_player_prop(line) or _detect_team_bet(line)
-        
+        sampled_debug(logger, "Analyzing line: %r", line)
+        detected_leg, has_parlay_keyword = _analyze_line(line)
+        is_parlay = is_parlay or has_parlay_keyword
         if detected_leg:
-            # Only add picks from supported leagues to our final list
-            if detected_leg.get('sport_league') in ['MLB']:
-                 print(f"    ✅ MLB LEG DETECTED: {detected_leg}")
-                 all_legs.append(detected_leg)
-            else:
-                print(f"    -- Ignoring non-MLB pick from league: {detected_leg.get('sport_league')}")
-
-    if not all_legs:
-        print("  DEBUG: No valid picks found in any line of the tweet.")
-        return None
+            all_legs.append(detected_leg)
 
-    # Determine if this is a parlay based on keywords
-    is_parlay = _is_parlay_tweet(tweet_text)
-    print(f"  DEBUG: Tweet {'IS' if is_parlay else 'IS NOT'} a parlay (based on keywords)")
+    return _build_result(all_legs, is_parlay)
+
+def detect_picks(tweet_texts: Iterable[Optional[str]]) -> List[Optional[Dict]]:
+    """
+    Batch version of detect_pick. Lines are stripped and deduplicated across the whole
+    batch, and each unique line is parsed at most once through a bounded LRU shared
+    between batches, so capper templates repeated across a timeline are only validated once.
+    Returns one detect_pick-style result (or None) per text, in order.
+    """
+    split_texts = [[line.strip() for line in (text or '').split('\n')] for text in tweet_texts]
+    unique_lines = dict.fromkeys(line for lines in split_texts for line in lines if line)
     
-    return {
-        'legs': all_legs,
-        'is_parlay': is_parlay
-    }
\ No newline at end of file
+    analyzed_lines = {}
+    for line in unique_lines:
+        analyzed = _line_cache.get(line, _NOT_CACHED)
+        if analyzed is _NOT_CACHED:
+            sampled_debug(logger, "Analyzing line: %r", line)
+            analyzed = _analyze_line(line)
+            _line_cache.set(line, analyzed, config.DETECT_LINE_CACHE_TTL_SECONDS)
+        analyzed_lines[line] = analyzed
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Analyzed %d tweet(s): %d unique line(s), %.0f%% of lines rejected by the prefilter so far",
+                     len(split_texts), len(unique_lines), get_prefilter_stats()['rejection_rate'] * 100)
+    
+    results = []
+    for lines in split_texts:
+        analyzed = [analyzed_lines[line] for line in lines if line]
+        # Legs are copied so callers can't mutate the cached entries
+        legs = [dict(leg) for leg, _ in analyzed if leg]
+        results.append(_build_result(legs, any(has_parlay_keyword for _, has_parlay_keyword in analyzed)))
+    return results
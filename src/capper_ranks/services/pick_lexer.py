@@ -0,0 +1,124 @@
+import re
+from typing import List, NamedTuple, Optional, Tuple
+from capper_ranks.core.mappings import TEAM_LEAGUE_MAP
+from capper_ranks.utils.helpers import KeywordTrie
+
+# --- Token Kinds ---
+TEAM = 'TEAM'                # Team alias; value is the lowercased alias from TEAM_LEAGUE_MAP
+QUALIFIER = 'QUALIFIER'      # over/under/o/u/o-u; value is 'Over' or 'Under'
+STAT = 'STAT'                # Stat type; value is the canonical name from MLB_STAT_TYPES
+PERIOD = 'PERIOD'            # f5/first 5; value is 'First 5'
+MONEYLINE = 'MONEYLINE'      # ml
+PARLAY = 'PARLAY'            # Parlay keyword
+HOME_RUN_PROP = 'HOME_RUN_PROP'  # "to hit a home run"
+NUMBER = 'NUMBER'            # Unsigned number; value is the float
+SPREAD = 'SPREAD'            # Signed decimal such as -1.5; value is the float
+ODDS = 'ODDS'                # Signed integer such as +350; value is the int
+WORD = 'WORD'                # Any other run of letters
+SYMBOL = 'SYMBOL'            # Any other single character
+
+class Token(NamedTuple):
+    kind: str
+    text: str
+    value: object
+    start: int
+    end: int
+
+# List of valid MLB player prop stat types (expand as needed)
+MLB_STAT_TYPES = [
+    "H+R+RBI", "Total Bases", "Hits", "Home Runs", "RBIs", "Runs", "Strikeouts", "Walks", "Stolen Bases", "Hits Allowed",
+    "Earned Runs", "Outs Recorded", "Runs Allowed", "Saves", "Wins", "Losses", "Innings Pitched", "Doubles", "Triples"
+]
+
+# Sort by length descending for greedy matching
+MLB_STAT_TYPES = sorted(MLB_STAT_TYPES, key=lambda x: -len(x))
+
+# Other ways slips and cappers write a stat type
+STAT_ALIASES = {
+    'home run': 'Home Runs', 'hr': 'Home Runs', 'rbi': 'RBIs',
+    'total base': 'Total Bases', 'totalbases': 'Total Bases', 'totalbase': 'Total Bases',
+}
+
+# Keywords that indicate a parlay bet
+PARLAY_KEYWORDS = [
+    'parlay', 'parlays', 'parlayed', 'parlaying',
+    'all must hit', 'all must win', 'all legs',
+    'combined', 'combo', 'combination',
+    'multi-leg', 'multileg', 'multi leg',
+    'bundle', 'package', 'set',
+    'sgp', 'same game parlay', 'leg', 'legs'  # Added for SGP and leg-based slips
+]
+
+QUALIFIERS = {'over': 'Over', 'under': 'Under', 'o': 'Over', 'u': 'Under', 'o/u': 'Over'}
+
+# One pass over the line: every non-space character lands in exactly one of these
+_TOKEN_PATTERN = re.compile(r"""
+    (?P<SIGNED>[+-]\d+(?:\.\d+)?)
+  | (?P<NUMBER>\d+(?:\.\d*)?)
+  | (?P<WORD>[A-Za-z]+)
+  | (?P<SYMBOL>\S)
+""", re.VERBOSE)
+
+def _scan(text: str) -> List[Tuple[str, str, int, int]]:
+    """Splits text into raw (kind, text, start, end) tuples: SIGNED, NUMBER, WORD or SYMBOL."""
+    return [(match.lastgroup, match.group(), match.start(), match.end()) for match in _TOKEN_PATTERN.finditer(text)]
+
+def _phrase_words(phrase: str) -> List[str]:
+    """Splits a phrase the same way lines are split, so 'd-backs' and 'st. louis' line up with tokens."""
+    return [text.lower() for _, text, _, _ in _scan(phrase)]
+
+def _build_phrase_trie() -> KeywordTrie:
+    trie = KeywordTrie()
+    for alias in TEAM_LEAGUE_MAP:
+        trie.add(_phrase_words(alias), (TEAM, alias))
+    for stat_type in MLB_STAT_TYPES:
+        trie.add(_phrase_words(stat_type), (STAT, stat_type))
+    for alias, stat_type in STAT_ALIASES.items():
+        trie.add(_phrase_words(alias), (STAT, stat_type))
+    for keyword in PARLAY_KEYWORDS:
+        trie.add(_phrase_words(keyword), (PARLAY, keyword))
+    for word, qualifier in QUALIFIERS.items():
+        trie.add(_phrase_words(word), (QUALIFIER, qualifier))
+    for period in ('f5', 'first 5'):
+        trie.add(_phrase_words(period), (PERIOD, 'First 5'))
+    trie.add(['ml'], (MONEYLINE, None))
+    for phrase in ('to hit a home run', 'to hit ahome run', 'to hit home run'):
+        for suffix in ('', 's'):
+            trie.add(_phrase_words(phrase + suffix), (HOME_RUN_PROP, 'Home Runs'))
+    return trie
+
+_PHRASES = _build_phrase_trie()
+
+def tokenize(line: str) -> List[Token]:
+    """
+    Turns a line into a typed token stream in a single pass. Phrases (team aliases, stat
+    types, parlay keywords...) are matched on whole words through one trie, longest first.
+    """
+    raw_tokens = _scan(line)
+    words = [text.lower() for _, text, _, _ in raw_tokens]
+    tokens = []
+    i = 0
+    while i < len(raw_tokens):
+        kind, text, start, end = raw_tokens[i]
+        if kind == 'WORD':
+            length, phrase = _PHRASES.longest_match(words, i)
+            if length:
+                end = raw_tokens[i + length - 1][3]
+                tokens.append(Token(phrase[0], line[start:end], phrase[1], start, end))
+                i += length
+                continue
+            tokens.append(Token(WORD, text, None, start, end))
+        elif kind == 'SIGNED':
+            if '.' in text:
+                tokens.append(Token(SPREAD, text, float(text), start, end))
+            else:
+                tokens.append(Token(ODDS, text, int(text), start, end))
+        elif kind == 'NUMBER':
+            tokens.append(Token(NUMBER, text, float(text), start, end))
+        else:
+            tokens.append(Token(SYMBOL, text, None, start, end))
+        i += 1
+    return tokens
+
+def first_token(tokens: List[Token], kind: str) -> Optional[Token]:
+    return next((token for token in tokens if token.kind == kind), None)
@@ -0,0 +1,174 @@
+import re
+import sqlite3
+import threading
+import unicodedata
+import statsapi
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from capper_ranks.core import config
+from capper_ranks.database import models
+from capper_ranks.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Name suffixes that cappers and OCR drop or mangle freely
+NAME_SUFFIXES = {'jr', 'sr', 'ii', 'iii', 'iv'}
+
+# Characters OCR commonly produces in place of letters inside names
+OCR_NAME_FIXES = str.maketrans({'0': 'o', '1': 'l', '5': 's', '|': 'i'})
+
+# How long to wait before retrying a roster pull that failed
+REFRESH_RETRY_MINUTES = 15
+
+def normalize_player_name(name: str) -> str:
+    """
+    Normalizes a player name for index lookups.
+    'Ronald Acuña Jr.', 'RONALD ACUNA JR' and 'Rona1d Acuna' all normalize to 'ronald acuna'.
+    """
+    # Strip accents: 'Acuña' -> 'Acuna'
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(char for char in name if not unicodedata.combining(char))
+    name = name.lower().translate(OCR_NAME_FIXES)
+    # Hyphens separate words, other punctuation ("Jr.", "O'Neill") is dropped
+    name = name.replace('-', ' ')
+    name = re.sub(r"[^a-z\s]", "", name)
+    words = [word for word in name.split() if word not in NAME_SUFFIXES]
+    return " ".join(words)
+
+class RosterIndex:
+    """
+    In-memory index of active MLB players, backed by the player_roster table.
+    The roster is pulled from statsapi at most once per ROSTER_REFRESH_HOURS, so
+    validating a name is a dictionary lookup instead of a network round trip.
+    """
+
+    def __init__(self):
+        self._players_by_key: Dict[str, Dict] = {}
+        self._loaded_at: Optional[datetime] = None
+        self._next_refresh_attempt: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def ensure_loaded(self) -> bool:
+        """
+        Makes sure a usable index is in memory, refreshing it if it is stale.
+        Returns False only when no roster could be loaded from the database or statsapi.
+        """
+        if self._is_fresh(self._loaded_at):
+            return True
+
+        with self._lock:
+            if self._is_fresh(self._loaded_at):
+                return True
+
+            # Another process may have refreshed the table already.
+            stored_at = self._stored_loaded_at()
+            if self._is_fresh(stored_at):
+                return self._load_from_db()
+
+            now = datetime.utcnow()
+            if self._next_refresh_attempt is None or now >= self._next_refresh_attempt:
+                if self.refresh():
+                    return True
+                self._next_refresh_attempt = now + timedelta(minutes=REFRESH_RETRY_MINUTES)
+
+            # Fall back to a stale roster rather than going back to per-name lookups.
+            if self._players_by_key:
+                return True
+            return stored_at is not None and self._load_from_db()
+
+    def refresh(self) -> bool:
+        """Pulls the current season's MLB players from statsapi and rebuilds the index."""
+        try:
+            players = self._fetch_players(datetime.now().year)
+            if not players:
+                # Before opening day the new season has no players yet.
+                players = self._fetch_players(datetime.now().year - 1)
+            if not players:
+                logger.warning("Roster pull returned no players.")
+                return False
+            models.replace_player_roster(players)
+        except Exception as e:
+            logger.error("Failed to refresh roster index: %s", e)
+            return False
+
+        logger.info("Refreshed roster index with %d players.", len(players))
+        self._build(players, datetime.utcnow())
+        return True
+
+    def find(self, player_name: str) -> Optional[Dict]:
+        """Returns the indexed player for a name (full name or unique last name), or None."""
+        return self._players_by_key.get(normalize_player_name(player_name))
+
+    def clear(self):
+        """Drops the in-memory index so the next lookup reloads it."""
+        with self._lock:
+            self._players_by_key = {}
+            self._loaded_at = None
+            self._next_refresh_attempt = None
+
+    def _is_fresh(self, loaded_at: Optional[datetime]) -> bool:
+        if loaded_at is None:
+            return False
+        return datetime.utcnow() - loaded_at < timedelta(hours=config.ROSTER_REFRESH_HOURS)
+
+    def _stored_loaded_at(self) -> Optional[datetime]:
+        try:
+            loaded_at = models.get_player_roster_loaded_at()
+        except sqlite3.Error:
+            return None
+        return datetime.fromisoformat(str(loaded_at)) if loaded_at else None
+
+    def _load_from_db(self) -> bool:
+        try:
+            rows = models.get_player_roster()
+        except sqlite3.Error:
+            return False
+        if not rows:
+            return False
+        self._build([dict(row) for row in rows], self._stored_loaded_at())
+        return True
+
+    def _fetch_players(self, season: int) -> List[Dict]:
+        response = statsapi.get('sports_players', {'sportId': 1, 'season': season})
+        players = []
+        for person in response.get('people', []):
+            if not person.get('fullName'):
+                continue
+            players.append({
+                'player_id': person.get('id'),
+                'full_name': person.get('fullName'),
+                'use_name': person.get('useName'),
+                'last_name': person.get('lastName'),
+                'team_id': person.get('currentTeam', {}).get('id'),
+                'league': 'MLB',
+            })
+        return players
+
+    def _build(self, players: List[Dict], loaded_at: Optional[datetime]):
+        """Indexes every player under their full name, use-name variant and, if unique, last name."""
+        players_by_key: Dict[str, Dict] = {}
+        players_by_last_name: Dict[str, List[Dict]] = {}
+
+        for player in players:
+            entry = {
+                'player_id': player['player_id'],
+                'full_name': player['full_name'],
+                'team_id': player['team_id'],
+                'league': player['league'],
+            }
+            players_by_key.setdefault(normalize_player_name(player['full_name']), entry)
+            if player.get('use_name') and player.get('last_name'):
+                players_by_key.setdefault(normalize_player_name(f"{player['use_name']} {player['last_name']}"), entry)
+            if player.get('last_name'):
+                players_by_last_name.setdefault(normalize_player_name(player['last_name']), []).append(entry)
+
+        # Only index last names that point at exactly one player, e.g. "Ohtani" but not "Smith".
+        for last_key, entries in players_by_last_name.items():
+            if len(entries) == 1:
+                players_by_key.setdefault(last_key, entries[0])
+
+        self._players_by_key = players_by_key
+        self._loaded_at = loaded_at or datetime.utcnow()
+
+# Global instance for reuse
+roster_index = RosterIndex()
@@ -1,5 +1,18 @@
 import tweepy
 from capper_ranks.core import config
+from capper_ranks.utils.helpers import RateLimiter
+from capper_ranks.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# X API rate limits are counted per endpoint over 15-minute windows.
+RATE_LIMIT_WINDOW_SECONDS = 15 * 60
+
+# Shared by every thread that calls the X API, so concurrent scans stay within one budget.
+rate_limiters = {
+    'user_lookup': RateLimiter(config.X_USER_LOOKUP_RATE_LIMIT, RATE_LIMIT_WINDOW_SECONDS),
+    'user_tweets': RateLimiter(config.X_USER_TWEETS_RATE_LIMIT, RATE_LIMIT_WINDOW_SECONDS),
+}
 
 def get_x_client():
     """Authenticates with the X API using credentials from config."""
@@ -12,24 +25,25 @@ def get_x_client():
             access_token_secret=config.X_ACCESS_TOKEN_SECRET,
             wait_on_rate_limit=True
         )
-        print("Successfully authenticated with X API.")
+        logger.info("Successfully authenticated with X API.")
         return client
     except Exception as e:
-        print(f"Error authenticating with X API: {e}")
+        logger.error("Error authenticating with X API: %s", e)
         return None
 
 def get_user_from_username(client, username):
     """Looks up a user by their username and returns their data."""
     try:
         # The get_user function can find users by their handle
+        rate_limiters['user_lookup'].acquire()
         response = client.get_user(username=username)
         if response.data:
             return response.data
         else:
-            print(f"Could not find user with username: {username}")
+            logger.warning("Could not find user with username: %s", username)
             return None
     except Exception as e:
-        print(f"An error occurred looking up user {username}: {e}")
+        logger.error("An error occurred looking up user %s: %s", username, e)
         return None
 
 def get_tweets_with_media(client, user_id, since_id=None, max_results=100):
@@ -43,10 +57,12 @@ def get_tweets_with_media(client, user_id, since_id=None, max_results=100):
         max_results: Maximum number of tweets to fetch
         
     Returns:
-        List of tweets with media attachments
+        List of tweets with media attachments. Each entry has the 'tweet', its 'media_urls',
+        and 'media': a list of {'media_key', 'url'} dicts in the same order.
     """
     try:
         # Fetch tweets with media attachments
+        rate_limiters['user_tweets'].acquire()
         response = client.get_users_tweets(
             id=user_id,
             since_id=since_id,
@@ -71,6 +87,7 @@ def get_tweets_with_media(client, user_id, since_id=None, max_results=100):
         # Process each tweet
         for tweet in response.data:
             media_urls = []
+            media_items = []
             
             # Check if tweet has media attachments
             if hasattr(tweet, 'attachments') and tweet.attachments and 'media_keys' in tweet.attachments:
@@ -79,20 +96,25 @@ def get_tweets_with_media(client, user_id, since_id=None, max_results=100):
                         media = media_lookup[media_key]
                         # Get the best available URL
                         if hasattr(media, 'url') and media.url:
-                            media_urls.append(media.url)
+                            media_url = media.url
                         elif hasattr(media, 'preview_image_url') and media.preview_image_url:
-                            media_urls.append(media.preview_image_url)
+                            media_url = media.preview_image_url
+                        else:
+                            continue
+                        media_urls.append(media_url)
+                        media_items.append({'media_key': media_key, 'url': media_url})
             
             if media_urls:
                 tweets_with_media.append({
                     'tweet': tweet,
-                    'media_urls': media_urls
+                    'media_urls': media_urls,
+                    'media': media_items
                 })
         
         return tweets_with_media
         
     except Exception as e:
-        print(f"Error fetching tweets with media for user {user_id}: {e}")
+        logger.error("Error fetching tweets with media for user %s: %s", user_id, e, extra={'capper_id': user_id})
         return []
 
 # This allows us to test this single file to verify our keys
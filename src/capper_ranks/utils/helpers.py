@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Hashable, Optional, Sequence, Tuple
+
+class LRUCache:
+    """
+    A small thread-safe LRU cache with optional per-entry expiry.
+    Once max_entries is reached, the least recently used entry is evicted.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value, or default if the key is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key, self._MISSING)
+            if entry is self._MISSING:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        """Stores a value. Entries without a TTL live until they are evicted."""
+        expires_at = time.monotonic() + ttl_seconds if ttl_seconds is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RateLimiter:
+    """
+    A thread-safe sliding-window rate limiter: at most max_calls per period_seconds.
+    acquire() blocks until a call is allowed, so threads sharing one limiter share one budget.
+    """
+
+    def __init__(self, max_calls: int, period_seconds: float):
+        self.max_calls = max_calls
+        self.period_seconds = period_seconds
+        self._calls: deque = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.period_seconds:
+                    self._calls.popleft()
+                if len(self._calls) < self.max_calls:
+                    self._calls.append(now)
+                    return
+                wait_seconds = self._calls[0] + self.period_seconds - now
+            time.sleep(wait_seconds)
+
+
+class KeywordTrie:
+    """
+    Maps phrases, given as sequences of words, to values. longest_match() walks a word list
+    from a position and returns the longest phrase found there, so matching a whole line
+    costs one walk per word instead of one check per phrase.
+    """
+
+    _VALUE = object()
+
+    def __init__(self):
+        self._root: dict = {}
+
+    def add(self, words: Sequence[Hashable], value: Any):
+        node = self._root
+        for word in words:
+            node = node.setdefault(word, {})
+        node[self._VALUE] = value
+
+    def longest_match(self, words: Sequence[Hashable], start: int = 0) -> Tuple[int, Any]:
+        """Returns (number of words matched, value) for the longest phrase at start, or (0, None)."""
+        node = self._root
+        match_length, match_value = 0, None
+        for i in range(start, len(words)):
+            node = node.get(words[i])
+            if node is None:
+                break
+            if self._VALUE in node:
+                match_length, match_value = i - start + 1, node[self._VALUE]
+        return match_length, match_value
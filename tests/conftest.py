@@ -0,0 +1,29 @@
+# tests/conftest.py
+import os
+import pytest
+
+# config.py refuses to import without X credentials, so provide dummy ones for the test run.
+os.environ.setdefault("X_API_KEY", "test-api-key")
+os.environ.setdefault("X_BEARER_TOKEN", "test-bearer-token")
+
+
+@pytest.fixture(autouse=True)
+def temp_database(tmp_path, monkeypatch):
+    """Points every test at its own fresh SQLite database."""
+    from capper_ranks.core import config
+    from capper_ranks.database import models
+    from capper_ranks.services import pick_detector, sports_api
+    from capper_ranks.services.image_processor import image_processor
+    from capper_ranks.services.roster_index import roster_index
+
+    db_path = str(tmp_path / "test_capper_ranks.db")
+    monkeypatch.setattr(config, "DATABASE_NAME", db_path)
+    # Never pick up a model trained in the working directory
+    monkeypatch.setattr(config, "PICK_CLASSIFIER_PATH", str(tmp_path / "pick_classifier.json"))
+    models.init_db()
+    roster_index.clear()
+    sports_api.clear_cache()
+    pick_detector.clear_line_cache()
+    image_processor.ocr_cache.reset_eviction_counter()
+    yield db_path
+    models.close_connection()
@@ -0,0 +1,63 @@
+# tests/test_bot.py
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from capper_ranks import bot
+from capper_ranks.database import models
+
+
+def make_tweet(tweet_id, text):
+    return SimpleNamespace(id=tweet_id, text=text, created_at=datetime(2024, 6, 1, 12, 0), attachments=None)
+
+
+def test_scan_cappers_stores_picks_and_advances_since_id(mocker):
+    """Each capper's picks are stored and their since_id advanced, whatever order the workers finish in."""
+    timelines = {
+        '1': [make_tweet(12, "NYY ML is a lock"), make_tweet(11, "Good morning")],
+        '2': [make_tweet(22, "Astros -1.5 tonight")],
+        '3': [],
+    }
+    mocker.patch('capper_ranks.bot.x_client.get_tweets_with_media',
+                 side_effect=lambda client, capper_id, since_id=None: [{'tweet': t, 'media_urls': []} for t in timelines[capper_id]])
+    mocker.patch('capper_ranks.core.config.SCAN_WORKERS', 3)
+
+    bot.scan_cappers(client=None, capper_ids=['1', '2', '3'])
+
+    assert models.get_last_seen_tweet_id('1') == '12'
+    assert models.get_last_seen_tweet_id('2') == '22'
+    assert models.get_last_seen_tweet_id('3') is None
+    conn = models.connect_db()
+    stored = {row['original_tweet_id'] for row in conn.execute("SELECT original_tweet_id FROM bets")}
+    conn.close()
+    assert stored == {'12', '22'}
+
+
+def test_processed_media_is_not_downloaded_again(mocker):
+    """An image recorded in processed_media is answered from the table without downloading it again."""
+    media = [{'media_key': '3_100', 'url': 'https://pbs.twimg.com/media/slip.jpg'}]
+    download = mocker.patch.object(bot.image_processor, 'download_image', return_value=None)
+    models.record_processed_media('3_100', media[0]['url'], '40', "NYY ML", '{"legs": [{"subject": "nyy"}], "is_parlay": false}')
+
+    result = bot.detect_tweet_picks(make_tweet(41, "Tail this one"), media)
+
+    download.assert_not_called()
+    assert result == {'legs': [{'subject': 'nyy'}], 'is_parlay': False}
+
+
+def test_pending_legs_are_only_rechecked_once_their_game_can_be_final(mocker):
+    models.store_bet_and_legs('1', '50', None, datetime(2024, 6, 1, 12, 0),
+                              {'legs': [{'sport_league': 'MLB', 'subject': 'nyy', 'bet_type': 'Moneyline', 'line': None, 'odds': None, 'bet_qualifier': 'Full Game'}], 'is_parlay': False})
+    leg_id = models.get_pending_legs()[0]['leg_id']
+    game_start = datetime(2024, 6, 1, 15, 5, tzinfo=timezone.utc)
+    fetch = mocker.patch('capper_ranks.bot.sports_api.fetch_pick_results',
+                         return_value={leg_id: {'status': 'PENDING_RESULT', 'game_pk': 745001, 'game_start': game_start}})
+
+    bot.process_pending_results(datetime(2024, 6, 1, 16, 0, tzinfo=timezone.utc))
+    bot.process_pending_results(datetime(2024, 6, 1, 18, 0, tzinfo=timezone.utc))  # Game can't be over yet
+    assert fetch.call_count == 1
+
+    # Past the expected end but still not final (e.g. a rain delay): back off exponentially
+    bot.process_pending_results(datetime(2024, 6, 1, 18, 40, tzinfo=timezone.utc))
+    assert fetch.call_count == 2
+    leg = models.get_pending_legs()[0]
+    assert (leg['game_pk'], leg['game_start'], leg['check_attempts']) == (745001, '2024-06-01 15:05:00', 2)
+    assert leg['next_check_at'] == '2024-06-01 19:10:00'  # 15 minutes doubled once
@@ -1,9 +1,11 @@
+import asyncio
+import io
+import time
 import pytest
 import tempfile
-import os
 from unittest.mock import Mock, patch, MagicMock
-from PIL import Image
-from capper_ranks.services.image_processor import ImageProcessor, image_processor
+from PIL import Image, ImageDraw
+from capper_ranks.services.image_processor import ImageProcessor, OCRExecutor, OCRResultCache, compute_content_hash, image_processor
 from capper_ranks.services import pick_detector
 
 class TestImageProcessor:
@@ -15,22 +17,38 @@ class TestImageProcessor:
     
     @patch('requests.get')
     def test_download_image_success(self, mock_get):
-        """Test successful image download."""
-        # Mock successful response
+        """Test successful image download into memory."""
+        # Mock successful streamed response
         mock_response = Mock()
         mock_response.raise_for_status.return_value = None
-        mock_response.content = b'fake_image_data'
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [b'fake_', b'image_data']
         mock_get.return_value = mock_response
         
         # Test download
         result = self.processor.download_image('https://example.com/test.jpg')
         
         assert result is not None
-        assert result.endswith('.jpg')
-        assert os.path.exists(result)
+        assert result.read() == b'fake_image_data'
+        mock_response.close.assert_called_once()
+    
+    @patch('capper_ranks.services.image_processor.MAX_IMAGE_BYTES', 8)
+    @patch('requests.get')
+    def test_download_image_too_large(self, mock_get):
+        """Test that downloads are aborted once they exceed the byte limit."""
+        mock_response = Mock()
+        mock_response.raise_for_status.return_value = None
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = iter([b'12345', b'67890', b'never read'])
+        mock_get.return_value = mock_response
         
-        # Clean up
-        os.unlink(result)
+        assert self.processor.download_image('https://example.com/huge.jpg') is None
+        
+        # A Content-Length over the limit is rejected before reading the body
+        mock_response.headers = {'Content-Length': '100'}
+        mock_response.iter_content.reset_mock()
+        assert self.processor.download_image('https://example.com/huge.jpg') is None
+        mock_response.iter_content.assert_not_called()
     
     @patch('requests.get')
     def test_download_image_failure(self, mock_get):
@@ -65,6 +83,30 @@ class TestImageProcessor:
         result = self.processor.extract_text_from_image('/non/existent/file.jpg')
         assert result is None
     
+    def test_extract_text_from_image_buffer(self):
+        """Test OCR straight from an in-memory buffer."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (100, 50), color='white').save(buffer, format='PNG')
+        buffer.seek(0)
+        
+        with patch('pytesseract.image_to_string', return_value="Aaron Judge Over 0.5 Home Runs"):
+            result = self.processor.extract_text_from_image(buffer)
+        
+        assert result == "Aaron Judge Over 0.5 Home Runs"
+    
+    @patch('capper_ranks.services.image_processor.MAX_IMAGE_PIXELS', 100)
+    def test_extract_text_rejects_decompression_bombs(self):
+        """Test that oversized images are rejected before tesseract runs."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (100, 50), color='white').save(buffer, format='PNG')
+        buffer.seek(0)
+        
+        with patch('pytesseract.image_to_string') as mock_ocr:
+            result = self.processor.extract_text_from_image(buffer)
+        
+        assert result is None
+        mock_ocr.assert_not_called()
+    
     def test_clean_ocr_text(self):
         """Test OCR text cleaning functionality."""
         # Test with various OCR artifacts
@@ -81,6 +123,12 @@ class TestImageProcessor:
         assert "Aaron Judge Over 0.5 Home Runs" in cleaned  # 0ver -> Over
         assert cleaned.count('\n') == 1  # Should have 1 line break between 2 lines
     
+    def test_clean_ocr_text_line_artifacts(self):
+        """Test the "+" spacing, per-line tail stripping and alt prop merging."""
+        assert self.processor._clean_ocr_text("2+TOTAL BASES") == "2+  TOTAL BASES"
+        assert self.processor._clean_ocr_text("Yankees ML -135 fe\nOVER 1.5 TOTAL BASES ~~|") == "Yankees ML -135\nOVER 1.5 TOTAL BASES"
+        assert self.processor._clean_ocr_text("Juan Soto 1+ +350 AB\nALT HOME RUNS") == "Juan Soto 1+ Home Runs"
+
     def test_clean_ocr_text_empty(self):
         """Test cleaning empty OCR text."""
         result = self.processor._clean_ocr_text("")
@@ -230,4 +278,128 @@ def test_tesseract_path_configuration():
     # The processor should handle tesseract path configuration gracefully
     # We can't easily test the actual path detection without installing tesseract,
     # but we can verify the processor initializes without errors
-    assert processor is not None 
\ No newline at end of file
+    assert processor is not None 
+
+class TestOCRExecutor:
+    """Test cases for the pooled OCR executor."""
+    
+    def _png_bytes(self, width=60):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, 30), color='white').save(buffer, format='PNG')
+        return buffer.getvalue()
+    
+    def test_map_returns_results_in_order(self):
+        """Test that jobs run on the pool and results come back in submission order."""
+        executor = OCRExecutor(max_workers=2, max_queue_size=2, job_timeout=5, use_processes=False)
+        
+        def slower_for_narrower_images(image, timeout):
+            # Earlier (narrower) images finish last, so completion order is the reverse of submission order
+            time.sleep((90 - image.width) / 300)
+            return f"width {image.width}"
+        
+        with patch('pytesseract.image_to_string', side_effect=slower_for_narrower_images):
+            results = executor.map([self._png_bytes(60), self._png_bytes(70), self._png_bytes(80)])
+        executor.shutdown()
+        
+        assert results == ["width 60", "width 70", "width 80"]
+    
+    def test_timeout_only_counts_once_a_job_is_running(self):
+        """Test that jobs queued behind a busy pool don't time out before they start."""
+        executor = OCRExecutor(max_workers=1, job_timeout=0.3, use_processes=False)
+        
+        def slow_ocr(image, timeout):
+            time.sleep(0.15)
+            return "Aaron Judge Over 0.5 Home Runs"
+        
+        async def run_all():
+            return await asyncio.gather(*(executor.submit_async(self._png_bytes()) for _ in range(4)))
+        
+        with patch('pytesseract.image_to_string', side_effect=slow_ocr):
+            results = asyncio.run(run_all())
+        executor.shutdown()
+        
+        # The last job waits 0.45s in the queue, longer than job_timeout, but runs in 0.15s
+        assert results == ["Aaron Judge Over 0.5 Home Runs"] * 4
+    
+    def test_failed_job_returns_none(self):
+        """Test that a failing job yields None instead of raising."""
+        executor = OCRExecutor(max_workers=1, job_timeout=5, use_processes=False)
+        assert executor.map([b'not an image']) == [None]
+        executor.shutdown()
+    
+    def test_extract_text_from_images_cleans_text(self):
+        """Test the ImageProcessor entry point that fans images out to the executor."""
+        processor = ImageProcessor(ocr_executor=OCRExecutor(max_workers=2, job_timeout=5, use_processes=False))
+        with patch('pytesseract.image_to_string', return_value="Aaron Judge 0ver 0.5 Home Runs\n\n"):
+            results = processor.extract_text_from_images([io.BytesIO(self._png_bytes()), io.BytesIO(b'broken')])
+        processor.ocr_executor.shutdown()
+        
+        assert results == ["Aaron Judge Over 0.5 Home Runs", None]
+
+
+class TestOCRResultCache:
+    """Test cases for hashing images and caching their OCR results."""
+    
+    def _slip_bytes(self, size=(300, 200), fmt='PNG', quality=None):
+        image = Image.new('RGB', (300, 200), color='white')
+        for x in range(0, 150):
+            for y in range(40, 80):
+                image.putpixel((x, y), (0, 0, 0))
+        image = image.resize(size)
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt, **({'quality': quality} if quality else {}))
+        return buffer.getvalue()
+    
+    def _template_slip_bytes(self, lines):
+        image = Image.new('RGB', (300, 200), color='white')
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((0, 0, 300, 30), fill=(20, 120, 60))
+        for i, line in enumerate(lines):
+            draw.text((10, 45 + i * 25), line, fill='black')
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        return buffer.getvalue()
+    
+    def test_cache_hit_for_exact_bytes(self):
+        """Test that the same image bytes hit the cache and a re-encoded copy is OCR'd again."""
+        cache = OCRResultCache()
+        detection = {'legs': [{'subject': 'Aaron Judge'}], 'is_parlay': False}
+        cache.put(compute_content_hash(self._slip_bytes()), "Aaron Judge Over 0.5 Home Runs", detection)
+        
+        exact = cache.get(compute_content_hash(self._slip_bytes()))
+        near = cache.get(compute_content_hash(self._slip_bytes(size=(600, 400), fmt='JPEG', quality=60)))
+        
+        assert exact == {'extracted_text': "Aaron Judge Over 0.5 Home Runs", 'detection_result': detection}
+        assert near is None
+    
+    def test_slips_from_the_same_template_do_not_share_an_entry(self):
+        """Test that two different picks on one sportsbook template never answer for each other."""
+        cache = OCRResultCache()
+        judge_hash = compute_content_hash(self._template_slip_bytes(["Aaron Judge", "Over 1.5 Total Bases", "-115"]))
+        soto_hash = compute_content_hash(self._template_slip_bytes(["Juan Soto", "Under 0.5 Home Runs", "+320"]))
+        
+        cache.put(judge_hash, "Aaron Judge Over 1.5 Total Bases", {'legs': [{'subject': 'Aaron Judge'}], 'is_parlay': False})
+        
+        assert cache.get(soto_hash) is None
+    
+    def test_cache_evicts_by_size(self):
+        """Test that the least recently used entries are evicted once over the byte budget."""
+        cache = OCRResultCache(max_bytes=25, evict_every=1)
+        cache.put('a' * 64, "x" * 10, None)
+        cache.put('b' * 64, "y" * 10, None)
+        cache.put('c' * 64, "z" * 10, None)
+        
+        assert cache.get('a' * 64) is None
+        assert cache.get('c' * 64)['extracted_text'] == "z" * 10
+    
+    def test_cache_evicts_every_n_puts(self):
+        """Test that eviction waits for evict_every new entries instead of running on each put."""
+        cache = OCRResultCache(max_bytes=25, evict_every=3)
+        cache.put('a' * 64, "x" * 10, None)
+        cache.put('b' * 64, "y" * 10, None)
+        cache.put('c' * 64, "z" * 10, None)  # Third put: over budget, 'a' is evicted
+        cache.put('d' * 64, "w" * 10, None)
+        
+        assert cache.get('a' * 64) is None
+        assert cache.get('b' * 64)['extracted_text'] == "y" * 10
+        assert cache.get('d' * 64)['extracted_text'] == "w" * 10
@@ -0,0 +1,75 @@
+# tests/test_log.py
+import io
+import json
+import logging
+import pytest
+from capper_ranks.core import config
+from capper_ranks.utils import log
+
+
+@pytest.fixture
+def log_stream():
+    """Configures logging into a buffer, and undoes it afterwards so other tests see the defaults."""
+    stream = io.StringIO()
+    yield stream
+    root = logging.getLogger(log.ROOT_LOGGER)
+    if log._handler is not None:
+        root.removeHandler(log._handler)
+        log._handler = None
+    for name in log._configured_levels:
+        logging.getLogger(name).setLevel(logging.NOTSET)
+    log._configured_levels.clear()
+    root.setLevel(logging.NOTSET)
+    root.propagate = True
+
+
+def test_json_output_with_per_module_levels(log_stream):
+    log.configure_logging(level='WARNING', levels='services.pick_detector=DEBUG', json_output=True, stream=log_stream)
+
+    log.get_logger('capper_ranks.services.pick_detector').debug("Analyzing line: %r", "NYY ML", extra={'tweet_id': '12'})
+    log.get_logger('capper_ranks.services.sports_api').info("Not shown")
+    log.get_logger('capper_ranks.services.sports_api').warning("Shown")
+
+    entries = [json.loads(line) for line in log_stream.getvalue().splitlines()]
+    assert [entry['message'] for entry in entries] == ["Analyzing line: 'NYY ML'", "Shown"]
+    assert entries[0]['level'] == 'DEBUG'
+    assert entries[0]['logger'] == 'capper_ranks.services.pick_detector'
+    assert entries[0]['tweet_id'] == '12'
+
+
+def test_reconfiguring_replaces_the_previous_setup(log_stream):
+    log.configure_logging(level='INFO', levels='database=DEBUG', stream=log_stream)
+    log.configure_logging(level='INFO', levels='', stream=log_stream)
+
+    log.get_logger('capper_ranks.database.models').debug("Not shown")
+    log.get_logger('capper_ranks.database.models').info("Initializing database...")
+
+    lines = log_stream.getvalue().splitlines()
+    assert len(lines) == 1
+    assert lines[0].endswith("INFO    capper_ranks.database.models: Initializing database...")
+
+
+def test_invalid_levels_are_rejected():
+    with pytest.raises(ValueError):
+        log.parse_levels('services.pick_detector')
+    with pytest.raises(ValueError):
+        log.parse_levels('services.pick_detector=LOUD')
+    assert log.parse_levels(' capper_ranks.bot=info, ') == {'capper_ranks.bot': logging.INFO}
+
+
+def test_sampled_debug_costs_nothing_when_debug_is_off(log_stream, mocker, monkeypatch):
+    log.configure_logging(level='INFO', levels='', stream=log_stream)
+    sample = mocker.patch('capper_ranks.utils.log.random.random', return_value=0.5)
+    logger = log.get_logger('capper_ranks.services.pick_detector')
+
+    log.sampled_debug(logger, "Analyzing line: %r", "NYY ML")
+    sample.assert_not_called()
+
+    log.configure_logging(level='DEBUG', levels='', stream=log_stream)
+    monkeypatch.setattr(config, 'LOG_SAMPLE_RATE', 0.25)
+    log.sampled_debug(logger, "Dropped by sampling")
+    monkeypatch.setattr(config, 'LOG_SAMPLE_RATE', 0.75)
+    log.sampled_debug(logger, "Sampled in")
+
+    assert log_stream.getvalue().splitlines()[-1].endswith("Sampled in")
+    assert "Dropped by sampling" not in log_stream.getvalue()
@@ -0,0 +1,278 @@
+# tests/test_models.py
+import sqlite3
+import threading
+from datetime import datetime
+import pytest
+from capper_ranks.database import models
+
+
+def store_parlay(tweet_id='100', capper_id='1'):
+    detection = {
+        'legs': [
+            {'sport_league': 'MLB', 'subject': 'nyy', 'bet_type': 'Moneyline', 'line': None, 'odds': None, 'bet_qualifier': 'Full Game'},
+            {'sport_league': 'MLB', 'subject': 'hou', 'bet_type': 'Spread', 'line': -1.5, 'odds': None, 'bet_qualifier': 'Full Game'},
+        ],
+        'is_parlay': True,
+    }
+    return models.store_bet_and_legs(capper_id, tweet_id, None, datetime(2024, 6, 1, 12, 0), detection)
+
+
+def test_connection_is_reused_within_a_thread():
+    assert models.get_connection() is models.get_connection()
+
+
+def test_transaction_rolls_back_everything_on_error():
+    with pytest.raises(RuntimeError):
+        with models.transaction():
+            models.add_capper('1', 'capper_one')
+            models.update_last_seen_tweet_id('1', '42')
+            raise RuntimeError("boom")
+
+    assert models.get_capper_by_username('capper_one') is None
+    assert models.get_last_seen_tweet_id('1') is None
+
+
+def test_nested_failure_only_rolls_back_inner_block():
+    """A duplicate insert inside an outer transaction must not undo the outer work."""
+    with models.transaction():
+        first_bet = store_parlay('100')
+        duplicate = store_parlay('100')
+        models.update_last_seen_tweet_id('1', '100')
+
+    assert first_bet is not None
+    assert duplicate is None
+    assert models.get_last_seen_tweet_id('1') == '100'
+
+
+def test_grading_a_parlay_in_one_transaction_rolls_up_the_bet():
+    bet_id = store_parlay()
+    leg_ids = [row['leg_id'] for row in models.get_pending_legs()]
+
+    with models.transaction():
+        for leg_id in leg_ids:
+            models.update_leg_status(leg_id, 'WIN')
+
+    status = models.get_connection().execute("SELECT status FROM bets WHERE bet_id = ?", (bet_id,)).fetchone()['status']
+    assert status == 'WIN'
+
+
+def test_connections_use_wal_and_read_only_readers_see_commits():
+    assert models.get_connection().execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+
+    models.add_capper('1', 'capper_one')
+    reader = models.get_read_connection()
+    assert reader.execute("SELECT username FROM cappers").fetchone()['username'] == 'capper_one'
+    with pytest.raises(sqlite3.OperationalError):
+        reader.execute("DELETE FROM cappers")
+
+
+def test_reader_is_not_blocked_by_an_open_write_transaction():
+    models.add_capper('1', 'capper_one')
+    with models.transaction():
+        models.add_capper('2', 'capper_two')
+        # The uncommitted write holds the write lock; the reader still gets the last committed snapshot
+        rows = models.get_read_connection().execute("SELECT capper_id FROM cappers").fetchall()
+        assert [row['capper_id'] for row in rows] == ['1']
+
+
+def test_migrations_upgrade_a_legacy_database(tmp_path, monkeypatch):
+    """A database created before migrations existed is upgraded in place and its bets get a tweet_date."""
+    from capper_ranks.core import config
+    legacy_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(legacy_path)
+    conn.executescript('''
+        CREATE TABLE bets (
+            bet_id INTEGER PRIMARY KEY AUTOINCREMENT, capper_id TEXT NOT NULL, original_tweet_id TEXT NOT NULL UNIQUE,
+            our_retweet_id TEXT, bet_format TEXT NOT NULL, overall_odds INTEGER,
+            status TEXT NOT NULL DEFAULT 'PENDING_RESULT', timestamp_detected DATETIME DEFAULT CURRENT_TIMESTAMP,
+            tweet_timestamp DATETIME NOT NULL
+        );
+        INSERT INTO bets (capper_id, original_tweet_id, bet_format, tweet_timestamp) VALUES ('1', '99', 'Single', '2024-05-31 22:15:00');
+    ''')
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(config, "DATABASE_NAME", legacy_path)
+
+    assert models.migrate() == len(models.MIGRATIONS)
+    assert models.migrate() == 0
+    assert models.get_schema_version() == models.MIGRATIONS[-1][0]
+    row = models.get_connection().execute("SELECT tweet_date FROM bets WHERE original_tweet_id = '99'").fetchone()
+    assert row['tweet_date'] == '2024-05-31'
+
+
+
+def test_migration_drops_the_ocr_cache_dhash_column(tmp_path, monkeypatch):
+    """An ocr_cache created with the old dhash column is rebuilt without it and keeps its entries."""
+    from capper_ranks.core import config
+    old_path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(old_path)
+    conn.executescript('''
+        CREATE TABLE ocr_cache (
+            content_hash TEXT PRIMARY KEY, dhash TEXT NOT NULL, extracted_text TEXT, detection_json TEXT,
+            size_bytes INTEGER NOT NULL, last_used_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        INSERT INTO ocr_cache (content_hash, dhash, extracted_text, size_bytes) VALUES ('abc', '00ff00ff00ff00ff', 'NYY ML', 6);
+        PRAGMA user_version = 6;
+    ''')
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(config, "DATABASE_NAME", old_path)
+
+    assert models.migrate() == 1
+    columns = [row[1] for row in models.get_connection().execute("PRAGMA table_info(ocr_cache)")]
+    assert 'dhash' not in columns
+    assert models.get_ocr_cache_entry('abc')['extracted_text'] == 'NYY ML'
+    models.store_ocr_cache_entry('def', 'LAD ML', None)
+    assert models.get_ocr_cache_entry('def')['size_bytes'] == 6
+
+def test_hot_queries_use_indexes():
+    conn = models.get_connection()
+    pending_plan = " ".join(row['detail'] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM legs WHERE status = 'PENDING_RESULT'"))
+    dedup_plan = " ".join(row['detail'] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT 1 FROM legs l JOIN bets b ON l.bet_id = b.bet_id WHERE b.capper_id = '1' AND b.tweet_date = '2024-06-01'"))
+    assert "idx_legs_status" in pending_plan
+    assert "idx_bets_capper_date" in dedup_plan
+
+
+def test_duplicate_single_on_same_day_is_skipped():
+    detection = {'legs': [{'sport_league': 'MLB', 'subject': 'nyy', 'bet_type': 'Moneyline', 'line': None, 'odds': None, 'bet_qualifier': 'Full Game'}], 'is_parlay': False}
+    assert models.store_bet_and_legs('1', '200', None, datetime(2024, 6, 1, 9, 0), detection) is not None
+    assert models.store_bet_and_legs('1', '201', None, datetime(2024, 6, 1, 18, 0), detection) is None
+    assert models.store_bet_and_legs('1', '202', None, datetime(2024, 6, 2, 9, 0), detection) is not None
+
+
+def test_store_bets_bulk_reports_outcome_per_record():
+    single = {'legs': [{'sport_league': 'MLB', 'subject': 'nyy', 'bet_type': 'Moneyline', 'line': None, 'odds': None, 'bet_qualifier': 'Full Game'}], 'is_parlay': False}
+    store_parlay('300', capper_id='9')
+    records = [
+        {'capper_id': '1', 'tweet_id': '301', 'retweet_id': None, 'tweet_timestamp': datetime(2024, 6, 1, 9, 0), 'detection_result': single},
+        {'capper_id': '1', 'tweet_id': '302', 'retweet_id': None, 'tweet_timestamp': datetime(2024, 6, 1, 10, 0), 'detection_result': single},
+        {'capper_id': '1', 'tweet_id': '300', 'retweet_id': None, 'tweet_timestamp': datetime(2024, 6, 1, 11, 0), 'detection_result': single},
+        {'capper_id': '2', 'tweet_id': '303', 'retweet_id': None, 'tweet_timestamp': datetime(2024, 6, 1, 9, 0), 'detection_result': single},
+    ]
+
+    outcomes = models.store_bets_bulk(records)
+
+    assert [outcome['status'] for outcome in outcomes] == ['STORED', 'DUPLICATE_PICK', 'DUPLICATE_TWEET', 'STORED']
+    assert outcomes[0]['bet_id'] and outcomes[3]['bet_id'] and outcomes[0]['bet_id'] != outcomes[3]['bet_id']
+    leg_count = models.get_connection().execute("SELECT COUNT(*) FROM legs").fetchone()[0]
+    assert leg_count == 4  # Two parlay legs plus the two stored singles
+
+
+def test_single_repeating_a_parlay_leg_on_same_day_is_a_duplicate():
+    """Singles are checked against every leg the capper posted that day, including parlay legs."""
+    repeat = {'legs': [{'sport_league': 'MLB', 'subject': 'hou', 'bet_type': 'Spread', 'line': -1.5, 'odds': None, 'bet_qualifier': 'Full Game'}], 'is_parlay': False}
+    store_parlay('500')
+    parlay_in_batch = {'legs': [
+        {'sport_league': 'MLB', 'subject': 'bos', 'bet_type': 'Moneyline', 'line': None, 'odds': None, 'bet_qualifier': 'Full Game'},
+        {'sport_league': 'MLB', 'subject': 'sea', 'bet_type': 'Moneyline', 'line': None, 'odds': None, 'bet_qualifier': 'Full Game'},
+    ], 'is_parlay': True}
+    bos = {'legs': [parlay_in_batch['legs'][0]], 'is_parlay': False}
+    records = [
+        {'capper_id': '1', 'tweet_id': '501', 'retweet_id': None, 'tweet_timestamp': datetime(2024, 6, 1, 15, 0), 'detection_result': repeat},
+        {'capper_id': '1', 'tweet_id': '502', 'retweet_id': None, 'tweet_timestamp': datetime(2024, 6, 1, 16, 0), 'detection_result': parlay_in_batch},
+        {'capper_id': '1', 'tweet_id': '503', 'retweet_id': None, 'tweet_timestamp': datetime(2024, 6, 1, 17, 0), 'detection_result': bos},
+        {'capper_id': '1', 'tweet_id': '504', 'retweet_id': None, 'tweet_timestamp': datetime(2024, 6, 2, 9, 0), 'detection_result': repeat},
+    ]
+
+    outcomes = models.store_bets_bulk(records)
+
+    assert [outcome['status'] for outcome in outcomes] == ['DUPLICATE_PICK', 'STORED', 'DUPLICATE_PICK', 'STORED']
+
+
+@pytest.mark.parametrize("leg_statuses, expected", [
+    (['WIN', 'WIN'], 'WIN'),
+    (['WIN', 'LOSS'], 'LOSS'),
+    (['PUSH', 'PUSH'], 'PUSH'),
+    (['WIN', 'PUSH'], 'LOSS'),
+    (['WIN', 'PENDING_RESULT'], 'PENDING_RESULT'),
+])
+def test_batch_rollup_matches_parlay_rules(leg_statuses, expected):
+    bet_id = store_parlay()
+    leg_ids = [row['leg_id'] for row in models.get_pending_legs()]
+
+    models.update_leg_statuses({leg_id: status for leg_id, status in zip(leg_ids, leg_statuses) if status != 'PENDING_RESULT'})
+
+    status = models.get_connection().execute("SELECT status FROM bets WHERE bet_id = ?", (bet_id,)).fetchone()['status']
+    assert status == expected
+
+
+def test_rollup_trigger_settles_parlays_updated_directly():
+    models.set_parlay_rollup_trigger(True)
+    bet_id = store_parlay()
+
+    with models.transaction() as conn:
+        conn.execute("UPDATE legs SET status = 'WIN' WHERE bet_id = ?", (bet_id,))
+
+    status = models.get_connection().execute("SELECT status FROM bets WHERE bet_id = ?", (bet_id,)).fetchone()['status']
+    assert status == 'WIN'
+
+
+def stats_snapshot():
+    rows = models.get_connection().execute("SELECT * FROM capper_stats ORDER BY capper_id, league, bet_type, period_type, period_key")
+    return [tuple(row) for row in rows]
+
+
+def test_grading_updates_leaderboard_stats():
+    models.add_capper('1', 'capper_one')
+    models.add_capper('2', 'capper_two')
+    single = {'legs': [{'sport_league': 'MLB', 'subject': 'nyy', 'bet_type': 'Moneyline', 'line': None, 'odds': 150, 'bet_qualifier': 'Full Game'}], 'is_parlay': False}
+    models.store_bet_and_legs('2', '400', None, datetime(2024, 6, 1, 9, 0), single)
+    parlay_id = store_parlay('401', capper_id='1')
+    parlay_leg_id = next(row['leg_id'] for row in models.get_pending_legs() if row['bet_id'] == parlay_id)
+    leg_ids = [row['leg_id'] for row in models.get_pending_legs()]
+
+    models.update_leg_statuses({leg_id: 'WIN' for leg_id in leg_ids})
+
+    board = models.get_leaderboard()
+    assert [row['username'] for row in board] == ['capper_one', 'capper_two']
+    # Two -110 legs parlayed pay about 2.64 units; +150 pays 1.5
+    assert board[0]['units'] == pytest.approx((100 / 110 + 1) ** 2 - 1)
+    assert board[1]['units'] == pytest.approx(1.5)
+    parlay_row = models.get_capper_stats('1', 'season', '2024')
+    assert {(row['league'], row['bet_type'], row['wins']) for row in parlay_row} == {('MLB', 'Parlay', 1), ('ALL', 'Parlay', 1), ('MLB', 'ALL', 1), ('ALL', 'ALL', 1)}
+
+    # Re-grading reverses the old outcome, and the incremental totals match a full rebuild
+    models.update_leg_status(parlay_leg_id, 'LOSS')
+    incremental = stats_snapshot()
+    models.rebuild_capper_stats()
+    assert stats_snapshot() == incremental
+    assert models.get_leaderboard(order_by='wins')[0]['username'] == 'capper_two'
+    week = models.get_leaderboard(period_type='week', period_key='2024-W22')
+    assert [(row['username'], row['losses']) for row in week] == [('capper_two', 0), ('capper_one', 1)]
+
+
+def test_concurrent_writer_waits_instead_of_failing_store_bets_bulk(mocker):
+    """Another thread committing between store_bets_bulk's duplicate check and its insert must not break it."""
+    single = {'legs': [{'sport_league': 'MLB', 'subject': 'nyy', 'bet_type': 'Moneyline', 'line': None, 'odds': None, 'bet_qualifier': 'Full Game'}], 'is_parlay': False}
+    models.add_capper('1', 'capper_one')
+    errors = []
+
+    def other_writer():
+        try:
+            models.update_last_seen_tweet_id('1', '999')
+        except Exception as e:
+            errors.append(e)
+        finally:
+            models.close_connection()
+
+    writer = threading.Thread(target=other_writer)
+    existing_values = models._existing_values
+
+    def read_then_let_other_thread_write(conn, column, values):
+        result = existing_values(conn, column, values)
+        if writer.ident is None:  # First call only
+            writer.start()
+            writer.join(timeout=0.5)  # Without the write lock held, the other commit lands here
+        return result
+
+    mocker.patch.object(models, '_existing_values', side_effect=read_then_let_other_thread_write)
+
+    outcomes = models.store_bets_bulk([{'capper_id': '1', 'tweet_id': '400', 'retweet_id': None,
+                                        'tweet_timestamp': datetime(2024, 6, 1, 9, 0), 'detection_result': single}])
+    writer.join()
+
+    assert outcomes[0]['status'] == 'STORED'
+    assert errors == []
+    assert models.get_last_seen_tweet_id('1') == '999'
@@ -0,0 +1,98 @@
+# tests/test_pick_classifier.py
+import math
+import os
+import random
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+from capper_ranks import bot
+from capper_ranks.database import models
+from capper_ranks.services.pick_classifier import PickClassifier, pick_classifier
+
+PICKS = ["NYY ML is a lock", "Astros -1.5 tonight", "Love the Over 8.5 in the Dodgers game",
+         "Shohei Ohtani Over 1.5 Total Bases", "Juan Soto 1+ HR +350", "Mets ML -120 2u"]
+CHATTER = ["Good morning everyone", "What a game last night", "Join the discord, link in bio",
+           "Tail or fade? Let's get it", "Happy Father's Day", "Promo code in bio for 50% off"]
+
+
+def training_examples(seed=1, copies=20):
+    rng = random.Random(seed)
+    examples = [(text, rng.random() < 0.5, True) for text in PICKS * copies]
+    examples += [(text, rng.random() < 0.5, False) for text in CHATTER * copies]
+    rng.shuffle(examples)
+    return examples
+
+
+def make_tweet(tweet_id, text):
+    return SimpleNamespace(id=tweet_id, text=text, created_at=datetime(2024, 6, 1, 12, 0), attachments=None)
+
+
+def test_untrained_classifier_passes_everything():
+    assert pick_classifier.gate("Good morning everyone", True) == (True, None)
+
+
+def test_classifier_separates_picks_from_chatter_and_keeps_recall():
+    examples = training_examples()
+    classifier = PickClassifier(buckets=4096).fit(examples)
+    threshold = classifier.choose_threshold(examples, min_recall=1.0)
+
+    assert all(classifier.score(text, False) >= threshold for text in PICKS)
+    assert classifier.score("Yankees ML tonight", True) > classifier.score("Good morning, join the discord", True)
+    assert sum(classifier.score(text, True) < threshold for text in CHATTER) >= len(CHATTER) - 1
+
+
+def test_saved_model_is_loaded_by_the_gate(mocker):
+    classifier = PickClassifier(buckets=4096).fit(training_examples())
+    classifier.choose_threshold(training_examples(), min_recall=1.0)
+    classifier.save()
+    mocker.patch('capper_ranks.core.config.PICK_CLASSIFIER_AUDIT_RATE', 0.0)
+
+    process, score = pick_classifier.gate("Happy Father's Day", True)
+    assert process is False and score < pick_classifier.threshold
+    assert pick_classifier.gate("NYY ML is a lock", False)[0] is True
+
+
+def test_scan_skips_chatter_before_download_and_logs_every_tweet(mocker):
+    model = PickClassifier(buckets=4096).fit(training_examples())
+    model.choose_threshold(training_examples(), min_recall=1.0)
+    model.save()
+    mocker.patch('capper_ranks.core.config.PICK_CLASSIFIER_AUDIT_RATE', 0.0)
+    download = mocker.patch.object(bot.image_processor, 'download_image', return_value=None)
+    timeline = [
+        {'tweet': make_tweet(12, "Promo code in bio for 50% off"), 'media': [{'media_key': '3_1', 'url': 'https://img/promo.png'}]},
+        {'tweet': make_tweet(11, "NYY ML is a lock"), 'media': []},
+    ]
+    mocker.patch('capper_ranks.bot.x_client.get_tweets_with_media', return_value=timeline)
+
+    bot.scan_cappers(client=None, capper_ids=['1'])
+
+    download.assert_not_called()
+    rows = {row['tweet_id']: row for row in models.get_connection().execute("SELECT * FROM tweet_log")}
+    assert rows['11']['has_pick'] == 1 and rows['11']['pick_score'] is not None
+    assert rows['12']['has_pick'] is None and rows['12']['has_media'] == 1
+    # Skipped tweets have no known outcome, so they aren't training data
+    assert models.get_classifier_training_examples() == [("NYY ML is a lock", False, True)]
+
+
+def test_reload_waits_for_a_score_in_progress(tmp_path, mocker):
+    """A model reset by a reload on another thread must not pull the state out from under a score."""
+    model_path = str(tmp_path / "model.json")
+    mocker.patch('capper_ranks.core.config.PICK_CLASSIFIER_PATH', model_path)
+    PickClassifier(buckets=2 ** 12).fit([(text, False, True) for text in PICKS] + [(text, False, False) for text in CHATTER]).save(model_path)
+    classifier = PickClassifier(buckets=2 ** 12)
+    classifier.reload_if_changed()
+    os.remove(model_path)  # The next reload resets the classifier
+    reload = threading.Thread(target=classifier.reload_if_changed)
+    get_log_probs = classifier._get_log_probs
+
+    def reload_mid_score():
+        if reload.ident is None:
+            reload.start()
+            reload.join(timeout=0.2)  # Unless scoring holds the lock, the reset lands here
+        return get_log_probs()
+
+    mocker.patch.object(classifier, '_get_log_probs', side_effect=reload_mid_score)
+
+    assert classifier.score("NYY ML is a lock", False) > -math.inf
+    reload.join()
+    assert not classifier.is_trained
@@ -296,4 +296,110 @@ def test_live_tweet_format(mocker):
     assert result is not None
     assert result['legs'][0]['subject'] == 'Hunter Brown'
     assert result['legs'][0]['bet_qualifier'] == 'Over Strikeouts'
-    assert result['legs'][0]['line'] == 6.5
\ No newline at end of file
+    assert result['legs'][0]['line'] == 6.5
+
+def test_find_team_mentions_single_pass():
+    """Test that every team alias is found with its offset, preferring the longest alias."""
+    from capper_ranks.services.pick_detector import find_team_mentions, _find_sport_context
+
+    text = "New York Yankees vs Red Sox, NYY ML"
+    mentions = find_team_mentions(text)
+    assert mentions == [
+        ('new york yankees', 'MLB', 0),
+        ('red sox', 'MLB', 20),
+        ('nyy', 'MLB', 29),
+    ]
+    assert _find_sport_context(text) == ('new york yankees', 'MLB')
+    assert _find_sport_context("No teams here") == (None, None)
+
+def test_detect_picks_batch_parses_each_line_once(mocker):
+    """Test that detect_picks matches detect_pick per tweet while validating repeated lines only once."""
+    from capper_ranks.services.pick_detector import detect_picks
+
+    mock_get_league = mocker.patch('capper_ranks.services.sports_api.get_player_league',
+                                   side_effect=lambda name: "MLB" if name == "Shohei Ohtani" else None)
+    tweets = [
+        "Shohei Ohtani Over 1.5 Total Bases\nNYY ML",
+        "  Shohei Ohtani Over 1.5 Total Bases  \nParlay it with Astros -1.5",
+        "Nothing to see here",
+        None,
+    ]
+
+    results = detect_picks(tweets)
+    # Ohtani's line appears in two tweets but is validated once
+    assert mock_get_league.call_count == 1
+    assert [leg['subject'] for leg in results[0]['legs']] == ['Shohei Ohtani', 'nyy']
+    assert [leg['subject'] for leg in results[1]['legs']] == ['Shohei Ohtani', 'astros']
+    assert results[0]['is_parlay'] is False and results[1]['is_parlay'] is True
+    assert results[2] is None and results[3] is None
+    assert results[0] == detect_pick(tweets[0])
+
+    # Later batches reuse the cached legs, and callers can't mutate them
+    results[0]['legs'][0]['subject'] = 'mutated'
+    calls = mock_get_league.call_count
+    assert detect_picks([tweets[0]])[0]['legs'][0]['subject'] == 'Shohei Ohtani'
+    assert mock_get_league.call_count == calls
+
+def test_tokenize_line_into_typed_tokens():
+    """Test that one pass turns a line into typed tokens, matching multi-word phrases longest first."""
+    from capper_ranks.services.pick_lexer import tokenize
+
+    tokens = tokenize("St. Louis Cardinals -1.5 F5 o/u 8.5 +350 H+R+RBI Multi-leg")
+    assert [(token.kind, token.text) for token in tokens] == [
+        ('TEAM', 'St. Louis Cardinals'), ('SPREAD', '-1.5'), ('PERIOD', 'F5'), ('QUALIFIER', 'o/u'),
+        ('NUMBER', '8.5'), ('ODDS', '+350'), ('STAT', 'H+R+RBI'), ('PARLAY', 'Multi-leg'),
+    ]
+    assert tokens[0].value == 'st. louis cardinals'
+    assert tokens[3].value == 'Over'
+    assert tokens[5].value == 350
+
+def test_parlay_keywords_match_whole_words_only(mocker):
+    """Test that keywords like "set" and "leg" no longer fire inside other words."""
+    for text, expected in [("Settle in, NYY ML is legit", False), ("3 legs tonight\nNYY ML", True), ("#SGP NYY ML", True)]:
+        result = detect_pick(text)
+        assert result is not None
+        assert result['is_parlay'] is expected, text
+
+def test_every_parlay_keyword_marks_a_parlay_on_any_line():
+    """Test that each parlay keyword, multi-word ones included, counts from its own line or from the pick line."""
+    from capper_ranks.services.pick_lexer import PARLAY_KEYWORDS
+    for keyword in PARLAY_KEYWORDS:
+        for text in (f"{keyword.title()}!\nNYY ML", f"NYY ML ({keyword.upper()})", f"NYY ML\nlate {keyword} tonight"):
+            result = detect_pick(text)
+            assert result is not None
+            assert result['is_parlay'] is True, text
+    assert detect_pick("All must\nNYY ML")['is_parlay'] is False
+
+def test_detect_plus_and_home_run_props(mocker):
+    """Test the "1+", "2+ TOTAL BASES" and "TO HIT A HOME RUN" shapes, with stat types normalized."""
+    mocker.patch('capper_ranks.services.sports_api.get_player_league',
+                 side_effect=lambda name: "MLB" if name in ("Juan Soto", "SHOHEI OHTANI", "AARON JUDGE") else None)
+
+    cases = [
+        ("Juan Soto 1+ HR +350", 0.5, 'Over Home Runs'),
+        ("SHOHEI OHTANI 2+  TOTALBASES", 1.5, 'Over Total Bases'),
+        ("AARON JUDGE I TO HIT AHOME RUN", 0.5, 'Over Home Runs'),
+    ]
+    for text, line, bet_qualifier in cases:
+        result = detect_pick(text)
+        assert result is not None, text
+        assert result['legs'][0]['line'] == line
+        assert result['legs'][0]['bet_qualifier'] == bet_qualifier
+    assert detect_pick("AARON JUDGE I TO HIT AHOME RUN")['legs'][0]['subject'] == 'AARON JUDGE'
+
+def test_prefilter_rejects_chatter_without_lookups(mocker):
+    """Test that lines no bet shape can match never reach player lookups, and are counted."""
+    from capper_ranks.services.pick_detector import get_prefilter_stats, reset_prefilter_stats
+
+    mock_get_league = mocker.patch('capper_ranks.services.sports_api.get_player_league', return_value=None)
+    reset_prefilter_stats()
+
+    result = detect_pick("Big Night Ahead For Everyone O U\nTail Or Fade\nParlay Time\nJuan Soto Over 1.5 Hits")
+    assert result is None
+    # Only the last line made it past the prefilter
+    assert {call.args[0] for call in mock_get_league.call_args_list} <= {"Juan Soto", "Soto"}
+    assert get_prefilter_stats() == {'checked': 4, 'rejected': 3, 'rejection_rate': 0.75}
+
+    # Rejected lines still count towards parlay detection
+    mocker.patch('capper_ranks.services.sports_api.get_player_league', return_value="MLB")
+    assert detect_pick("Parlay Time\nJuan Soto Over 1.5 Hits")['is_parlay'] is True
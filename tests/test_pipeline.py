@@ -0,0 +1,70 @@
+# tests/test_pipeline.py
+import asyncio
+import io
+from datetime import datetime
+from types import SimpleNamespace
+from PIL import Image
+from capper_ranks import pipeline
+from capper_ranks.database import models
+
+
+def make_tweet(tweet_id, text):
+    return SimpleNamespace(id=tweet_id, text=text, created_at=datetime(2024, 6, 1, 12, 0), attachments=None)
+
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def stored_tweet_ids():
+    return {row['original_tweet_id'] for row in models.get_connection().execute("SELECT original_tweet_id FROM bets")}
+
+
+def test_pipeline_stores_text_and_image_picks(mocker):
+    timelines = {
+        '1': [{'tweet': make_tweet(12, "Today's slip"), 'media': [{'media_key': '3_1', 'url': 'https://img/slip.png'}]},
+              {'tweet': make_tweet(11, "NYY ML is a lock"), 'media': []}],
+        '2': [{'tweet': make_tweet(21, "Good morning"), 'media': []}],
+    }
+    mocker.patch('capper_ranks.pipeline.x_client.get_tweets_with_media',
+                 side_effect=lambda client, capper_id, since_id=None: timelines[capper_id])
+    mocker.patch('capper_ranks.bot.image_processor.download_image', return_value=io.BytesIO(png_bytes('white')))
+
+    async def fake_ocr(image_bytes):
+        return "Astros -1.5"
+    mocker.patch.object(pipeline.image_processor.ocr_executor, 'submit_async', side_effect=fake_ocr)
+
+    asyncio.run(pipeline.Pipeline(client=None).run(['1', '2'], grade=False))
+
+    assert stored_tweet_ids() == {'11', '12'}
+    assert models.get_last_seen_tweet_id('1') == '12'
+    assert models.get_last_seen_tweet_id('2') == '21'
+    assert models.get_processed_media('3_1', 'https://img/slip.png') is not None
+
+
+def test_slow_ocr_does_not_stall_other_cappers(mocker):
+    """Capper 2's text pick is stored while capper 1's OCR job is still running."""
+    timelines = {
+        '1': [{'tweet': make_tweet(12, "Slip"), 'media': [{'media_key': '3_1', 'url': 'https://img/slow.png'}]}],
+        '2': [{'tweet': make_tweet(21, "Astros -1.5 tonight"), 'media': []}],
+    }
+    mocker.patch('capper_ranks.pipeline.x_client.get_tweets_with_media',
+                 side_effect=lambda client, capper_id, since_id=None: timelines[capper_id])
+    mocker.patch('capper_ranks.bot.image_processor.download_image', return_value=io.BytesIO(png_bytes('black')))
+    stored_while_ocr_ran = []
+
+    async def slow_ocr(image_bytes):
+        for _ in range(200):
+            if models.get_last_seen_tweet_id('2'):
+                break
+            await asyncio.sleep(0.01)
+        stored_while_ocr_ran.append(models.get_last_seen_tweet_id('2'))
+        return "Astros -1.5"
+    mocker.patch.object(pipeline.image_processor.ocr_executor, 'submit_async', side_effect=slow_ocr)
+
+    asyncio.run(pipeline.Pipeline(client=None).run(['1', '2'], grade=False))
+
+    assert stored_while_ocr_ran == ['21']
+    assert stored_tweet_ids() == {'12', '21'}
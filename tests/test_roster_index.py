@@ -0,0 +1,68 @@
+# tests/test_roster_index.py
+from capper_ranks.services import sports_api
+from capper_ranks.services.roster_index import RosterIndex, normalize_player_name, roster_index
+
+ROSTER_RESPONSE = {
+    'people': [
+        {'id': 660271, 'fullName': 'Shohei Ohtani', 'useName': 'Shohei', 'lastName': 'Ohtani', 'currentTeam': {'id': 119}},
+        {'id': 660670, 'fullName': 'Ronald Acuña Jr.', 'useName': 'Ronald', 'lastName': 'Acuña', 'currentTeam': {'id': 144}},
+        {'id': 665489, 'fullName': 'Vladimir Guerrero Jr.', 'useName': 'Vladimir', 'lastName': 'Guerrero', 'currentTeam': {'id': 141}},
+        {'id': 1, 'fullName': 'Will Smith', 'useName': 'Will', 'lastName': 'Smith', 'currentTeam': {'id': 119}},
+        {'id': 2, 'fullName': 'Dominic Smith', 'useName': 'Dominic', 'lastName': 'Smith', 'currentTeam': {'id': 121}},
+    ]
+}
+
+
+def test_normalize_player_name():
+    assert normalize_player_name("Ronald Acuña Jr.") == "ronald acuna"
+    assert normalize_player_name("RONALD ACUNA JR") == "ronald acuna"
+    assert normalize_player_name("Rona1d Acuna") == "ronald acuna"
+    assert normalize_player_name("Isiah Kiner-Falefa") == "isiah kiner falefa"
+
+
+def test_roster_index_lookups(mocker):
+    mocker.patch('capper_ranks.services.roster_index.statsapi.get', return_value=ROSTER_RESPONSE)
+    index = RosterIndex()
+
+    assert index.ensure_loaded()
+    assert index.find("SHOHEI OHTANI")['player_id'] == 660271
+    assert index.find("Ohtani")['player_id'] == 660271  # Unique last name
+    assert index.find("Ronald Acuna Jr.")['full_name'] == 'Ronald Acuña Jr.'
+    assert index.find("Vladimir Guerrero Jr.")['team_id'] == 141
+    assert index.find("Smith") is None  # Ambiguous last name
+    assert index.find("Will Smith")['player_id'] == 1
+    assert index.find("betting on Shohei Ohtani") is None
+
+
+def test_roster_index_pulls_once_and_reloads_from_db(mocker):
+    """The roster is pulled once; a fresh process reloads it from the table without the network."""
+    api_get = mocker.patch('capper_ranks.services.roster_index.statsapi.get', return_value=ROSTER_RESPONSE)
+
+    assert RosterIndex().ensure_loaded()
+    second_process = RosterIndex()
+    assert second_process.ensure_loaded()
+    assert second_process.find("Shohei Ohtani") is not None
+    assert api_get.call_count == 1
+
+
+def test_get_player_league_uses_roster_index(mocker):
+    """With the index loaded, detection validates names without any per-name lookups."""
+    mocker.patch('capper_ranks.services.roster_index.statsapi.get', return_value=ROSTER_RESPONSE)
+    lookup = mocker.patch('capper_ranks.services.sports_api.statsapi.lookup_player')
+
+    assert sports_api.get_player_league("Shohei Ohtani") == 'MLB'
+    assert sports_api.get_player_league("betting on Shohei Ohtani") == 'MLB'  # Unique last name
+    assert sports_api.get_player_league("Today Smith") is None  # Ambiguous last name
+    assert sports_api.get_player_league("Today Nobody") is None
+    lookup.assert_not_called()
+
+
+def test_get_player_league_falls_back_without_index(mocker):
+    """If no roster can be loaded, the cached per-name lookup is used instead."""
+    mocker.patch('capper_ranks.services.roster_index.statsapi.get', side_effect=Exception("offline"))
+    mocker.patch('capper_ranks.services.sports_api.statsapi.lookup_player', return_value=[
+        {'id': 660271, 'fullName': 'Shohei Ohtani', 'mlbDebutDate': '2018-03-29', 'currentTeam': {'id': 119}}
+    ])
+
+    assert sports_api.get_player_league("Shohei Ohtani") == 'MLB'
+    assert not roster_index.ensure_loaded()
@@ -0,0 +1,71 @@
+# tests/test_scheduler.py
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from capper_ranks import scheduler
+from capper_ranks.database import models
+
+NOW = datetime(2024, 6, 1, 18, 0, tzinfo=timezone.utc)
+
+
+def test_scan_interval_adapts_to_posting_rate():
+    busy = scheduler.CapperScanState('1', next_scan_at=NOW)
+    quiet = scheduler.CapperScanState('2', next_scan_at=NOW)
+    for state in (busy, quiet):
+        state.record_scan(NOW, 0)
+
+    later = NOW + timedelta(hours=1)
+    busy.record_scan(later, 30)
+    quiet.record_scan(later, 0)
+
+    assert busy.next_scan_at == later + timedelta(minutes=5)
+    assert quiet.next_scan_at == later + timedelta(minutes=120)
+
+
+def test_grading_waits_for_the_leg_queue(mocker):
+    daemon = scheduler.Scheduler(client=None)
+    assert daemon.next_grading_time(NOW) == NOW + timedelta(minutes=60)
+
+    detection = {'legs': [{'sport_league': 'MLB', 'subject': 'nyy', 'bet_type': 'Moneyline', 'line': None, 'odds': None, 'bet_qualifier': 'Full Game'}], 'is_parlay': False}
+    models.store_bet_and_legs('1', '100', None, datetime(2024, 6, 1, 12, 0), detection)
+    # A leg that has never been checked is due right away
+    assert daemon.next_grading_time(NOW) == NOW
+
+    leg_id = models.get_pending_legs()[0]['leg_id']
+    models.schedule_leg_checks({leg_id: {'next_check_at': datetime(2024, 6, 1, 18, 35, tzinfo=timezone.utc)}})
+    assert daemon.next_grading_time(NOW) == datetime(2024, 6, 1, 18, 35, tzinfo=timezone.utc)
+
+
+def test_tick_scans_due_cappers_and_stop_ends_run(mocker):
+    mocker.patch('capper_ranks.scheduler.bot.resolve_capper_ids', return_value=['1', '2'])
+    scan = mocker.patch('capper_ranks.scheduler.bot.scan_cappers', return_value={'1': 2, '2': None})
+    grade = mocker.patch('capper_ranks.scheduler.bot.process_pending_results')
+    daemon = scheduler.Scheduler(client=None)
+
+    daemon.tick(NOW)
+
+    scan.assert_called_once_with(None, ['1', '2'])
+    grade.assert_called_once()
+    assert daemon.cappers['2'].next_scan_at == NOW + timedelta(minutes=5)
+    assert daemon.next_wake_at() <= NOW + timedelta(minutes=5)
+
+    daemon.stop()
+    daemon.run()  # Returns immediately once a stop was requested
+
+
+def test_failing_steps_are_retried_instead_of_ending_the_daemon(mocker):
+    mocker.patch('capper_ranks.scheduler.bot.resolve_capper_ids', return_value=['1'])
+    mocker.patch('capper_ranks.scheduler.bot.scan_cappers', side_effect=ConnectionError("X API unreachable"))
+    mocker.patch('capper_ranks.scheduler.bot.process_pending_results', side_effect=sqlite3.OperationalError("database is locked"))
+    daemon = scheduler.Scheduler(client=None)
+
+    daemon.tick(NOW)
+
+    assert daemon.cappers['1'].next_scan_at == NOW + timedelta(minutes=5)
+    assert daemon.next_grade_at == NOW + timedelta(minutes=5)
+
+    mocker.patch('capper_ranks.scheduler.bot.resolve_capper_ids', side_effect=ConnectionError("X API unreachable"))
+    daemon.next_capper_refresh_at = NOW
+    daemon.tick(NOW)
+
+    assert daemon.next_capper_refresh_at == NOW + timedelta(minutes=5)
+    assert list(daemon.cappers) == ['1']  # Keeps scanning the cappers it already had
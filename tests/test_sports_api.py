@@ -0,0 +1,139 @@
+# tests/test_sports_api.py
+import pytest
+from capper_ranks.database import models
+from capper_ranks.services import sports_api
+from capper_ranks.services.roster_index import roster_index
+
+OHTANI = {'id': 660271, 'fullName': 'Shohei Ohtani', 'mlbDebutDate': '2018-03-29', 'currentTeam': {'id': 119}}
+
+
+@pytest.fixture(autouse=True)
+def no_roster_index(mocker):
+    """These tests cover the per-name lookup path used when the roster index is unavailable."""
+    mocker.patch.object(roster_index, 'ensure_loaded', return_value=False)
+
+
+def test_player_lookup_is_cached(mocker):
+    """A warm lookup for a known player should not touch the network."""
+    lookup = mocker.patch('capper_ranks.services.sports_api.statsapi.lookup_player', return_value=[OHTANI])
+
+    assert sports_api.get_player_league("Shohei Ohtani") == 'MLB'
+    assert sports_api.get_player_league("shohei  OHTANI") == 'MLB'
+    assert lookup.call_count == 1
+
+
+def test_player_lookup_caches_misses(mocker):
+    """Names that don't resolve are remembered too, including the last-name fallback."""
+    lookup = mocker.patch('capper_ranks.services.sports_api.statsapi.lookup_player', return_value=[])
+
+    assert sports_api.get_player_league("Tail Or Fade") is None
+    assert sports_api.get_player_league("Tail Or Fade") is None
+    # One call for the full name and one for the last name, then nothing.
+    assert lookup.call_count == 2
+
+
+def test_player_lookup_cache_expires(mocker):
+    """Entries older than the TTL are looked up again."""
+    lookup = mocker.patch('capper_ranks.services.sports_api.statsapi.lookup_player', return_value=[OHTANI])
+    sports_api.get_player_league("Shohei Ohtani")
+
+    conn = models.connect_db()
+    conn.execute("UPDATE player_lookup_cache SET cached_at = datetime('now', '-1000 hours')")
+    conn.commit()
+    conn.close()
+
+    sports_api.get_player_league("Shohei Ohtani")
+    assert lookup.call_count == 2
+
+
+def test_prop_grading_uses_player_cache(mocker):
+    """Grading a prop reuses the player resolved during detection."""
+    lookup = mocker.patch('capper_ranks.services.sports_api.statsapi.lookup_player', return_value=[OHTANI])
+    mocker.patch('capper_ranks.services.sports_api.statsapi.schedule', return_value=[{'game_id': 1, 'status': 'Scheduled'}])
+
+    sports_api.get_player_league("Shohei Ohtani")
+    result = sports_api._get_mlb_player_prop_result({
+        'subject': 'Shohei Ohtani',
+        'bet_qualifier': 'Over Hits',
+        'line': 0.5,
+        'tweet_timestamp': '2024-01-01T12:00:00'
+    })
+    assert result['status'] == 'PENDING_RESULT'
+    assert lookup.call_count == 1
+
+
+def test_batch_grading_shares_schedule_and_feeds(mocker):
+    """Many legs on the same game cost one schedule call and one game feed call."""
+    mocker.patch('capper_ranks.services.sports_api.statsapi.lookup_player', return_value=[OHTANI])
+    schedule = mocker.patch('capper_ranks.services.sports_api.statsapi.schedule', return_value=[
+        {'game_id': 1, 'status': 'Final', 'home_id': 119, 'away_id': 137, 'home_name': 'Los Angeles Dodgers',
+         'away_name': 'San Francisco Giants', 'home_score': 5, 'away_score': 3, 'winning_team': 'Los Angeles Dodgers'},
+        {'game_id': 2, 'status': 'In Progress', 'home_id': 147, 'away_id': 111, 'home_name': 'New York Yankees',
+         'away_name': 'Boston Red Sox', 'home_score': 1, 'away_score': 0, 'winning_team': ''},
+    ])
+    game_feed = mocker.patch('capper_ranks.services.sports_api.statsapi.get', return_value={
+        'liveData': {'boxscore': {'teams': {'home': {'players': {'ID660271': {'stats': {'batting': {'hits': 2, 'totalBases': 5}}}}}}}}
+    })
+
+    timestamp = '2024-06-01T12:00:00'
+    legs = [
+        {'leg_id': 1, 'sport_league': 'MLB', 'bet_type': 'Player Prop', 'subject': 'Shohei Ohtani',
+         'bet_qualifier': 'Over Hits', 'line': 1.5, 'tweet_timestamp': timestamp},
+        {'leg_id': 2, 'sport_league': 'MLB', 'bet_type': 'Player Prop', 'subject': 'Shohei Ohtani',
+         'bet_qualifier': 'Under Hits', 'line': 0.5, 'tweet_timestamp': timestamp},
+        {'leg_id': 3, 'sport_league': 'MLB', 'bet_type': 'Moneyline', 'subject': 'dodgers',
+         'bet_qualifier': 'Full Game', 'line': None, 'tweet_timestamp': timestamp},
+        {'leg_id': 4, 'sport_league': 'MLB', 'bet_type': 'Total', 'subject': 'giants',
+         'bet_qualifier': 'Over Full Game', 'line': 8.5, 'tweet_timestamp': timestamp},
+        {'leg_id': 5, 'sport_league': 'MLB', 'bet_type': 'Moneyline', 'subject': 'yankees',
+         'bet_qualifier': 'Full Game', 'line': None, 'tweet_timestamp': timestamp},
+        {'leg_id': 6, 'sport_league': 'NBA', 'bet_type': 'Moneyline', 'subject': 'lakers',
+         'bet_qualifier': 'Full Game', 'line': None, 'tweet_timestamp': timestamp},
+    ]
+    results = sports_api.fetch_pick_results(legs)
+
+    assert results[1]['status'] == 'WIN'
+    assert results[2]['status'] == 'LOSS'
+    assert results[3]['status'] == 'WIN'
+    assert results[4]['status'] == 'LOSS'
+    assert results[5]['status'] == 'PENDING_RESULT'
+    assert results[6] is None
+    assert schedule.call_count == 1
+    assert game_feed.call_count == 1
+
+
+def test_final_game_feed_is_stored_permanently(mocker):
+    """Final feeds survive a cleared memory cache; live feeds are re-fetched once stale."""
+    feeds = {
+        1: {'gameData': {'status': {'detailedState': 'Final'}}, 'liveData': {}},
+        2: {'gameData': {'status': {'detailedState': 'In Progress'}}, 'liveData': {}},
+    }
+    api_get = mocker.patch('capper_ranks.services.sports_api.statsapi.get', side_effect=lambda _, params: feeds[params['gamePk']])
+
+    sports_api.get_game_feed(1)
+    sports_api.get_game_feed(2)
+    sports_api.get_game_feed(1)
+    sports_api.get_game_feed(2)
+    assert api_get.call_count == 2
+
+    # A new process only has the disk cache, which holds the final game.
+    sports_api.clear_cache()
+    assert sports_api.get_game_feed(1) == feeds[1]
+    sports_api.get_game_feed(2)
+    assert api_get.call_count == 3
+
+
+def test_schedule_cache_ttl_for_unfinished_days(mocker):
+    """A day with unfinished games is only reused until the live TTL runs out."""
+    mocker.patch('capper_ranks.core.config.LIVE_GAME_CACHE_TTL_SECONDS', 0)
+    schedule = mocker.patch('capper_ranks.services.sports_api.statsapi.schedule', return_value=[{'game_id': 1, 'status': 'In Progress'}])
+
+    sports_api.get_schedule('2024-06-01')
+    sports_api.get_schedule('2024-06-01')
+    assert schedule.call_count == 2
+
+    schedule.return_value = [{'game_id': 1, 'status': 'Final'}]
+    sports_api.get_schedule('2024-06-02')
+    sports_api.clear_cache()
+    sports_api.get_schedule('2024-06-02')
+    assert schedule.call_count == 3